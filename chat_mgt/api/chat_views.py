@@ -20,6 +20,8 @@ from open_ragbook_server.utils.db_utils import (
     dict_fetchall, execute_query_sql, execute_sql
 )
 from knowledge_mgt.utils.document_processor import VectorStore
+from knowledge_mgt.utils.reranker import rerank_chunks
+from knowledge_mgt.utils.retrieval import select_diverse_chunks
 from account_mgt.utils.jwt_token_utils import parse_jwt_token
 
 logger = logging.getLogger(__name__)
@@ -58,8 +60,30 @@ def retrieve_and_chat(request):
         model_id = data.get('model_id')
         retrieve_count = data.get('retrieve_count', 3)
         similarity_threshold = data.get('similarity_threshold', 0.7)
+        # 多样性即MMR的lambda，取值0~1，越小结果越分散，为1或null时不做MMR
         diversity = data.get('diversity', 0.7)
         conversation_id = data.get('conversation_id')
+        # 可选的交叉编码器重排序：先召回更多候选，打分后保留 retrieve_count 个
+        rerank_model_id = data.get('rerank_model_id')
+        rerank_budget_ms = data.get('rerank_budget_ms')
+
+        if diversity is not None:
+            try:
+                diversity = float(diversity)
+            except (TypeError, ValueError):
+                return create_error_response('diversity 必须是0到1之间的数字')
+            if not 0 <= diversity <= 1:
+                return create_error_response('diversity 必须是0到1之间的数字')
+        use_mmr = diversity is not None and diversity < 1
+
+        # 混合检索权重：向量检索与BM25关键词检索按加权倒数排名融合，lexical_weight 为0时只用向量检索
+        try:
+            vector_weight = float(data.get('vector_weight', getattr(settings, 'HYBRID_VECTOR_WEIGHT', 1.0)))
+            lexical_weight = float(data.get('lexical_weight', getattr(settings, 'HYBRID_LEXICAL_WEIGHT', 1.0)))
+        except (TypeError, ValueError):
+            return create_error_response('vector_weight 和 lexical_weight 必须是数字')
+        if vector_weight < 0 or lexical_weight < 0:
+            return create_error_response('vector_weight 和 lexical_weight 不能为负数')
 
         # 获取用户信息
         user_info = get_user_from_request(request)
@@ -68,7 +92,7 @@ def retrieve_and_chat(request):
 
         # 获取知识库信息（检查用户权限）
         kb_sql = """
-            SELECT id, name, description, vector_dimension, index_type 
+            SELECT id, name, description, embedding_model_id, vector_dimension, index_type 
             FROM knowledge_database 
             WHERE id = %s
         """
@@ -87,6 +111,7 @@ def retrieve_and_chat(request):
         knowledge_name = knowledge_info['name']
         vector_dimension = knowledge_info['vector_dimension']
         index_type = knowledge_info['index_type']
+        embedding_model_id = knowledge_info['embedding_model_id']
 
         # 获取模型信息（检查用户权限）
         model_sql = """
@@ -146,15 +171,15 @@ def retrieve_and_chat(request):
 
         # 使用向量数据库进行语义检索
         try:
-            # 1. 获取当前加载的本地嵌入模型
-            from knowledge_mgt.utils.embeddings import local_embedding_manager
-            embedding_model = local_embedding_manager.get_current_model()
+            # 1. 获取知识库绑定的嵌入模型（未加载时按需加载到模型池）
+            from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+            embedding_model = get_knowledge_embedding_model(embedding_model_id)
             
             if embedding_model is None:
                 logger.error("没有加载的嵌入模型，无法进行向量检索")
                 return create_error_response('没有加载的嵌入模型，请先在系统管理中加载嵌入模型', 500)
             
-            logger.debug("使用当前加载的本地嵌入模型进行向量检索")
+            logger.debug(f"使用嵌入模型 {embedding_model_id} 进行向量检索")
 
             # 2. 将查询转换为向量
             query_vector = embedding_model.embed_text(query)
@@ -166,17 +191,29 @@ def retrieve_and_chat(request):
             # 3. 初始化向量存储，使用实际维度
             vector_store = VectorStore(vector_dimension=actual_dimension, index_type=index_type)
 
-            # 4. 在向量数据库中搜索相似文档
-            similar_chunks = vector_store.search(knowledge_id, query_vector, top_k=retrieve_count)
+            # 4. 向量检索与BM25检索混合搜索相似文档，启用MMR或重排序时召回更多候选
+            candidate_factor = 1
+            if use_mmr:
+                candidate_factor = getattr(settings, 'MMR_CANDIDATE_FACTOR', 4)
+            if rerank_model_id:
+                candidate_factor = max(candidate_factor, getattr(settings, 'RERANK_CANDIDATE_FACTOR', 4))
+            similar_chunks = vector_store.hybrid_search(
+                knowledge_id, query, query_vector, top_k=retrieve_count * candidate_factor,
+                vector_weight=vector_weight, lexical_weight=lexical_weight, with_vectors=use_mmr
+            )
 
             # 5. 根据相似度阈值过滤结果
+            lexical_min_score = getattr(settings, 'HYBRID_LEXICAL_MIN_SCORE', 5.0)
+            lexical_similarity_threshold = similarity_threshold * getattr(settings, 'HYBRID_LEXICAL_SIMILARITY_RATIO', 0.5)
             filtered_chunks = []
             for chunk in similar_chunks:
                 distance = chunk['distance']
                 similarity_score = 1.0 / (1.0 + distance) if distance >= 0 else 0.0
                 
-                # 只保留相似度高于阈值的结果
-                if similarity_score >= similarity_threshold:
+                # 只保留相似度高于阈值的结果；相似度不足时，BM25得分达到绝对下限、且相似度不低于放宽后阈值的关键词强命中也保留
+                lexical_match = (chunk.get('lexical_score') or 0.0) >= lexical_min_score and \
+                    similarity_score >= lexical_similarity_threshold
+                if similarity_score >= similarity_threshold or lexical_match:
                     filtered_chunks.append(chunk)
                     
             logger.info(f"检索到 {len(similar_chunks)} 个结果，过滤后保留 {len(filtered_chunks)} 个结果（相似度阈值: {similarity_threshold}）")
@@ -188,6 +225,11 @@ def retrieve_and_chat(request):
             # 使用过滤后的结果
             similar_chunks = filtered_chunks
 
+            # MMR多样性选择，去掉内容相近的分块；后续还要重排序时多保留一倍候选供交叉编码器挑选
+            if use_mmr:
+                mmr_count = retrieve_count * 2 if rerank_model_id else retrieve_count
+                similar_chunks = select_diverse_chunks(query_vector, similar_chunks, mmr_count, diversity)
+
             # 6. 查询对应的文档分块内容（需要检查用户权限）
             chunk_ids = [chunk['chunk_id'] for chunk in similar_chunks]
             
@@ -220,6 +262,17 @@ def retrieve_and_chat(request):
                     logger.warning(f"未能查询到文档分块内容，chunk_ids: {chunk_ids}")
                     return create_error_response('未能获取文档内容，请检查数据完整性', 500)
                 
+                # 按检索（MMR选择）顺序组织分块内容
+                chunk_dict = {chunk_result['id']: chunk_result for chunk_result in chunk_results}
+                chunk_results = [
+                    dict(chunk_dict[chunk['chunk_id']], chunk_id=chunk['chunk_id'])
+                    for chunk in similar_chunks if chunk['chunk_id'] in chunk_dict
+                ]
+
+                # 交叉编码器重排序：打分后保留 retrieve_count 个
+                if rerank_model_id:
+                    chunk_results = rerank_chunks(rerank_model_id, query, chunk_results, retrieve_count, rerank_budget_ms)
+                
                 # 构建上下文
                 context_parts = []
                 for chunk_result in chunk_results:
@@ -0,0 +1,4 @@
+ALTER TABLE `document_upload_task`
+  ADD COLUMN `batch_id` varchar(64) DEFAULT NULL COMMENT '批量导入的批次ID，单个上传为空' AFTER `task_id`,
+  ADD COLUMN `file_hash` char(64) DEFAULT NULL COMMENT '文件内容的SHA-256' AFTER `file_size`,
+  ADD KEY `idx_batch_id` (`batch_id`);
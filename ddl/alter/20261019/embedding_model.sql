@@ -0,0 +1,3 @@
+ALTER TABLE `embedding_model`
+  MODIFY COLUMN `model_type` varchar(50) NOT NULL COMMENT '模型类型：openai, zhipu, baidu, dashscope, xunfei, tencent, sentence_transformers, ollama, cross_encoder（重排序模型）',
+  ADD COLUMN `inference_precision` varchar(10) DEFAULT 'fp32' COMMENT '本地模型推理精度：fp32, bf16, fp16（仅GPU）' AFTER `timeout`;
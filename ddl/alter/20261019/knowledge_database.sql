@@ -0,0 +1,5 @@
+ALTER TABLE `knowledge_database`
+  ADD COLUMN `reduced_dimension` int DEFAULT NULL COMMENT '降维后的索引维度，为空表示不降维' AFTER `index_type`,
+  ADD COLUMN `dimension_reduction` varchar(20) DEFAULT NULL COMMENT '降维方式：matryoshka/pca' AFTER `reduced_dimension`,
+  ADD COLUMN `max_file_size` bigint DEFAULT NULL COMMENT '单个上传文件的大小上限(字节)，为空时使用系统配置' AFTER `dimension_reduction`,
+  ADD COLUMN `duplicate_policy` varchar(10) NOT NULL DEFAULT 'keep' COMMENT '近似重复分块的处理策略：keep 保留并向量化/link 只记录引用不向量化/skip 不入库' AFTER `max_file_size`;
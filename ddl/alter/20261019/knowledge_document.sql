@@ -0,0 +1,9 @@
+ALTER TABLE `knowledge_document`
+  ADD COLUMN `file_hash` char(64) DEFAULT NULL COMMENT '文件内容的SHA-256，用于识别重复上传' AFTER `file_size`,
+  ADD COLUMN `custom_delimiter` varchar(100) DEFAULT NULL COMMENT '自定义分隔符' AFTER `overlap_size`,
+  ADD COLUMN `window_size` int DEFAULT '3' COMMENT '滑动窗口大小' AFTER `custom_delimiter`,
+  ADD COLUMN `step_size` int DEFAULT '1' COMMENT '滑动窗口步长' AFTER `window_size`,
+  ADD COLUMN `min_chunk_size` int DEFAULT '50' COMMENT '最小分块大小' AFTER `step_size`,
+  ADD COLUMN `max_chunk_size` int DEFAULT '2000' COMMENT '最大分块大小' AFTER `min_chunk_size`,
+  ADD COLUMN `embedding_stats` json DEFAULT NULL COMMENT '向量化统计：超长分块数、切分窗口数、token总数等' AFTER `chunk_count`,
+  ADD KEY `idx_database_file_hash` (`database_id`, `file_hash`);
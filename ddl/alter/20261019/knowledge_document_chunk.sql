@@ -0,0 +1,6 @@
+ALTER TABLE `knowledge_document_chunk`
+  ADD COLUMN `content_hash` char(64) DEFAULT NULL COMMENT '分块内容的SHA-256，文档更新时用于比对分块' AFTER `vector_id`,
+  ADD COLUMN `simhash` bigint unsigned DEFAULT NULL COMMENT '内容的64位SimHash签名，用于近重复检测' AFTER `content_hash`,
+  ADD COLUMN `duplicate_of` int DEFAULT NULL COMMENT '近似重复的原始分块ID' AFTER `simhash`,
+  ADD COLUMN `heading_path` varchar(500) DEFAULT NULL COMMENT '章节分块所在章节的标题路径，如 第三章 安装 > 3.2 环境配置' AFTER `duplicate_of`,
+  ADD KEY `idx_duplicate_of` (`duplicate_of`);
@@ -1,12 +1,14 @@
 CREATE TABLE `document_upload_task` (
   `id` int NOT NULL AUTO_INCREMENT,
   `task_id` varchar(64) NOT NULL COMMENT '任务唯一标识',
+  `batch_id` varchar(64) DEFAULT NULL COMMENT '批量导入的批次ID，单个上传为空',
   `user_id` int NOT NULL COMMENT '用户ID',
   `username` varchar(50) NOT NULL COMMENT '用户名',
   `database_id` int NOT NULL COMMENT '知识库ID',
   `filename` varchar(255) NOT NULL COMMENT '文件名',
   `file_path` varchar(500) DEFAULT NULL COMMENT '文件路径',
   `file_size` bigint DEFAULT NULL COMMENT '文件大小',
+  `file_hash` char(64) DEFAULT NULL COMMENT '文件内容的SHA-256',
   `chunking_method` varchar(50) NOT NULL COMMENT '分块方式',
   `chunk_size` int DEFAULT '500' COMMENT '分块大小',
   `similarity_threshold` decimal(3,2) DEFAULT '0.70' COMMENT '相似度阈值',
@@ -29,6 +31,7 @@ CREATE TABLE `document_upload_task` (
   UNIQUE KEY `uk_task_id` (`task_id`),
   KEY `idx_user_id` (`user_id`),
   KEY `idx_database_id` (`database_id`),
+  KEY `idx_batch_id` (`batch_id`),
   KEY `idx_status` (`status`),
   KEY `idx_created_at` (`created_at`)
 ) ENGINE=InnoDB AUTO_INCREMENT=3 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='文档上传任务表';
\ No newline at end of file
@@ -1,7 +1,7 @@
 CREATE TABLE `embedding_model` (
   `id` int NOT NULL AUTO_INCREMENT COMMENT '主键ID',
   `name` varchar(100) NOT NULL COMMENT '模型显示名称',
-  `model_type` varchar(50) NOT NULL COMMENT '模型类型：openai, zhipu, baidu, dashscope, xunfei, tencent, sentence_transformers, ollama',
+  `model_type` varchar(50) NOT NULL COMMENT '模型类型：openai, zhipu, baidu, dashscope, xunfei, tencent, sentence_transformers, ollama, cross_encoder（重排序模型）',
   `api_type` varchar(20) NOT NULL COMMENT 'API类型：online, local',
   `api_key` varchar(500) DEFAULT NULL COMMENT 'API密钥（仅在线模型需要）',
   `api_url` varchar(500) DEFAULT NULL COMMENT 'API地址（预设，用户一般不需要修改）',
@@ -11,6 +11,7 @@ CREATE TABLE `embedding_model` (
   `max_tokens` int NOT NULL COMMENT '最大token数（由模型决定，不可修改）',
   `batch_size` int DEFAULT '32' COMMENT '推荐批处理大小（可调整）',
   `timeout` int DEFAULT '30' COMMENT '请求超时时间（秒）',
+  `inference_precision` varchar(10) DEFAULT 'fp32' COMMENT '本地模型推理精度：fp32, bf16, fp16（仅GPU）',
   `is_default` tinyint(1) DEFAULT '0' COMMENT '是否为默认模型',
   `is_public` tinyint(1) DEFAULT '1' COMMENT '是否为公共模型（预设模型都是公共的）',
   `is_active` tinyint(1) DEFAULT '1' COMMENT '是否启用',
@@ -5,6 +5,10 @@ CREATE TABLE `knowledge_database` (
   `embedding_model_id` int DEFAULT NULL COMMENT '嵌入模型ID',
   `vector_dimension` int NOT NULL DEFAULT '384' COMMENT '向量维度',
   `index_type` varchar(50) NOT NULL COMMENT '索引类型',
+  `reduced_dimension` int DEFAULT NULL COMMENT '降维后的索引维度，为空表示不降维',
+  `dimension_reduction` varchar(20) DEFAULT NULL COMMENT '降维方式：matryoshka/pca',
+  `max_file_size` bigint DEFAULT NULL COMMENT '单个上传文件的大小上限(字节)，为空时使用系统配置',
+  `duplicate_policy` varchar(10) NOT NULL DEFAULT 'keep' COMMENT '近似重复分块的处理策略：keep 保留并向量化/link 只记录引用不向量化/skip 不入库',
   `doc_count` int NOT NULL DEFAULT '0' COMMENT '文档数量',
   `user_id` int NOT NULL COMMENT '创建人ID',
   `username` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
@@ -5,17 +5,25 @@ CREATE TABLE `knowledge_document` (
   `file_path` varchar(500) NOT NULL COMMENT '文件存储路径',
   `file_type` varchar(50) NOT NULL COMMENT '文件类型',
   `file_size` bigint NOT NULL COMMENT '文件大小(字节)',
+  `file_hash` char(64) DEFAULT NULL COMMENT '文件内容的SHA-256，用于识别重复上传',
   `chunking_method` varchar(50) NOT NULL COMMENT '分块方法',
   `chunk_size` int NOT NULL COMMENT '分块大小',
   `similarity_threshold` decimal(3,2) DEFAULT '0.70' COMMENT '语义分块相似度阈值',
   `overlap_size` int DEFAULT '100' COMMENT '递归分块重叠大小',
+  `custom_delimiter` varchar(100) DEFAULT NULL COMMENT '自定义分隔符',
+  `window_size` int DEFAULT '3' COMMENT '滑动窗口大小',
+  `step_size` int DEFAULT '1' COMMENT '滑动窗口步长',
+  `min_chunk_size` int DEFAULT '50' COMMENT '最小分块大小',
+  `max_chunk_size` int DEFAULT '2000' COMMENT '最大分块大小',
   `chunk_count` int NOT NULL COMMENT '分块数量',
+  `embedding_stats` json DEFAULT NULL COMMENT '向量化统计：超长分块数、切分窗口数、token总数等',
   `user_id` int NOT NULL COMMENT '上传用户ID',
   `username` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL COMMENT '上传用户名',
   `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   PRIMARY KEY (`id`),
   KEY `idx_database_id` (`database_id`),
+  KEY `idx_database_file_hash` (`database_id`, `file_hash`),
   KEY `idx_user_id` (`user_id`),
   CONSTRAINT `fk_document_database` FOREIGN KEY (`database_id`) REFERENCES `knowledge_database` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=17 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='知识文档表';
\ No newline at end of file
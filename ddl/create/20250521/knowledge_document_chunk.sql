@@ -5,11 +5,16 @@ CREATE TABLE `knowledge_document_chunk` (
   `chunk_index` int NOT NULL COMMENT '分块索引',
   `content` text NOT NULL COMMENT '分块内容',
   `vector_id` varchar(64) DEFAULT NULL COMMENT '向量ID',
+  `content_hash` char(64) DEFAULT NULL COMMENT '分块内容的SHA-256，文档更新时用于比对分块',
+  `simhash` bigint unsigned DEFAULT NULL COMMENT '内容的64位SimHash签名，用于近重复检测',
+  `duplicate_of` int DEFAULT NULL COMMENT '近似重复的原始分块ID',
+  `heading_path` varchar(500) DEFAULT NULL COMMENT '章节分块所在章节的标题路径，如 第三章 安装 > 3.2 环境配置',
   `create_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `update_time` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   PRIMARY KEY (`id`),
   KEY `idx_document_id` (`document_id`),
   KEY `idx_database_id` (`database_id`),
+  KEY `idx_duplicate_of` (`duplicate_of`),
   CONSTRAINT `fk_chunk_database` FOREIGN KEY (`database_id`) REFERENCES `knowledge_database` (`id`) ON DELETE CASCADE,
   CONSTRAINT `fk_chunk_document` FOREIGN KEY (`document_id`) REFERENCES `knowledge_document` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=45 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='知识文档分块表';
\ No newline at end of file
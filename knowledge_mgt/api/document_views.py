@@ -1,6 +1,9 @@
 import json
 import logging
 import os
+import time
+import uuid
+from collections import deque
 from django.db import connection, transaction
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -9,8 +12,12 @@ from django.views.decorators.csrf import csrf_exempt
 from open_ragbook_server.utils.response_code import *
 from open_ragbook_server.utils.db_utils import fetch_paginated_data, dict_fetchall
 from open_ragbook_server.utils.auth_utils import jwt_required
-from knowledge_mgt.utils.document_processor import DocumentProcessor, VectorStore
-from knowledge_mgt.utils.embeddings import EmbeddingModel
+from knowledge_mgt.utils.dedup import NearDuplicateDetector, content_hash, release_duplicates
+from knowledge_mgt.utils.document_processor import DocumentExtractionError, DocumentProcessor, VectorStore
+from knowledge_mgt.utils.token_estimator import get_token_counter
+from knowledge_mgt.utils.upload_handlers import check_uploaded_file, find_document_by_hash, hashed_uploads
+from knowledge_mgt.utils.embedding_workers import embed_texts_for_ingestion
+from knowledge_mgt.utils.embeddings import EmbeddingModel, summarize_embedding_stats
 
 # 获取模块日志记录器
 logger = logging.getLogger('knowledge_mgt')
@@ -105,7 +112,7 @@ def document_chunks(request, doc_id):
         offset = (page - 1) * page_size
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT id, chunk_index, content, vector_id, create_time 
+                SELECT id, chunk_index, content, vector_id, create_time, heading_path
                 FROM knowledge_document_chunk 
                 WHERE document_id = %s 
                 ORDER BY chunk_index 
@@ -118,7 +125,8 @@ def document_chunks(request, doc_id):
                     "chunk_index": row[1],
                     "content": row[2],
                     "vector_id": row[3],
-                    "create_time": row[4].strftime("%Y-%m-%d %H:%M:%S") if row[4] else None
+                    "create_time": row[4].strftime("%Y-%m-%d %H:%M:%S") if row[4] else None,
+                    "heading_path": row[5]
                 }
                 for row in cursor.fetchall()
             ]
@@ -144,6 +152,7 @@ def document_chunks(request, doc_id):
 @require_http_methods(["POST"])
 @csrf_exempt
 @jwt_required()
+@hashed_uploads
 def document_upload(request):
     """上传并处理文档"""
     try:
@@ -160,6 +169,15 @@ def document_upload(request):
         max_chunk_size = int(request.POST.get('max_chunk_size', 2000))
         file = request.FILES.get('file')
 
+        # 验证文件格式和大小（按知识库配置的上限）
+        upload_error = check_uploaded_file(request, file, database_id)
+        if upload_error:
+            logger.warning(f"上传文档失败: {upload_error[0]}")
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message=upload_error[0]),
+                status=upload_error[1]
+            )
+
         # 验证参数
         if not database_id or not file:
             logger.warning("上传文档失败: 缺少必要参数")
@@ -168,24 +186,6 @@ def document_upload(request):
                 status=400
             )
 
-        # 验证文件格式 - 只支持txt
-        file_extension = os.path.splitext(file.name)[1].lower()
-        if file_extension != '.txt':
-            logger.warning(f"上传文档失败: 不支持的文件格式 {file_extension}")
-            return JsonResponse(
-                ResponseCode.ERROR.to_dict(message="只支持上传 .txt 格式的文件"),
-                status=400
-            )
-
-        # 验证文件大小 - 不超过5MB
-        max_size = 5 * 1024 * 1024  # 5MB
-        if file.size > max_size:
-            logger.warning(f"上传文档失败: 文件大小超限 {file.size} bytes")
-            return JsonResponse(
-                ResponseCode.ERROR.to_dict(message="文件大小不能超过 5MB"),
-                status=400
-            )
-
         # 获取用户信息
         from open_ragbook_server.utils.auth_utils import get_user_from_request
         user_info = get_user_from_request(request)
@@ -202,7 +202,8 @@ def document_upload(request):
         # 查询知识库信息
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT name, vector_dimension, index_type 
+                SELECT name, embedding_model_id, vector_dimension, index_type,
+                       reduced_dimension, dimension_reduction, duplicate_policy
                 FROM knowledge_database 
                 WHERE id = %s
             """, [database_id])
@@ -215,7 +216,21 @@ def document_upload(request):
                     status=404
                 )
 
-            db_name, vector_dimension, index_type = db_info
+            (db_name, embedding_model_id, vector_dimension, index_type,
+             reduced_dimension, dimension_reduction, duplicate_policy) = db_info
+
+        # 知识库中已有内容完全相同的文件时直接返回已有文档，不重复入库
+        existing_document = find_document_by_hash(database_id, getattr(file, 'sha256', None))
+        if existing_document:
+            logger.info(f"文件 {file.name} 与知识库 {database_id} 中的文档 {existing_document[0]} 内容相同，跳过入库")
+            return JsonResponse(
+                ResponseCode.SUCCESS.to_dict(data={
+                    "document_id": existing_document[0],
+                    "chunk_count": existing_document[1],
+                    "duplicate": True
+                }),
+                status=200
+            )
 
         # 初始化文档处理器
         document_processor = DocumentProcessor(
@@ -234,17 +249,30 @@ def document_upload(request):
         file_info = document_processor.save_file(file, database_id)
         logger.info(f"保存文件: {file_info['filename']}")
 
-        # 处理文档内容
-        doc_text = document_processor.process_document(file_info['file_path'])
-        if not doc_text or doc_text.startswith("处理文档失败"):
-            logger.error(f"处理文档内容失败: {file_info['filename']}")
+        # 获取知识库绑定的嵌入模型（未加载时按需加载到模型池）
+        from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+        embedding_model = get_knowledge_embedding_model(embedding_model_id)
+        
+        if embedding_model is None:
+            logger.error("没有加载的嵌入模型，无法处理文档")
             return JsonResponse(
-                ResponseCode.ERROR.to_dict(message=f"处理文档内容失败: {doc_text}"),
+                ResponseCode.ERROR.to_dict(message="没有加载的嵌入模型，请先在系统管理中加载嵌入模型"),
                 status=500
             )
 
-        # 文本分块
-        chunks = document_processor.split_text(doc_text)
+        # 配置为按模型分词器计数时，Token分块使用嵌入模型的真实分词结果；嵌入语义分块使用同一模型编码句子
+        document_processor.token_counter = get_token_counter(embedding_model)
+        document_processor.embedding_model = embedding_model
+
+        # 流式提取文档内容并分块
+        try:
+            chunks = list(document_processor.iter_chunks(file_info['file_path']))
+        except DocumentExtractionError as e:
+            logger.error(f"处理文档内容失败: {file_info['filename']}, {str(e)}")
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message=f"处理文档内容失败: {str(e)}"),
+                status=500
+            )
         chunk_count = len(chunks)
 
         if chunk_count == 0:
@@ -256,23 +284,15 @@ def document_upload(request):
 
         logger.info(f"文档 {file_info['filename']} 分割为 {chunk_count} 个分块")
 
-        # 获取当前加载的本地嵌入模型
-        from knowledge_mgt.utils.embeddings import local_embedding_manager
-        embedding_model = local_embedding_manager.get_current_model()
-        
-        if embedding_model is None:
-            logger.error("没有加载的嵌入模型，无法处理文档")
-            return JsonResponse(
-                ResponseCode.ERROR.to_dict(message="没有加载的嵌入模型，请先在系统管理中加载嵌入模型"),
-                status=500
-            )
-
         # 获取嵌入模型的实际维度
         actual_dimension = embedding_model.get_dimension()
         logger.debug(f"嵌入模型实际维度: {actual_dimension}, 知识库配置维度: {vector_dimension}")
 
         # 初始化向量存储，使用实际维度
-        vector_store = VectorStore(vector_dimension=actual_dimension, index_type=index_type)
+        vector_store = VectorStore(
+            vector_dimension=actual_dimension, index_type=index_type,
+            reduced_dimension=reduced_dimension, reduction_method=dimension_reduction
+        )
 
         # 开始事务
         with transaction.atomic():
@@ -280,14 +300,16 @@ def document_upload(request):
             with connection.cursor() as cursor:
                 cursor.execute("""
                     INSERT INTO knowledge_document 
-                    (database_id, filename, file_path, file_type, file_size, 
+                    (database_id, filename, file_path, file_type, file_size, file_hash,
                      chunking_method, chunk_size, similarity_threshold, overlap_size, 
+                     custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
                      chunk_count, user_id, username)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """, [
                     database_id, file_info['filename'], file_info['file_path'],
-                    file_info['file_type'], file_info['file_size'],
+                    file_info['file_type'], file_info['file_size'], file_info['file_hash'],
                     chunking_method, chunk_size, similarity_threshold, overlap_size,
+                    custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
                     chunk_count, user_id, username
                 ])
 
@@ -295,45 +317,57 @@ def document_upload(request):
                 cursor.execute("SELECT LAST_INSERT_ID()")
                 document_id = cursor.fetchone()[0]
 
-            # 2. 添加文档分块记录
-            chunk_ids = []
-            for i, chunk_text in enumerate(chunks):
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO knowledge_document_chunk 
-                        (document_id, database_id, chunk_index, content)
-                        VALUES (%s, %s, %s, %s)
-                    """, [document_id, database_id, i, chunk_text])
-
-                    # 获取分块ID
-                    cursor.execute("SELECT LAST_INSERT_ID()")
-                    chunk_id = cursor.fetchone()[0]
-                    chunk_ids.append(chunk_id)
+            # 2. 按知识库的重复分块策略检测近似重复，添加文档分块记录
+            cached_vectors = document_processor.take_chunk_vectors(chunks)
+            heading_paths = document_processor.take_chunk_headings(chunks)
+            duplicate_detector = NearDuplicateDetector.load(database_id, duplicate_policy)
+            plan = duplicate_detector.plan(chunks)
+            chunk_ids = _insert_chunks(document_id, database_id, [
+                (chunk_index, chunks[position], plan['signatures'][position], heading_paths[position])
+                for chunk_index, position in enumerate(plan['store'])
+            ])
+            duplicate_detector.bind(plan, chunk_ids)
+            chunk_count = len(chunk_ids)
 
             # 3. 生成向量并存储
             # 创建或获取向量库
             vector_store.create_index(database_id)
 
-            # 生成向量
-            vectors = embedding_model.embed_texts(chunks)
-
-            # 添加到向量库
-            vector_ids = vector_store.add_vectors(database_id, chunk_ids, vectors)
-
-            # 4. 更新分块的向量ID
-            if vector_ids:
-                for i, chunk_id in enumerate(chunk_ids):
-                    vector_id = i if i < len(vector_ids) else None
-                    if vector_id is not None:
-                        with connection.cursor() as cursor:
-                            cursor.execute("""
-                                UPDATE knowledge_document_chunk 
-                                SET vector_id = %s
-                                WHERE id = %s
-                            """, [str(vector_id), chunk_id])
-
-            # 5. 更新知识库的文档数量
+            chunk_id_by_position = dict(zip(plan['store'], chunk_ids))
+            embed_chunks = [chunks[i] for i in plan['embed']]
+            embed_chunk_ids = [chunk_id_by_position[i] for i in plan['embed']]
+            embedding_stats = None
+            if embed_chunks:
+                # 生成向量，超过max_tokens的分块切分为多个窗口编码后平均；嵌入语义分块时已算出的向量直接复用
+                start_time = time.perf_counter()
+                vectors, embedding_stats = embed_texts_for_ingestion(
+                    embedding_model_id, embedding_model, embed_chunks, [cached_vectors[i] for i in plan['embed']]
+                )
+                duplicate_detector.record_embedding(len(embed_chunks), time.perf_counter() - start_time)
+
+                # 添加到向量库
+                vector_ids = vector_store.add_vectors(database_id, embed_chunk_ids, vectors, embed_chunks)
+
+                # 4. 更新分块的向量ID
+                if vector_ids:
+                    with connection.cursor() as cursor:
+                        cursor.executemany("""
+                            UPDATE knowledge_document_chunk 
+                            SET vector_id = %s
+                            WHERE id = %s
+                        """, [[str(vector_id), chunk_id] for vector_id, chunk_id in zip(vector_ids, embed_chunk_ids)])
+
+            # 5. 记录分块数、向量化和去重统计，更新知识库的文档数量
+            deduplication = duplicate_detector.report()
+            if deduplication['duplicate_chunks']:
+                logger.info(f"文档 {file_info['filename']} 检测到 {deduplication['duplicate_chunks']} 个近似重复分块，"
+                            f"策略 {deduplication['policy']}，节省 {deduplication['saved_embeddings']} 次向量化，"
+                            f"约 {deduplication['saved_embedding_seconds']} 秒")
+            embedding_stats = dict(summarize_embedding_stats(embedding_stats) or {}, deduplication=deduplication)
             with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE knowledge_document SET chunk_count = %s, embedding_stats = %s WHERE id = %s
+                """, [chunk_count, json.dumps(embedding_stats), document_id])
                 cursor.execute("""
                     UPDATE knowledge_database 
                     SET doc_count = doc_count + 1
@@ -345,7 +379,8 @@ def document_upload(request):
         return JsonResponse(
             ResponseCode.SUCCESS.to_dict(data={
                 "document_id": document_id,
-                "chunk_count": chunk_count
+                "chunk_count": chunk_count,
+                "deduplication": deduplication
             }),
             status=201
         )
@@ -357,6 +392,302 @@ def document_upload(request):
         )
 
 
+@require_http_methods(["POST"])
+@csrf_exempt
+@jwt_required()
+@hashed_uploads
+def document_update(request, doc_id):
+    """上传文档的新版本，按分块内容增量更新
+
+    新版本按原文档的分块参数（可在请求中覆盖）重新分块，与已有分块按内容哈希比对：内容未变的分块保留原分块ID和向量，
+    只为新增或修改的分块生成向量，不再出现的分块从索引中增量删除。普通用户只能更新自己知识库中的文档
+    """
+    try:
+        from open_ragbook_server.utils.auth_utils import get_user_from_request
+        user_info = get_user_from_request(request)
+
+        file = request.FILES.get('file')
+        if not file and not request.rejected_uploads:
+            logger.warning("更新文档失败: 缺少必要参数")
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message="缺少必要参数"),
+                status=400
+            )
+
+        # 查询文档和所属知识库信息；早于分块参数列的文档从生成它的上传任务中读取其余分块参数
+        doc_sql = """
+            SELECT d.database_id, d.filename, d.file_path, d.file_hash, d.chunking_method, d.chunk_size,
+                   d.similarity_threshold, d.overlap_size,
+                   COALESCE(d.custom_delimiter, t.custom_delimiter), COALESCE(d.window_size, t.window_size),
+                   COALESCE(d.step_size, t.step_size), COALESCE(d.min_chunk_size, t.min_chunk_size),
+                   COALESCE(d.max_chunk_size, t.max_chunk_size),
+                   k.embedding_model_id, k.index_type, k.reduced_dimension, k.dimension_reduction,
+                   k.duplicate_policy
+            FROM knowledge_document d
+            JOIN knowledge_database k ON d.database_id = k.id
+            LEFT JOIN document_upload_task t ON t.id = (
+                SELECT MAX(id) FROM document_upload_task WHERE document_id = d.id
+            )
+            WHERE d.id = %s
+        """
+        doc_params = [doc_id]
+        # 普通用户只能更新自己知识库中的文档
+        if user_info.get('role_id') != 1:
+            doc_sql += " AND k.user_id = %s"
+            doc_params.append(user_info.get('user_id'))
+        with connection.cursor() as cursor:
+            cursor.execute(doc_sql, doc_params)
+
+            doc_info = cursor.fetchone()
+            if not doc_info:
+                logger.warning(f"更新文档失败: 文档 {doc_id} 不存在或无权限访问")
+                return JsonResponse(
+                    ResponseCode.ERROR.to_dict(message="文档不存在或无权限访问"),
+                    status=404
+                )
+
+            (database_id, filename, file_path, file_hash, chunking_method, chunk_size, similarity_threshold,
+             overlap_size, custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
+             embedding_model_id, index_type, reduced_dimension, dimension_reduction, duplicate_policy) = doc_info
+
+        upload_error = check_uploaded_file(request, file, database_id)
+        if upload_error:
+            logger.warning(f"更新文档失败: {upload_error[0]}")
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message=upload_error[0]),
+                status=upload_error[1]
+            )
+        if file_hash and getattr(file, 'sha256', None) == file_hash:
+            logger.info(f"文档 {filename} 的新版本与当前内容相同，无需更新")
+            return JsonResponse(
+                ResponseCode.SUCCESS.to_dict(data={"document_id": doc_id, "unchanged": True}),
+                status=200
+            )
+
+        file_extension = os.path.splitext(file.name)[1].lower()
+        if file_extension != os.path.splitext(file_path)[1].lower():
+            logger.warning(f"更新文档失败: 新版本格式 {file_extension} 与原文档 {filename} 不一致")
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message="新版本的文件格式必须与原文档一致"),
+                status=400
+            )
+
+        # 分块参数默认沿用原文档，保证未修改的内容切分出相同的分块
+        chunking_method = request.POST.get('chunking_method') or chunking_method
+        chunk_size = int(request.POST.get('chunk_size') or chunk_size)
+        similarity_threshold = float(request.POST.get('similarity_threshold') or similarity_threshold)
+        overlap_size = int(request.POST.get('overlap_size') or overlap_size)
+        custom_delimiter = request.POST.get('custom_delimiter') or custom_delimiter or '\n\n'
+        window_size = int(request.POST.get('window_size') or window_size or 3)
+        step_size = int(request.POST.get('step_size') or step_size or 1)
+        min_chunk_size = int(request.POST.get('min_chunk_size') or min_chunk_size or 50)
+        max_chunk_size = int(request.POST.get('max_chunk_size') or max_chunk_size or 2000)
+        document_processor = DocumentProcessor(
+            chunking_method=chunking_method,
+            chunk_size=chunk_size,
+            similarity_threshold=similarity_threshold,
+            overlap_size=overlap_size,
+            custom_delimiter=custom_delimiter,
+            window_size=window_size,
+            step_size=step_size,
+            min_chunk_size=min_chunk_size,
+            max_chunk_size=max_chunk_size
+        )
+
+        # 获取知识库绑定的嵌入模型（未加载时按需加载到模型池）
+        from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+        embedding_model = get_knowledge_embedding_model(embedding_model_id)
+
+        if embedding_model is None:
+            logger.error("没有加载的嵌入模型，无法更新文档")
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message="没有加载的嵌入模型，请先在系统管理中加载嵌入模型"),
+                status=500
+            )
+
+        document_processor.token_counter = get_token_counter(embedding_model)
+        document_processor.embedding_model = embedding_model
+
+        # 新版本先写入临时文件，更新成功后替换原文件，失败时原文件和分块保持不变
+        root, ext = os.path.splitext(file_path)
+        new_file_path = f"{root}.{uuid.uuid4().hex[:8]}{ext}"
+        file_info = document_processor.save_file(file, database_id, file_path=new_file_path)
+        try:
+            try:
+                chunks = list(document_processor.iter_chunks(new_file_path))
+            except DocumentExtractionError as e:
+                logger.error(f"处理文档内容失败: {filename}, {str(e)}")
+                return JsonResponse(
+                    ResponseCode.ERROR.to_dict(message=f"处理文档内容失败: {str(e)}"),
+                    status=500
+                )
+
+            if not chunks:
+                logger.warning(f"文档分块失败，未生成有效分块: {filename}")
+                return JsonResponse(
+                    ResponseCode.ERROR.to_dict(message="文档分块失败，未生成有效分块"),
+                    status=500
+                )
+
+            vector_store = VectorStore(
+                vector_dimension=embedding_model.get_dimension(), index_type=index_type,
+                reduced_dimension=reduced_dimension, reduction_method=dimension_reduction
+            )
+
+            with transaction.atomic():
+                update_stats, embedding_stats = _apply_chunk_diff(
+                    doc_id, database_id, chunks, document_processor, vector_store,
+                    embedding_model_id, embedding_model, duplicate_policy
+                )
+
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        UPDATE knowledge_document
+                        SET file_size = %s, file_hash = %s, chunking_method = %s, chunk_size = %s,
+                            similarity_threshold = %s, overlap_size = %s, custom_delimiter = %s, window_size = %s,
+                            step_size = %s, min_chunk_size = %s, max_chunk_size = %s,
+                            chunk_count = %s, embedding_stats = %s
+                        WHERE id = %s
+                    """, [
+                        file_info['file_size'], file_info['file_hash'], chunking_method, chunk_size, similarity_threshold, overlap_size,
+                        custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
+                        update_stats['chunk_count'], json.dumps(embedding_stats), doc_id
+                    ])
+
+            os.replace(new_file_path, file_path)
+        finally:
+            if os.path.exists(new_file_path):
+                os.remove(new_file_path)
+
+        logger.info(f"文档 {filename} 更新完成，ID={doc_id}，保留 {update_stats['unchanged_chunks']} 个分块，"
+                    f"新增 {update_stats['added_chunks']} 个，删除 {update_stats['removed_chunks']} 个，"
+                    f"生成向量 {update_stats['embedded_chunks']} 个")
+
+        return JsonResponse(
+            ResponseCode.SUCCESS.to_dict(data=dict(
+                update_stats, document_id=doc_id, deduplication=embedding_stats['deduplication']
+            )),
+            status=200
+        )
+    except Exception as e:
+        logger.error(f"更新文档失败: {str(e)}", exc_info=True)
+        return JsonResponse(
+            ResponseCode.ERROR.to_dict(message=str(e)),
+            status=500
+        )
+
+
+def _apply_chunk_diff(doc_id, database_id, chunks, document_processor, vector_store,
+                      embedding_model_id, embedding_model, duplicate_policy):
+    """将文档的分块更新为 chunks，返回 (更新统计, 向量化统计)
+
+    按内容哈希把新分块与已有分块一一匹配（相同内容出现多次时按出现顺序配对），匹配上的分块只更新序号和标题路径；
+    新分块按知识库的重复分块策略写入并生成向量，未匹配的旧分块删除，并从向量和BM25索引中增量移除
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id, content_hash, content FROM knowledge_document_chunk
+            WHERE document_id = %s
+            ORDER BY chunk_index
+        """, [doc_id])
+        existing = cursor.fetchall()
+
+    existing_by_hash = {}
+    for chunk_id, chunk_hash, content in existing:
+        existing_by_hash.setdefault(chunk_hash or content_hash(content), deque()).append(chunk_id)
+
+    chunk_hashes = [content_hash(chunk) for chunk in chunks]
+    kept = {}
+    new_positions = []
+    for position, chunk_hash in enumerate(chunk_hashes):
+        matches = existing_by_hash.get(chunk_hash)
+        if matches:
+            kept[position] = matches.popleft()
+        else:
+            new_positions.append(position)
+    removed_ids = [chunk_id for matches in existing_by_hash.values() for chunk_id in matches]
+
+    # 引用被删除分块的重复分块转为原始分块，与新分块一起生成向量
+    promoted_ids = release_duplicates(removed_ids)
+    duplicate_detector = NearDuplicateDetector.load(database_id, duplicate_policy)
+    duplicate_detector.forget(removed_ids)
+    cached_vectors = document_processor.take_chunk_vectors(chunks)
+    heading_paths = document_processor.take_chunk_headings(chunks)
+    new_chunks = [chunks[position] for position in new_positions]
+    plan = duplicate_detector.plan(new_chunks)
+
+    # 跳过的重复分块不占用序号
+    stored_positions = sorted(list(kept) + [new_positions[i] for i in plan['store']])
+    chunk_index_by_position = {position: chunk_index for chunk_index, position in enumerate(stored_positions)}
+
+    with connection.cursor() as cursor:
+        if removed_ids:
+            placeholders = ','.join(['%s'] * len(removed_ids))
+            cursor.execute(f"DELETE FROM knowledge_document_chunk WHERE id IN ({placeholders})", removed_ids)
+        if kept:
+            # 内容不变的分块所在章节可能改变（如标题改名），标题路径一并更新
+            cursor.executemany("""
+                UPDATE knowledge_document_chunk SET chunk_index = %s, content_hash = %s, heading_path = %s WHERE id = %s
+            """, [[chunk_index_by_position[position], chunk_hashes[position], heading_paths[position], chunk_id]
+                  for position, chunk_id in kept.items()])
+
+    new_chunk_ids = _insert_chunks(doc_id, database_id, [
+        (chunk_index_by_position[new_positions[i]], new_chunks[i], plan['signatures'][i],
+         heading_paths[new_positions[i]])
+        for i in plan['store']
+    ])
+    duplicate_detector.bind(plan, new_chunk_ids)
+
+    new_chunk_id_by_index = dict(zip(plan['store'], new_chunk_ids))
+    embed_chunk_ids = [new_chunk_id_by_index[i] for i in plan['embed']]
+    embed_chunks = [new_chunks[i] for i in plan['embed']]
+    embed_cached_vectors = [cached_vectors[new_positions[i]] for i in plan['embed']]
+    if promoted_ids:
+        placeholders = ','.join(['%s'] * len(promoted_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, content FROM knowledge_document_chunk WHERE id IN ({placeholders})", promoted_ids
+            )
+            for chunk_id, content in cursor.fetchall():
+                embed_chunk_ids.append(chunk_id)
+                embed_chunks.append(content)
+                embed_cached_vectors.append(None)
+
+    embedding_stats = None
+    index_writer = vector_store.open_index_writer(database_id)
+    try:
+        index_writer.remove(removed_ids)
+        if embed_chunks:
+            start_time = time.perf_counter()
+            vectors, embedding_stats = embed_texts_for_ingestion(
+                embedding_model_id, embedding_model, embed_chunks, embed_cached_vectors
+            )
+            duplicate_detector.record_embedding(len(embed_chunks), time.perf_counter() - start_time)
+            vector_ids = index_writer.add(embed_chunk_ids, vectors, embed_chunks)
+
+            with connection.cursor() as cursor:
+                cursor.executemany("""
+                    UPDATE knowledge_document_chunk 
+                    SET vector_id = %s
+                    WHERE id = %s
+                """, [[str(vector_id), chunk_id] for vector_id, chunk_id in zip(vector_ids, embed_chunk_ids)])
+        index_writer.save()
+    except Exception:
+        index_writer.discard()
+        raise
+
+    update_stats = {
+        'chunk_count': len(stored_positions),
+        'unchanged_chunks': len(kept),
+        'added_chunks': len(new_chunk_ids),
+        'removed_chunks': len(removed_ids),
+        'embedded_chunks': len(embed_chunks)
+    }
+    embedding_stats = dict(summarize_embedding_stats(embedding_stats) or {}, deduplication=duplicate_detector.report(),
+                           update=update_stats)
+    return update_stats, embedding_stats
+
+
 @require_http_methods(["DELETE"])
 @csrf_exempt
 def document_delete(request, doc_id):
@@ -389,12 +720,10 @@ def document_delete(request, doc_id):
 
             chunk_ids = [row[0] for row in cursor.fetchall()]
 
-        # 开始事务
+        # 开始事务，先删除数据库记录，最后更新索引；索引更新失败时数据库记录一并回滚
         with transaction.atomic():
-            # 1. 从向量库中删除向量
-            if chunk_ids:
-                vector_store = VectorStore()
-                vector_store.delete_chunks(database_id, chunk_ids)
+            # 1. 引用这些分块的重复分块转为原始分块
+            promoted_ids = release_duplicates(chunk_ids)
 
             # 2. 删除文档分块记录
             with connection.cursor() as cursor:
@@ -418,6 +747,10 @@ def document_delete(request, doc_id):
                     WHERE id = %s
                 """, [database_id])
 
+            # 5. 从向量和BM25索引中删除分块，为转为原始分块的重复分块生成向量
+            if chunk_ids:
+                _remove_indexed_chunks(database_id, chunk_ids, promoted_ids)
+
         # 删除文件
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -435,3 +768,73 @@ def document_delete(request, doc_id):
             ResponseCode.ERROR.to_dict(message=str(e)),
             status=500
         )
+
+
+def _remove_indexed_chunks(database_id, chunk_ids, promoted_ids):
+    """在数据库中删除分块后调用：从索引中增量删除分块，并为转为原始分块的重复分块生成向量
+
+    嵌入模型不可用时只删除分块，转为原始分块的重复分块在下次重建索引时生成向量
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT embedding_model_id, index_type, reduced_dimension, dimension_reduction
+            FROM knowledge_database WHERE id = %s
+        """, [database_id])
+        embedding_model_id, index_type, reduced_dimension, dimension_reduction = cursor.fetchone()
+
+    embedding_model = None
+    if promoted_ids:
+        from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+        embedding_model = get_knowledge_embedding_model(embedding_model_id)
+        if embedding_model is None:
+            logger.warning(f"没有加载的嵌入模型，知识库 {database_id} 中 {len(promoted_ids)} 个转为原始分块的重复分块"
+                           f"暂未生成向量，请加载嵌入模型后重建索引")
+
+    if embedding_model is None:
+        VectorStore().delete_chunks(database_id, chunk_ids)
+        return
+
+    placeholders = ','.join(['%s'] * len(promoted_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT id, content FROM knowledge_document_chunk WHERE id IN ({placeholders})", promoted_ids)
+        promoted = cursor.fetchall()
+    embed_chunk_ids = [chunk_id for chunk_id, _ in promoted]
+    embed_chunks = [content for _, content in promoted]
+    # 先生成向量再打开写入器，缩短持有索引锁的时间
+    vectors, _ = embed_texts_for_ingestion(embedding_model_id, embedding_model, embed_chunks)
+
+    vector_store = VectorStore(
+        vector_dimension=embedding_model.get_dimension(), index_type=index_type,
+        reduced_dimension=reduced_dimension, reduction_method=dimension_reduction
+    )
+    index_writer = vector_store.open_index_writer(database_id)
+    try:
+        index_writer.remove(chunk_ids)
+        vector_ids = index_writer.add(embed_chunk_ids, vectors, embed_chunks)
+        with connection.cursor() as cursor:
+            cursor.executemany("""
+                UPDATE knowledge_document_chunk 
+                SET vector_id = %s
+                WHERE id = %s
+            """, [[str(vector_id), chunk_id] for vector_id, chunk_id in zip(vector_ids, embed_chunk_ids)])
+    except Exception:
+        index_writer.discard()
+        raise
+    index_writer.save()
+
+
+def _insert_chunks(document_id, database_id, rows):
+    """写入文档分块记录，rows 为 [(分块序号, 内容, SimHash签名, 标题路径)]，返回分块ID列表"""
+    chunk_ids = []
+    with connection.cursor() as cursor:
+        for chunk_index, chunk_text, signature, heading_path in rows:
+            cursor.execute("""
+                INSERT INTO knowledge_document_chunk 
+                (document_id, database_id, chunk_index, content, content_hash, simhash, heading_path)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, [document_id, database_id, chunk_index, chunk_text, content_hash(chunk_text), signature, heading_path])
+
+            # 获取分块ID
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            chunk_ids.append(cursor.fetchone()[0])
+    return chunk_ids
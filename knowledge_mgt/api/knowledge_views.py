@@ -16,6 +16,10 @@ from open_ragbook_server.utils.db_utils import (
     check_record_exists, get_record_by_id, get_last_insert_id
 )
 
+from knowledge_mgt.utils.dedup import DUPLICATE_POLICIES
+from knowledge_mgt.utils.dimension_reduction import REDUCTION_METHODS
+from knowledge_mgt.utils.document_processor import VectorStore
+
 # 获取模块日志记录器
 logger = logging.getLogger('knowledge_mgt')
 
@@ -40,6 +44,10 @@ def knowledge_database_list(request):
                 embedding_model_id,
                 vector_dimension, 
                 index_type, 
+                reduced_dimension,
+                dimension_reduction,
+                duplicate_policy,
+                max_file_size,
                 doc_count, 
                 username, 
                 create_time, 
@@ -91,6 +99,28 @@ def create_knowledge_database(request):
         embedding_model_id = request_data.get('embedding_model_id')
         vector_dimension = request_data.get('vector_dimension', 384)
         index_type = request_data.get('index_type')
+        reduced_dimension = request_data.get('reduced_dimension') or None
+        dimension_reduction = request_data.get('dimension_reduction') or None
+        duplicate_policy = request_data.get('duplicate_policy') or 'keep'
+        if duplicate_policy not in DUPLICATE_POLICIES:
+            return create_error_response(f"不支持的重复分块处理策略: {duplicate_policy}")
+        max_file_size, error_message = _parse_max_file_size(request_data.get('max_file_size'))
+        if error_message:
+            return create_error_response(error_message)
+        
+        # 校验降维配置
+        if reduced_dimension:
+            try:
+                reduced_dimension = int(reduced_dimension)
+            except (TypeError, ValueError):
+                return create_error_response("降维维度必须是整数")
+            if not 0 < reduced_dimension < int(vector_dimension):
+                return create_error_response(f"降维维度必须在 1 到 {int(vector_dimension) - 1} 之间")
+            dimension_reduction = dimension_reduction or 'matryoshka'
+            if dimension_reduction not in REDUCTION_METHODS:
+                return create_error_response(f"不支持的降维方式: {dimension_reduction}")
+        else:
+            dimension_reduction = None
         
         logger.debug(f"=== 创建知识库后端调试信息 ===")
         logger.debug(f"接收到的原始数据: {request_data}")
@@ -105,10 +135,12 @@ def create_knowledge_database(request):
         # 插入数据
         sql = """
             INSERT INTO knowledge_database 
-            (name, description, embedding_model_id, vector_dimension, index_type, doc_count, user_id, username)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            (name, description, embedding_model_id, vector_dimension, index_type,
+             reduced_dimension, dimension_reduction, duplicate_policy, max_file_size, doc_count, user_id, username)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        params = [name, description, embedding_model_id, vector_dimension, index_type, 0, user_id, username]
+        params = [name, description, embedding_model_id, vector_dimension, index_type,
+                  reduced_dimension, dimension_reduction, duplicate_policy, max_file_size, 0, user_id, username]
         
         logger.debug(f"准备执行SQL插入，参数: {params}")
         
@@ -158,6 +190,12 @@ def _update_knowledge_database(request, db_id):
         
         name = request_data.get('name')
         description = request_data.get('description', '')
+        duplicate_policy = request_data.get('duplicate_policy')
+        if duplicate_policy is not None and duplicate_policy not in DUPLICATE_POLICIES:
+            return create_error_response(f"不支持的重复分块处理策略: {duplicate_policy}")
+        max_file_size, error_message = _parse_max_file_size(request_data.get('max_file_size'))
+        if error_message:
+            return create_error_response(error_message)
         
         # 获取记录并检查权限
         record = get_record_by_id('knowledge_database', db_id)
@@ -177,9 +215,17 @@ def _update_knowledge_database(request, db_id):
             logger.warning(f"更新知识库失败: ID={db_id}, 名称'{name}'已存在")
             return create_error_response("知识库名称已存在")
         
-        # 更新知识库
-        sql = "UPDATE knowledge_database SET name = %s, description = %s WHERE id = %s"
-        affected_rows = execute_update_with_params(sql, [name, description, db_id])
+        # 更新知识库，重复分块处理策略只对之后入库的文档生效
+        # 未传入 max_file_size 时保留原值，传入空值时恢复为系统配置
+        if 'max_file_size' not in request_data:
+            max_file_size = record.get('max_file_size')
+        sql = """
+            UPDATE knowledge_database SET name = %s, description = %s, duplicate_policy = %s, max_file_size = %s
+            WHERE id = %s
+        """
+        affected_rows = execute_update_with_params(
+            sql, [name, description, duplicate_policy or record.get('duplicate_policy') or 'keep', max_file_size, db_id]
+        )
         
         if affected_rows > 0:
             logger.info(f"成功更新知识库: ID={db_id}, 名称={name}")
@@ -249,3 +295,49 @@ def check_knowledge_database_name(request):
     except Exception as e:
         logger.error(f"检查知识库名称异常: {str(e)}", exc_info=True)
         return create_error_response(str(e), 500)
+
+
+@require_http_methods(["GET"])
+@csrf_exempt
+@jwt_required()
+def knowledge_database_reduction_recall(request, db_id):
+    """评估知识库降维索引的召回率（与完整维度精确检索对比）"""
+    logger.info(f"评估知识库降维召回率: ID={db_id}")
+    
+    try:
+        record = get_record_by_id('knowledge_database', db_id)
+        if not record or not check_resource_permission(request, record['user_id']):
+            return create_error_response("知识库不存在或无权限操作", 404)
+        
+        if not record.get('reduced_dimension'):
+            return create_error_response("该知识库未启用降维")
+        
+        sample_size = int(request.GET.get('sample_size', 100))
+        top_k = int(request.GET.get('top_k', 10))
+        
+        vector_store = VectorStore(vector_dimension=record['vector_dimension'], index_type=record['index_type'])
+        result = vector_store.evaluate_reduction_recall(db_id, sample_size=sample_size, top_k=top_k)
+        if result is None:
+            return create_error_response("知识库索引尚未创建", 404)
+        
+        logger.info(f"知识库 {db_id} 降维召回率: {result}")
+        return create_success_response(result)
+        
+    except ValueError as e:
+        return create_error_response(f"参数错误: {str(e)}")
+    except Exception as e:
+        logger.error(f"评估知识库降维召回率异常: ID={db_id}, 错误={str(e)}", exc_info=True)
+        return create_error_response(str(e), 500)
+
+
+def _parse_max_file_size(value):
+    """校验知识库的单文件大小上限（字节），返回 (上限, 错误信息)，空值表示使用系统配置"""
+    if value in (None, ''):
+        return None, None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None, "文件大小上限必须是整数（字节）"
+    if value <= 0:
+        return None, "文件大小上限必须大于0"
+    return value, None
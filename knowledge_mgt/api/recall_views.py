@@ -1,5 +1,6 @@
 import json
 import logging
+from django.conf import settings
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
@@ -14,6 +15,8 @@ from open_ragbook_server.utils.db_utils import (
 )
 
 from knowledge_mgt.utils.document_processor import VectorStore
+from knowledge_mgt.utils.reranker import rerank_chunks
+from knowledge_mgt.utils.retrieval import select_diverse_chunks
 
 # 获取模块日志记录器
 logger = logging.getLogger('knowledge_mgt')
@@ -46,12 +49,34 @@ def recall_test(request):
         query = request_data.get('query')
         retrieve_count = request_data.get('retrieve_count', 5)
         similarity_threshold = request_data.get('similarity_threshold', 0.3)
+        # 可选的交叉编码器重排序：先召回更多候选，打分后保留 retrieve_count 个
+        rerank_model_id = request_data.get('rerank_model_id')
+        rerank_budget_ms = request_data.get('rerank_budget_ms')
+        # 可选的MMR多样性选择，diversity 即MMR的lambda（0~1），不传时不做MMR
+        diversity = request_data.get('diversity')
+        if diversity is not None:
+            try:
+                diversity = float(diversity)
+            except (TypeError, ValueError):
+                return create_error_response('diversity 必须是0到1之间的数字')
+            if not 0 <= diversity <= 1:
+                return create_error_response('diversity 必须是0到1之间的数字')
+        use_mmr = diversity is not None and diversity < 1
+
+        # 混合检索权重：向量检索与BM25关键词检索按加权倒数排名融合，lexical_weight 为0时只用向量检索
+        try:
+            vector_weight = float(request_data.get('vector_weight', getattr(settings, 'HYBRID_VECTOR_WEIGHT', 1.0)))
+            lexical_weight = float(request_data.get('lexical_weight', getattr(settings, 'HYBRID_LEXICAL_WEIGHT', 1.0)))
+        except (TypeError, ValueError):
+            return create_error_response('vector_weight 和 lexical_weight 必须是数字')
+        if vector_weight < 0 or lexical_weight < 0:
+            return create_error_response('vector_weight 和 lexical_weight 不能为负数')
         
         logger.debug(f"召回检索测试参数: knowledge_id={knowledge_id}, query='{query}', retrieve_count={retrieve_count}, similarity_threshold={similarity_threshold}")
         
         # 获取知识库信息（检查用户权限）
         kb_sql = """
-            SELECT id, name, description, vector_dimension, index_type 
+            SELECT id, name, description, embedding_model_id, vector_dimension, index_type 
             FROM knowledge_database 
             WHERE id = %s
         """
@@ -71,20 +96,21 @@ def recall_test(request):
         knowledge_name = knowledge_info['name']
         vector_dimension = knowledge_info['vector_dimension']
         index_type = knowledge_info['index_type']
+        embedding_model_id = knowledge_info['embedding_model_id']
         
         logger.info(f"开始对知识库'{knowledge_name}'进行召回检索测试")
 
         # 使用向量数据库进行语义检索
         try:
-            # 1. 获取当前加载的本地嵌入模型
-            from knowledge_mgt.utils.embeddings import local_embedding_manager
-            embedding_model = local_embedding_manager.get_current_model()
+            # 1. 获取知识库绑定的嵌入模型（未加载时按需加载到模型池）
+            from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+            embedding_model = get_knowledge_embedding_model(embedding_model_id)
             
             if embedding_model is None:
                 logger.error("没有加载的嵌入模型，无法进行向量检索")
                 return create_error_response('没有加载的嵌入模型，请先在系统管理中加载嵌入模型', 500)
             
-            logger.debug("使用当前加载的本地嵌入模型进行向量检索")
+            logger.debug(f"使用嵌入模型 {embedding_model_id} 进行向量检索")
 
             # 2. 将查询转换为向量
             query_vector = embedding_model.embed_text(query)
@@ -96,22 +122,39 @@ def recall_test(request):
             # 3. 初始化向量存储，使用实际维度
             vector_store = VectorStore(vector_dimension=actual_dimension, index_type=index_type)
 
-            # 4. 在向量数据库中搜索相似文档
-            similar_chunks = vector_store.search(knowledge_id, query_vector, top_k=retrieve_count)
+            # 4. 向量检索与BM25检索混合搜索相似文档，启用MMR或重排序时召回更多候选
+            candidate_factor = 1
+            if use_mmr:
+                candidate_factor = getattr(settings, 'MMR_CANDIDATE_FACTOR', 4)
+            if rerank_model_id:
+                candidate_factor = max(candidate_factor, getattr(settings, 'RERANK_CANDIDATE_FACTOR', 4))
+            similar_chunks = vector_store.hybrid_search(
+                knowledge_id, query, query_vector, top_k=retrieve_count * candidate_factor,
+                vector_weight=vector_weight, lexical_weight=lexical_weight, with_vectors=use_mmr
+            )
 
             # 5. 根据相似度阈值过滤结果
+            lexical_min_score = getattr(settings, 'HYBRID_LEXICAL_MIN_SCORE', 5.0)
+            lexical_similarity_threshold = similarity_threshold * getattr(settings, 'HYBRID_LEXICAL_SIMILARITY_RATIO', 0.5)
             filtered_chunks = []
             for chunk in similar_chunks:
                 distance = chunk['distance']
                 similarity_score = 1.0 / (1.0 + distance) if distance >= 0 else 0.0
                 
-                # 只保留相似度高于阈值的结果
-                if similarity_score >= similarity_threshold:
+                # 只保留相似度高于阈值的结果；相似度不足时，BM25得分达到绝对下限、且相似度不低于放宽后阈值的关键词强命中也保留
+                lexical_match = (chunk.get('lexical_score') or 0.0) >= lexical_min_score and \
+                    similarity_score >= lexical_similarity_threshold
+                if similarity_score >= similarity_threshold or lexical_match:
                     chunk['similarity'] = similarity_score
                     filtered_chunks.append(chunk)
                     
             logger.info(f"检索到 {len(similar_chunks)} 个结果，过滤后保留 {len(filtered_chunks)} 个结果（相似度阈值: {similarity_threshold}）")
 
+            # MMR多样性选择，后续还要重排序时多保留一倍候选
+            if use_mmr:
+                mmr_count = retrieve_count * 2 if rerank_model_id else retrieve_count
+                filtered_chunks = select_diverse_chunks(query_vector, filtered_chunks, mmr_count, diversity)
+
             # 6. 查询对应的文档分块内容（需要检查用户权限）
             results = []
             if filtered_chunks:
@@ -120,7 +163,7 @@ def recall_test(request):
                 # 构建IN查询的占位符
                 placeholders = ','.join(['%s'] * len(chunk_ids))
                 chunk_sql = f"""
-                    SELECT dc.id, dc.content, d.filename, d.file_path
+                    SELECT dc.id, dc.content, dc.heading_path, d.filename, d.file_path
                     FROM knowledge_document_chunk dc
                     JOIN knowledge_document d ON dc.document_id = d.id
                     WHERE dc.id IN ({placeholders}) AND d.database_id = %s
@@ -147,9 +190,16 @@ def recall_test(request):
                             'filename': chunk_data['filename'],
                             'similarity': filtered_chunk['similarity'],
                             'distance': filtered_chunk['distance'],
-                            'metadata': None  # 当前表结构没有metadata字段
+                            'lexical_score': filtered_chunk.get('lexical_score'),
+                            'lexical_relevance': filtered_chunk.get('lexical_relevance'),
+                            'fusion_score': filtered_chunk.get('fusion_score'),
+                            'metadata': {'heading_path': chunk_data['heading_path']} if chunk_data['heading_path'] else None
                         })
 
+            # 7. 交叉编码器重排序
+            if rerank_model_id and results:
+                results = rerank_chunks(rerank_model_id, query, results, retrieve_count, rerank_budget_ms)
+
             logger.info(f"召回检索测试完成，返回 {len(results)} 个结果")
             
             return create_success_response({
@@ -159,7 +209,11 @@ def recall_test(request):
                 'knowledge_base': knowledge_name,
                 'query': query,
                 'retrieve_count': retrieve_count,
-                'similarity_threshold': similarity_threshold
+                'similarity_threshold': similarity_threshold,
+                'rerank_model_id': rerank_model_id,
+                'diversity': diversity,
+                'vector_weight': vector_weight,
+                'lexical_weight': lexical_weight
             })
 
         except Exception as vector_error:
@@ -5,6 +5,7 @@ import uuid
 import threading
 import time
 from datetime import datetime
+from django.conf import settings
 from django.db import connection, transaction
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -17,7 +18,17 @@ from open_ragbook_server.utils.auth_utils import (
     create_error_response, create_success_response
 )
 from open_ragbook_server.utils.db_utils import execute_query_with_params
+from knowledge_mgt.utils.dedup import NearDuplicateDetector
 from knowledge_mgt.utils.document_processor import DocumentProcessor, VectorStore
+from knowledge_mgt.utils.token_estimator import get_token_counter
+from knowledge_mgt.utils.upload_handlers import (
+    archive_uploads, check_uploaded_file, find_document_by_hash, format_file_size, hashed_uploads
+)
+from knowledge_mgt.utils.embedding_workers import embed_texts_for_ingestion
+from knowledge_mgt.utils.embeddings import merge_embedding_stats, summarize_embedding_stats
+from knowledge_mgt.utils.ingestion import (
+    ARCHIVE_EXTENSIONS, BulkIngestionJob, insert_document_chunks, is_archive, iter_windows
+)
 
 # 获取模块日志记录器
 logger = logging.getLogger('knowledge_mgt')
@@ -37,6 +48,7 @@ queue_status_cache = {
 @require_http_methods(["POST"])
 @csrf_exempt
 @jwt_required()
+@hashed_uploads
 def create_upload_task(request):
     """创建文档上传任务"""
     try:
@@ -58,20 +70,15 @@ def create_upload_task(request):
         max_chunk_size = int(request.POST.get('max_chunk_size', 2000))
         file = request.FILES.get('file')
 
+        # 验证文件格式和大小（按知识库配置的上限）
+        upload_error = check_uploaded_file(request, file, database_id)
+        if upload_error:
+            return create_error_response(*upload_error)
+
         # 验证参数
         if not database_id or not file:
             return create_error_response("缺少必要参数", 400)
 
-        # 验证文件格式
-        file_extension = os.path.splitext(file.name)[1].lower()
-        if file_extension != '.txt':
-            return create_error_response("只支持上传 .txt 格式的文件", 400)
-
-        # 验证文件大小
-        max_size = 5 * 1024 * 1024  # 5MB
-        if file.size > max_size:
-            return create_error_response("文件大小不能超过 5MB", 400)
-
         # 验证知识库是否存在
         kb_sql = "SELECT id, name FROM knowledge_database WHERE id = %s"
         kb_params = [database_id]
@@ -88,6 +95,45 @@ def create_upload_task(request):
         # 生成任务ID
         task_id = str(uuid.uuid4())
 
+        # 内容相同的文件已入库或正在排队时不重复处理
+        file_hash = getattr(file, 'sha256', None)
+        existing_document = find_document_by_hash(database_id, file_hash)
+        if existing_document:
+            document_id, chunk_count = existing_document
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO document_upload_task
+                    (task_id, user_id, username, database_id, filename, file_size, file_hash,
+                     chunking_method, status, progress, chunk_count, document_id, completed_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, [
+                    task_id, user_id, username, database_id, file.name, file.size, file_hash,
+                    chunking_method, 'completed', 100, chunk_count, document_id, datetime.now()
+                ])
+            logger.info(f"文件 {file.name} 与知识库 {database_id} 中的文档 {document_id} 内容相同，跳过入库")
+            return create_success_response({
+                "task_id": task_id,
+                "filename": file.name,
+                "status": "completed",
+                "document_id": document_id,
+                "duplicate": True
+            })
+
+        if file_hash:
+            queued_task = execute_query_with_params("""
+                SELECT task_id, status FROM document_upload_task
+                WHERE database_id = %s AND file_hash = %s AND status IN ('pending', 'processing')
+                ORDER BY id LIMIT 1
+            """, [database_id, file_hash])
+            if queued_task:
+                logger.info(f"文件 {file.name} 与排队中的任务 {queued_task[0]['task_id']} 内容相同，不再重复创建任务")
+                return create_success_response({
+                    "task_id": queued_task[0]['task_id'],
+                    "filename": file.name,
+                    "status": queued_task[0]['status'],
+                    "duplicate": True
+                })
+
         # 保存文件
         document_processor = DocumentProcessor()
         file_info = document_processor.save_file(file, database_id)
@@ -96,14 +142,14 @@ def create_upload_task(request):
         with connection.cursor() as cursor:
             cursor.execute("""
                 INSERT INTO document_upload_task 
-                (task_id, user_id, username, database_id, filename, file_path, file_size,
+                (task_id, user_id, username, database_id, filename, file_path, file_size, file_hash,
                  chunking_method, chunk_size, similarity_threshold, overlap_size,
                  custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
                  status, progress)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, [
                 task_id, user_id, username, database_id, file_info['filename'], 
-                file_info['file_path'], file_info['file_size'],
+                file_info['file_path'], file_info['file_size'], file_info['file_hash'],
                 chunking_method, chunk_size, similarity_threshold, overlap_size,
                 custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
                 'pending', 0
@@ -125,6 +171,144 @@ def create_upload_task(request):
         return create_error_response(str(e), 500)
 
 
+@require_http_methods(["POST"])
+@csrf_exempt
+@jwt_required()
+@archive_uploads
+def create_bulk_upload_task(request):
+    """创建批量导入任务：上传zip/tar压缩包（archive），或由管理员指定服务器目录（source_path）
+
+    压缩包中的每个文件生成一条上传任务记录，共用同一个批次ID，通过批次状态接口查询进度
+    """
+    try:
+        user_info = get_user_from_request(request)
+        user_id = user_info.get('user_id')
+        username = user_info.get('user_name')
+
+        database_id = request.POST.get('database_id')
+        archive = request.FILES.get('archive')
+        source_path = request.POST.get('source_path')
+        chunking_params = {
+            'chunking_method': request.POST.get('chunking_method', 'token'),
+            'chunk_size': int(request.POST.get('chunk_size', 500)),
+            'similarity_threshold': float(request.POST.get('similarity_threshold', 0.7)),
+            'overlap_size': int(request.POST.get('overlap_size', 100)),
+            'custom_delimiter': request.POST.get('custom_delimiter', '\n\n'),
+            'window_size': int(request.POST.get('window_size', 3)),
+            'step_size': int(request.POST.get('step_size', 1)),
+            'min_chunk_size': int(request.POST.get('min_chunk_size', 50)),
+            'max_chunk_size': int(request.POST.get('max_chunk_size', 2000))
+        }
+
+        rejected = request.rejected_uploads.get('archive')
+        if rejected:
+            return create_error_response(f"压缩包 {rejected[0]} 超过大小上限 {format_file_size(rejected[1])}", 413)
+        if not database_id or not (archive or source_path):
+            return create_error_response("缺少必要参数", 400)
+
+        kb_sql = "SELECT id, name FROM knowledge_database WHERE id = %s"
+        kb_params = [database_id]
+        if user_info.get('role_id') != 1:
+            kb_sql += " AND user_id = %s"
+            kb_params.append(user_id)
+        if not execute_query_with_params(kb_sql, kb_params):
+            return create_error_response('知识库不存在或无权限访问', 404)
+
+        batch_id = str(uuid.uuid4())
+        if archive:
+            if not is_archive(archive.name):
+                return create_error_response(f"只支持 {', '.join(ARCHIVE_EXTENSIONS)} 格式的压缩包", 400)
+            # 压缩包保存到临时目录，导入完成后删除
+            archive_dir = os.path.join(settings.MEDIA_ROOT, 'bulk_uploads')
+            os.makedirs(archive_dir, exist_ok=True)
+            source_path = os.path.join(archive_dir, f"{batch_id}_{os.path.basename(archive.name)}")
+            with open(source_path, 'wb') as destination:
+                for chunk in archive.chunks():
+                    destination.write(chunk)
+            cleanup_path = source_path
+        else:
+            # 服务器目录只允许管理员导入，且必须位于 BULK_INGESTION_ALLOWED_DIRS 配置的目录下
+            real_path = os.path.realpath(source_path)
+            allowed_dirs = [os.path.realpath(path) for path in getattr(settings, 'BULK_INGESTION_ALLOWED_DIRS', [])]
+            if user_info.get('role_id') != 1 or not any(
+                    os.path.commonpath([real_path, allowed_dir]) == allowed_dir for allowed_dir in allowed_dirs):
+                return create_error_response("无权导入该服务器目录", 403)
+            if not os.path.exists(real_path):
+                return create_error_response("导入目录不存在", 404)
+            source_path = real_path
+            cleanup_path = None
+
+        job = BulkIngestionJob(database_id, user_id, username, chunking_params, batch_id=batch_id)
+
+        def run_job():
+            # 与单文件上传任务共用处理锁，避免并发写入同一知识库的索引
+            with task_processing_lock:
+                try:
+                    job.run(source_path)
+                except Exception as e:
+                    logger.error(f"批量导入 {batch_id} 失败: {str(e)}", exc_info=True)
+                finally:
+                    queue_status_cache['data'] = None
+                    if cleanup_path and os.path.exists(cleanup_path):
+                        os.remove(cleanup_path)
+
+        threading.Thread(target=run_job, daemon=True).start()
+        logger.info(f"创建批量导入任务: {batch_id}, 知识库 {database_id}, 导入源 {source_path}")
+
+        return create_success_response({
+            "batch_id": batch_id,
+            "status": "pending"
+        })
+
+    except Exception as e:
+        logger.error(f"创建批量导入任务失败: {str(e)}", exc_info=True)
+        return create_error_response(str(e), 500)
+
+
+@require_http_methods(["GET"])
+@csrf_exempt
+@jwt_required()
+def get_bulk_upload_status(request, batch_id):
+    """获取批量导入的进度和每个文件的状态"""
+    try:
+        user_info = get_user_from_request(request)
+
+        sql = """
+            SELECT task_id, filename, status, progress, error_message, chunk_count, document_id,
+                   started_at, completed_at
+            FROM document_upload_task
+            WHERE batch_id = %s
+        """
+        params = [batch_id]
+        if user_info.get('role_id') != 1:
+            sql += " AND user_id = %s"
+            params.append(user_info.get('user_id'))
+        sql += " ORDER BY id"
+
+        tasks = execute_query_with_params(sql, params)
+        if not tasks:
+            return create_error_response('批次不存在', 404)
+
+        status_counts = {status: 0 for status in ('pending', 'processing', 'completed', 'failed')}
+        for task in tasks:
+            status_counts[task['status']] += 1
+            for time_field in ['started_at', 'completed_at']:
+                if task[time_field]:
+                    task[time_field] = task[time_field].strftime("%Y-%m-%d %H:%M:%S")
+
+        return create_success_response({
+            "batch_id": batch_id,
+            "total": len(tasks),
+            "status_counts": status_counts,
+            "chunk_count": sum(task['chunk_count'] or 0 for task in tasks if task['status'] == 'completed'),
+            "tasks": tasks
+        })
+
+    except Exception as e:
+        logger.error(f"获取批量导入状态失败: {str(e)}", exc_info=True)
+        return create_error_response(str(e), 500)
+
+
 @require_http_methods(["GET"])
 @csrf_exempt
 @jwt_required()
@@ -244,119 +428,149 @@ def process_upload_task(task_id):
             # 更新进度：开始处理文档
             update_task_status(task_id, 'processing', 10)
             
-            # 处理文档内容
-            doc_text = document_processor.process_document(task_info['file_path'])
-            if not doc_text or doc_text.startswith("处理文档失败"):
-                raise Exception(f"处理文档内容失败: {doc_text}")
-            
-            # 更新进度：文档处理完成
-            update_task_status(task_id, 'processing', 30)
-            
-            # 文本分块
-            chunks = document_processor.split_text(doc_text)
-            chunk_count = len(chunks)
-            
-            if chunk_count == 0:
-                raise Exception("文档分块失败，未生成有效分块")
-            
-            # 更新进度：分块完成
-            update_task_status(task_id, 'processing', 50)
-            
-            # 获取嵌入模型
-            from knowledge_mgt.utils.embeddings import local_embedding_manager
-            embedding_model = local_embedding_manager.get_current_model()
-            
-            if embedding_model is None:
-                raise Exception("没有加载的嵌入模型，请先在系统管理中加载嵌入模型")
-            
             # 获取知识库信息
             kb_info = get_knowledge_database_info(task_info['database_id'])
             if not kb_info:
                 raise Exception("知识库不存在")
             
-            # 更新进度：开始生成向量
-            update_task_status(task_id, 'processing', 60)
+            # 获取知识库绑定的嵌入模型（未加载时按需加载到模型池）
+            from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+            embedding_model = get_knowledge_embedding_model(kb_info['embedding_model_id'])
+            
+            if embedding_model is None:
+                raise Exception("没有加载的嵌入模型，请先在系统管理中加载嵌入模型")
+            
+            # 配置为按模型分词器计数时，Token分块使用嵌入模型的真实分词结果；嵌入语义分块使用同一模型编码句子
+            document_processor.token_counter = get_token_counter(embedding_model)
+            document_processor.embedding_model = embedding_model
             
             # 初始化向量存储
             actual_dimension = embedding_model.get_dimension()
-            vector_store = VectorStore(vector_dimension=actual_dimension, index_type=kb_info['index_type'])
+            vector_store = VectorStore(
+                vector_dimension=actual_dimension, index_type=kb_info['index_type'],
+                reduced_dimension=kb_info['reduced_dimension'], reduction_method=kb_info['dimension_reduction']
+            )
             
-            # 开始数据库事务
-            with transaction.atomic():
-                # 1. 添加文档记录
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO knowledge_document 
-                        (database_id, filename, file_path, file_type, file_size, 
-                         chunking_method, chunk_size, similarity_threshold, overlap_size, 
-                         chunk_count, user_id, username)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, [
-                        task_info['database_id'], task_info['filename'], task_info['file_path'],
-                        'txt', task_info['file_size'],
-                        task_info['chunking_method'], task_info['chunk_size'], 
-                        task_info['similarity_threshold'], task_info['overlap_size'],
-                        chunk_count, task_info['user_id'], task_info['username']
-                    ])
-                    
-                    cursor.execute("SELECT LAST_INSERT_ID()")
-                    document_id = cursor.fetchone()[0]
-                
-                # 更新进度：文档记录创建完成
-                update_task_status(task_id, 'processing', 70)
+            # 更新进度：开始流式处理文档
+            update_task_status(task_id, 'processing', 20)
+            
+            # 1. 添加文档记录，分块数在处理完成后更新；各窗口的写入随即提交，任务进度在处理过程中可见
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO knowledge_document 
+                    (database_id, filename, file_path, file_type, file_size, file_hash,
+                     chunking_method, chunk_size, similarity_threshold, overlap_size, 
+                     custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
+                     chunk_count, user_id, username)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, [
+                    task_info['database_id'], task_info['filename'], task_info['file_path'],
+                    os.path.splitext(task_info['filename'])[1][1:].lower(), task_info['file_size'],
+                    task_info['file_hash'],
+                    task_info['chunking_method'], task_info['chunk_size'], 
+                    task_info['similarity_threshold'], task_info['overlap_size'],
+                    task_info['custom_delimiter'], task_info['window_size'], task_info['step_size'],
+                    task_info['min_chunk_size'], task_info['max_chunk_size'],
+                    0, task_info['user_id'], task_info['username']
+                ])
                 
-                # 2. 添加文档分块记录
-                chunk_ids = []
-                for i, chunk_text in enumerate(chunks):
-                    with connection.cursor() as cursor:
-                        cursor.execute("""
-                            INSERT INTO knowledge_document_chunk 
-                            (document_id, database_id, chunk_index, content)
-                            VALUES (%s, %s, %s, %s)
-                        """, [document_id, task_info['database_id'], i, chunk_text])
+                cursor.execute("SELECT LAST_INSERT_ID()")
+                document_id = cursor.fetchone()[0]
+            
+            # 2. 流式提取、分块，按窗口写入分块、生成向量并追加到索引，内存占用与文档大小无关；
+            #    每个窗口单独打开索引写入器，只在追加和保存期间持有知识库的索引锁
+            vector_store.create_index(task_info['database_id'])
+            duplicate_detector = NearDuplicateDetector.load(task_info['database_id'], kb_info['duplicate_policy'])
+            chunk_count = 0
+            embedding_stats = None
+            # 已写入索引的分块ID，处理失败时从索引中删除
+            indexed_chunk_ids = []
+            try:
+                chunk_windows = iter_windows(
+                    document_processor.iter_chunks(task_info['file_path']),
+                    getattr(settings, 'INGESTION_WINDOW_SIZE', 256)
+                )
+                for window_index, chunks in enumerate(chunk_windows):
+                    # 按知识库的重复分块策略决定哪些分块写入、哪些生成向量
+                    cached_vectors = document_processor.take_chunk_vectors(chunks)
+                    heading_paths = document_processor.take_chunk_headings(chunks)
+                    plan = duplicate_detector.plan(chunks)
+                    chunk_ids = insert_document_chunks(
+                        document_id, task_info['database_id'], chunk_count,
+                        [chunks[i] for i in plan['store']], [plan['signatures'][i] for i in plan['store']],
+                        [heading_paths[i] for i in plan['store']]
+                    )
+                    duplicate_detector.bind(plan, chunk_ids)
+                    
+                    chunk_id_by_position = dict(zip(plan['store'], chunk_ids))
+                    embed_chunks = [chunks[i] for i in plan['embed']]
+                    embed_chunk_ids = [chunk_id_by_position[i] for i in plan['embed']]
+                    if embed_chunks:
+                        # 启用嵌入工作进程池时，向量在独立进程中生成，不影响同机的对话请求；先生成向量再打开写入器
+                        start_time = time.perf_counter()
+                        vectors, stats = embed_texts_for_ingestion(
+                            kb_info['embedding_model_id'], embedding_model, embed_chunks,
+                            [cached_vectors[i] for i in plan['embed']]
+                        )
+                        duplicate_detector.record_embedding(len(embed_chunks), time.perf_counter() - start_time)
+                        embedding_stats = merge_embedding_stats(embedding_stats, summarize_embedding_stats(stats))
                         
-                        cursor.execute("SELECT LAST_INSERT_ID()")
-                        chunk_id = cursor.fetchone()[0]
-                        chunk_ids.append(chunk_id)
-                
-                # 更新进度：分块记录创建完成
-                update_task_status(task_id, 'processing', 80)
-                
-                # 3. 生成向量并存储
-                vector_store.create_index(task_info['database_id'])
-                vectors = embedding_model.embed_texts(chunks)
-                vector_ids = vector_store.add_vectors(task_info['database_id'], chunk_ids, vectors)
-                
-                # 更新进度：向量生成完成
-                update_task_status(task_id, 'processing', 90)
-                
-                # 4. 更新分块的向量ID
-                if vector_ids:
-                    for i, chunk_id in enumerate(chunk_ids):
-                        vector_id = i if i < len(vector_ids) else None
-                        if vector_id is not None:
+                        index_writer = vector_store.open_index_writer(task_info['database_id'])
+                        try:
+                            vector_ids = index_writer.add(embed_chunk_ids, vectors, embed_chunks)
+                            # 更新分块的向量ID
                             with connection.cursor() as cursor:
-                                cursor.execute("""
+                                cursor.executemany("""
                                     UPDATE knowledge_document_chunk 
                                     SET vector_id = %s
                                     WHERE id = %s
-                                """, [str(vector_id), chunk_id])
-                
-                # 5. 更新知识库的文档数量
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        UPDATE knowledge_database 
-                        SET doc_count = doc_count + 1
-                        WHERE id = %s
-                    """, [task_info['database_id']])
+                                """, [[str(vector_id), chunk_id]
+                                      for vector_id, chunk_id in zip(vector_ids, embed_chunk_ids)])
+                        except Exception:
+                            index_writer.discard()
+                            raise
+                        index_writer.save()
+                        indexed_chunk_ids.extend(embed_chunk_ids)
+                    
+                    chunk_count += len(chunk_ids)
+                    update_task_status(task_id, 'processing', min(90, 20 + (window_index + 1) * 5),
+                                       chunk_count=chunk_count)
                 
-                # 更新任务状态为完成
-                update_task_status(task_id, 'completed', 100, 
-                                 completed_at=datetime.now(), 
-                                 chunk_count=chunk_count,
-                                 document_id=document_id)
+                # 全部分块都因重复被跳过时文档仍然有效
+                if chunk_count == 0 and not duplicate_detector.stats['skipped_chunks']:
+                    raise Exception("文档分块失败，未生成有效分块")
                 
-                logger.info(f"任务 {task_id} 处理完成，生成文档ID: {document_id}, 分块数: {chunk_count}")
+                # 3. 更新文档分块数、向量化和去重统计，以及知识库的文档数量
+                if embedding_stats and embedding_stats['over_length_chunks']:
+                    logger.info(f"文档 {document_id} 有 {embedding_stats['over_length_chunks']} 个分块超过 "
+                                f"{embedding_stats['max_tokens']} tokens，已切分为多个窗口编码后平均")
+                deduplication = duplicate_detector.report()
+                if deduplication['duplicate_chunks']:
+                    logger.info(f"文档 {document_id} 检测到 {deduplication['duplicate_chunks']} 个近似重复分块，"
+                                f"策略 {deduplication['policy']}，节省 {deduplication['saved_embeddings']} 次向量化，"
+                                f"约 {deduplication['saved_embedding_seconds']} 秒")
+                embedding_stats = dict(embedding_stats or {}, deduplication=deduplication)
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("""
+                            UPDATE knowledge_document SET chunk_count = %s, embedding_stats = %s WHERE id = %s
+                        """, [chunk_count, json.dumps(embedding_stats), document_id])
+                        cursor.execute("""
+                            UPDATE knowledge_database 
+                            SET doc_count = doc_count + 1
+                            WHERE id = %s
+                        """, [task_info['database_id']])
+            except Exception:
+                _discard_partial_document(vector_store, task_info['database_id'], document_id, indexed_chunk_ids)
+                raise
+            
+            # 更新任务状态为完成
+            update_task_status(task_id, 'completed', 100, 
+                             completed_at=datetime.now(), 
+                             chunk_count=chunk_count,
+                             document_id=document_id)
+            
+            logger.info(f"任务 {task_id} 处理完成，生成文档ID: {document_id}, 分块数: {chunk_count}")
                 
         except Exception as e:
             logger.error(f"处理任务 {task_id} 失败: {str(e)}", exc_info=True)
@@ -366,6 +580,20 @@ def process_upload_task(task_id):
             current_processing_task = None
 
 
+def _discard_partial_document(vector_store, database_id, document_id, indexed_chunk_ids):
+    """处理失败时删除已写入的文档和分块（分块随外键级联删除），再从索引中删除已写入的分块
+
+    删除失败时只记录日志，重建索引时会清理
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM knowledge_document WHERE id = %s", [document_id])
+        if indexed_chunk_ids:
+            vector_store.delete_chunks(database_id, indexed_chunk_ids)
+    except Exception as e:
+        logger.error(f"清理处理失败的文档 {document_id} 失败，请重建知识库 {database_id} 的索引: {str(e)}")
+
+
 def update_task_status(task_id, status, progress=None, error_message=None, 
                       started_at=None, completed_at=None, chunk_count=None, document_id=None):
     """更新任务状态"""
@@ -417,7 +645,7 @@ def get_task_info(task_id):
     try:
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT task_id, user_id, username, database_id, filename, file_path, file_size,
+                SELECT task_id, user_id, username, database_id, filename, file_path, file_size, file_hash,
                        chunking_method, chunk_size, similarity_threshold, overlap_size,
                        custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size
                 FROM document_upload_task
@@ -440,7 +668,8 @@ def get_knowledge_database_info(database_id):
     try:
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT id, name, vector_dimension, index_type
+                SELECT id, name, embedding_model_id, vector_dimension, index_type,
+                       reduced_dimension, dimension_reduction, duplicate_policy
                 FROM knowledge_database
                 WHERE id = %s
             """, [database_id])
@@ -450,8 +679,12 @@ def get_knowledge_database_info(database_id):
                 return {
                     'id': row[0],
                     'name': row[1],
-                    'vector_dimension': row[2],
-                    'index_type': row[3]
+                    'embedding_model_id': row[2],
+                    'vector_dimension': row[3],
+                    'index_type': row[4],
+                    'reduced_dimension': row[5],
+                    'dimension_reduction': row[6],
+                    'duplicate_policy': row[7]
                 }
             return None
             
@@ -21,4 +21,4 @@ class KnowledgeMgtConfig(AppConfig):
             logger.info("系统未检测到可用GPU，将使用CPU进行计算")
         
         logger.info("嵌入模型管理器已初始化，支持按需加载本地模型")
-        logger.info("本地嵌入模型将在首次使用时按需加载，同时只能加载一个本地模型")
+        logger.info("本地嵌入模型将在首次使用时按需加载，多个模型按内存预算常驻并按LRU淘汰")
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from knowledge_mgt.utils.embeddings import (
+    EmbeddingModel, PRECISION_DTYPES, get_cpu_cores, get_embedding_model_by_id, get_torch_thread_settings
+)
+
+logger = logging.getLogger('knowledge_mgt')
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'embedding_benchmark_corpus.txt')
+BACKENDS = ('local', 'service')
+
+
+class Command(BaseCommand):
+    help = ('嵌入性能基准测试：按批大小、线程数、运行方式和推理精度组合，测量 embed_texts 的吞吐量（条/秒）'
+            '和单批延迟p50/p99，结果写入JSON文件')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-id', type=int, action='append', dest='model_ids', default=[],
+                            help='embedding_model表中的模型ID，可重复指定')
+        parser.add_argument('--model-path', action='append', dest='model_paths', default=[],
+                            help='不经过数据库直接测试的本地模型路径或模型名称，可重复指定')
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 64], help='批大小')
+        parser.add_argument('--threads', type=int, nargs='+', default=None,
+                            help='torch计算线程数，默认使用当前进程的线程配置（仅对本地运行有效）')
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['local'],
+                            help='本地模型的运行方式：local 进程内加载，service 通过 EMBEDDING_SERVICE_URL 调用嵌入服务')
+        parser.add_argument('--precisions', nargs='+', choices=list(PRECISION_DTYPES), default=['fp32'],
+                            help='推理精度（仅对进程内加载有效，低精度校验不通过时按fp32记录）')
+        parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH, help='测试语料文件，每行一条文本')
+        parser.add_argument('--corpus-size', type=int, default=256, help='每轮编码的文本条数，语料不足时循环使用')
+        parser.add_argument('--rounds', type=int, default=3, help='每个组合重复的轮数')
+        parser.add_argument('--output', default=None, help='结果文件路径，默认写入当前目录')
+
+    def handle(self, *args, **options):
+        if not options['model_ids'] and not options['model_paths']:
+            raise CommandError('请通过 --model-id 或 --model-path 指定要测试的模型')
+
+        texts = self._load_corpus(options['corpus'], options['corpus_size'])
+        results = []
+        for model_config in self._iter_model_configs(options):
+            results.extend(self._benchmark_model(model_config, texts, options))
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'environment': self._get_environment(),
+            'corpus': {
+                'path': options['corpus'],
+                'texts': len(texts),
+                'total_chars': sum(len(text) for text in texts)
+            },
+            'rounds': options['rounds'],
+            'results': results
+        }
+
+        output_path = options['output'] or f"embedding_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        self._print_results(results)
+        self.stdout.write(self.style.SUCCESS(f"基准测试结果已写入: {output_path}"))
+
+    def _load_corpus(self, corpus_path, corpus_size):
+        """读取语料，循环补足到 corpus_size 条"""
+        if not os.path.exists(corpus_path):
+            raise CommandError(f"语料文件不存在: {corpus_path}")
+        with open(corpus_path, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+        if not lines:
+            raise CommandError(f"语料文件为空: {corpus_path}")
+        return [lines[i % len(lines)] for i in range(corpus_size)]
+
+    def _iter_model_configs(self, options):
+        for model_id in options['model_ids']:
+            model_config = get_embedding_model_by_id(model_id)
+            if not model_config:
+                raise CommandError(f"嵌入模型不存在或已禁用: {model_id}")
+            if model_config['model_type'] == 'cross_encoder':
+                raise CommandError(f"模型 {model_id} 是重排序模型，不能进行嵌入测试")
+            yield model_config
+        for model_path in options['model_paths']:
+            yield {
+                'id': None,
+                'name': model_path,
+                'api_type': 'local',
+                'model_name': model_path,
+                'local_path': model_path if os.path.exists(model_path) else None
+            }
+
+    def _benchmark_model(self, model_config, texts, options):
+        """按运行方式和精度逐个加载模型实例，测完一个卸载一个"""
+        if model_config['api_type'] != 'local':
+            from knowledge_mgt.utils.online_embeddings import OnlineEmbeddingModel
+            model = OnlineEmbeddingModel(model_config)
+            model.load_model()
+            try:
+                return self._run_grid(model, model_config, 'online', texts, options, threads=[None])
+            finally:
+                model.unload_model()
+
+        results = []
+        for backend in options['backends']:
+            if backend == 'service':
+                service_url = getattr(settings, 'EMBEDDING_SERVICE_URL', '')
+                if not service_url or model_config['id'] is None:
+                    self.stderr.write(f"跳过 {model_config['name']} 的service测试：需要配置 EMBEDDING_SERVICE_URL 并使用 --model-id")
+                    continue
+                model = EmbeddingModel(model_config['model_name'], model_config, service_url=service_url)
+                # 服务进程的线程数和精度由服务端决定
+                grid = [(model, [None])]
+            else:
+                grid = []
+                for precision in options['precisions']:
+                    config = dict(model_config, inference_precision=precision)
+                    grid.append((EmbeddingModel(model_config['model_name'], config), options['threads'] or [None]))
+
+            for model, threads in grid:
+                model.load_model()
+                try:
+                    results.extend(self._run_grid(model, model_config, backend, texts, options, threads))
+                finally:
+                    model.unload_model()
+        return results
+
+    def _run_grid(self, model, model_config, backend, texts, options, threads):
+        results = []
+        default_threads = torch.get_num_threads()
+        for thread_count in threads:
+            if thread_count:
+                torch.set_num_threads(thread_count)
+            try:
+                for batch_size in options['batch_sizes']:
+                    result = self._measure(model, texts, batch_size, options['rounds'])
+                    result.update({
+                        'model_id': model_config['id'],
+                        'model_name': model_config['name'],
+                        'backend': backend,
+                        'precision': getattr(model, 'precision', None),
+                        'requested_precision': model.model_config.get('inference_precision') or 'fp32',
+                        'device': model.get_device() if hasattr(model, 'get_device') else None,
+                        'threads': torch.get_num_threads() if backend == 'local' else None,
+                        'batch_size': batch_size
+                    })
+                    results.append(result)
+                    logger.info(f"嵌入基准测试: {result}")
+            finally:
+                torch.set_num_threads(default_threads)
+        return results
+
+    def _measure(self, model, texts, batch_size, rounds):
+        """逐批调用 embed_texts，记录每批延迟；第一批不计时作为预热"""
+        model.embed_texts(texts[:batch_size])
+
+        latencies = []
+        total_time = 0.0
+        total_texts = 0
+        for _ in range(rounds):
+            for start in range(0, len(texts), batch_size):
+                batch = texts[start:start + batch_size]
+                start_time = time.perf_counter()
+                model.embed_texts(batch)
+                elapsed = time.perf_counter() - start_time
+                latencies.append(elapsed * 1000)
+                total_time += elapsed
+                total_texts += len(batch)
+
+        latencies = np.asarray(latencies)
+        return {
+            'texts_per_sec': round(total_texts / total_time, 2) if total_time > 0 else None,
+            'batches': len(latencies),
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 3),
+                'p99': round(float(np.percentile(latencies, 99)), 3),
+                'mean': round(float(latencies.mean()), 3),
+                'max': round(float(latencies.max()), 3)
+            }
+        }
+
+    def _get_environment(self):
+        environment = {
+            'hostname': platform.node(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'cpu_cores': get_cpu_cores(),
+            'cuda': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+            'torch_threads': get_torch_thread_settings()
+        }
+        try:
+            import sentence_transformers
+            environment['sentence_transformers'] = sentence_transformers.__version__
+        except ImportError:
+            pass
+        return environment
+
+    def _print_results(self, results):
+        header = f"{'模型':<24}{'方式':<9}{'精度':<6}{'线程':>6}{'批大小':>8}{'条/秒':>12}{'p50(ms)':>12}{'p99(ms)':>12}"
+        self.stdout.write(header)
+        for result in results:
+            self.stdout.write(
+                f"{str(result['model_name'])[:22]:<24}{result['backend']:<9}{str(result['precision'] or '-'):<6}"
+                f"{str(result['threads'] or '-'):>6}{result['batch_size']:>8}{str(result['texts_per_sec']):>12}"
+                f"{result['latency_ms']['p50']:>12}{result['latency_ms']['p99']:>12}"
+            )
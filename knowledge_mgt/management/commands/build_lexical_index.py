@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from knowledge_mgt.utils.document_processor import VectorStore
+from knowledge_mgt.utils.lexical_index import LexicalIndex
+
+
+class Command(BaseCommand):
+    help = ('从数据库中的分块生成知识库的BM25索引（不需要嵌入模型），'
+            '用于早于BM25索引创建的知识库；默认只处理还没有BM25索引的知识库')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database-id', type=int, action='append', default=None,
+                            help='只处理指定的知识库，可以重复指定')
+        parser.add_argument('--force', action='store_true', help='已有BM25索引的知识库也重新生成')
+
+    def handle(self, *args, **options):
+        database_ids = options['database_id']
+        with connection.cursor() as cursor:
+            if database_ids:
+                placeholders = ','.join(['%s'] * len(database_ids))
+                cursor.execute(f"SELECT id FROM knowledge_database WHERE id IN ({placeholders})", database_ids)
+            else:
+                cursor.execute("SELECT id FROM knowledge_database ORDER BY id")
+            found_ids = [row[0] for row in cursor.fetchall()]
+        missing = set(database_ids or []) - set(found_ids)
+        if missing:
+            raise CommandError(f"知识库不存在: {', '.join(str(database_id) for database_id in sorted(missing))}")
+
+        vector_store = VectorStore()
+        built = 0
+        for database_id in found_ids:
+            db_vector_dir = os.path.join(vector_store.vector_dir, str(database_id))
+            if LexicalIndex.exists(db_vector_dir) and not options['force']:
+                continue
+            chunk_count = vector_store.rebuild_lexical_index(database_id)
+            built += 1
+            self.stdout.write(f"知识库 {database_id}: {chunk_count} 个分块")
+
+        self.stdout.write(self.style.SUCCESS(f"已生成 {built} 个知识库的BM25索引"))
@@ -0,0 +1,53 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from knowledge_mgt.utils.ingestion import CHUNKING_PARAM_NAMES, BulkIngestionJob
+
+
+class Command(BaseCommand):
+    help = ('批量导入：把服务器目录或zip/tar压缩包中的文档导入知识库，提取分块并行执行、向量跨文档批量生成，'
+            '每个文件在 document_upload_task 中记录一条任务')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='服务器目录或zip/tar压缩包路径')
+        parser.add_argument('--database-id', type=int, required=True, help='目标知识库ID')
+        parser.add_argument('--user-id', type=int, default=None, help='记录为导入者的用户ID，默认为知识库所有者')
+        parser.add_argument('--username', default=None, help='记录为导入者的用户名，默认为知识库所有者')
+        parser.add_argument('--chunking-method', default='token', help='分块方式')
+        parser.add_argument('--chunk-size', type=int, default=500, help='分块大小')
+        parser.add_argument('--similarity-threshold', type=float, default=0.7, help='语义分块的相似度阈值')
+        parser.add_argument('--overlap-size', type=int, default=100, help='重叠大小')
+        parser.add_argument('--custom-delimiter', default='\n\n', help='自定义分隔符')
+        parser.add_argument('--window-size', type=int, default=3, help='滑动窗口大小')
+        parser.add_argument('--step-size', type=int, default=1, help='滑动窗口步长')
+        parser.add_argument('--min-chunk-size', type=int, default=50, help='最小分块大小')
+        parser.add_argument('--max-chunk-size', type=int, default=2000, help='最大分块大小')
+
+    def handle(self, *args, **options):
+        source = os.path.abspath(options['source'])
+        if not os.path.exists(source):
+            raise CommandError(f"导入源不存在: {source}")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT user_id, username FROM knowledge_database WHERE id = %s", [options['database_id']])
+            row = cursor.fetchone()
+        if not row:
+            raise CommandError(f"知识库不存在: {options['database_id']}")
+
+        job = BulkIngestionJob(
+            options['database_id'], options['user_id'] or row[0], options['username'] or row[1],
+            {name: options[name] for name in CHUNKING_PARAM_NAMES}
+        )
+        self.stdout.write(f"批次ID: {job.batch_id}")
+        try:
+            summary = job.run(source)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
+        style = self.style.SUCCESS if not summary['failed'] else self.style.WARNING
+        self.stdout.write(style(f"导入完成: 成功 {summary['completed']} 个文件，失败 {summary['failed']} 个，"
+                                f"重复跳过 {summary['duplicates']} 个，共 {summary['chunks']} 个分块"))
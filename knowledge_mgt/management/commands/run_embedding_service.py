@@ -0,0 +1,42 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from knowledge_mgt.utils.embedding_service import create_embedding_server
+from knowledge_mgt.utils.embeddings import local_embedding_manager, get_knowledge_embedding_model
+
+logger = logging.getLogger('knowledge_mgt')
+
+
+class Command(BaseCommand):
+    help = '启动独立的嵌入服务进程，Web进程通过 EMBEDDING_SERVICE_URL 以客户端模式调用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+        parser.add_argument('--port', type=int, default=8765, help='监听端口')
+        parser.add_argument('--socket', dest='socket_path', default=None, help='Unix socket路径，指定后忽略host/port')
+        parser.add_argument('--preload', type=int, nargs='*', default=[], help='启动时预加载的嵌入模型ID')
+
+    def handle(self, *args, **options):
+        # 服务进程自身必须在进程内加载模型
+        local_embedding_manager.set_service_url('')
+
+        for model_id in options['preload']:
+            get_knowledge_embedding_model(model_id)
+            self.stdout.write(f"已预加载嵌入模型: {model_id}")
+
+        server = create_embedding_server(
+            host=options['host'], port=options['port'], socket_path=options['socket_path']
+        )
+        address = options['socket_path'] or f"{options['host']}:{options['port']}"
+        logger.info(f"嵌入服务已启动: {address}")
+        self.stdout.write(self.style.SUCCESS(f"嵌入服务已启动: {address}"))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            local_embedding_manager.unload_all_models()
+            logger.info("嵌入服务已停止")
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from knowledge_mgt.utils.dedup import NearDuplicateDetector, compute_simhashes, release_duplicates
+
+
+def flip_bits(signature, positions):
+    for position in positions:
+        signature ^= 1 << position
+    return signature
+
+
+class NearDuplicateDetectorTests(SimpleTestCase):
+    """SimHash分段索引的近重复匹配"""
+
+    SIGNATURE = 0x0123456789ABCDEF
+
+    def setUp(self):
+        self.detector = NearDuplicateDetector(1, policy='link', max_distance=3)
+        self.detector._register(10, self.SIGNATURE)
+
+    def test_bands_cover_all_bits(self):
+        self.assertEqual(len(self.detector.bands), 4)
+        self.assertEqual(sum(bin(mask).count('1') for _, mask in self.detector.bands), 64)
+
+    def test_match_within_max_distance(self):
+        # 不同的位分散在前三段，只有最后一段完全相同
+        starts = [start for start, _ in self.detector.bands]
+        signature = flip_bits(self.SIGNATURE, starts[:3])
+        self.assertEqual(self.detector.find(signature), 10)
+        self.assertEqual(self.detector.find(self.SIGNATURE), 10)
+
+    def test_no_match_beyond_max_distance(self):
+        starts = [start for start, _ in self.detector.bands]
+        self.assertIsNone(self.detector.find(flip_bits(self.SIGNATURE, starts)))
+        self.assertIsNone(self.detector.find(flip_bits(self.SIGNATURE, [60, 61, 62, 63])))
+
+    def test_closest_signature_wins(self):
+        self.detector._register(11, flip_bits(self.SIGNATURE, [0]))
+        self.assertEqual(self.detector.find(flip_bits(self.SIGNATURE, [0, 1])), 11)
+
+    def test_forget_removes_signature(self):
+        self.detector.forget([10, 99])
+        self.assertIsNone(self.detector.find(self.SIGNATURE))
+        self.assertEqual(self.detector.buckets, {})
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            NearDuplicateDetector(1, policy='merge', max_distance=3)
+
+
+class DuplicatePlanTests(SimpleTestCase):
+    """一批分块的去重计划和写入后的重复关系"""
+
+    TEXTS = [
+        'Knowledge base 支持按文档批量导入，导入后自动分块并生成向量',
+        'knowledge  BASE 支持按文档批量导入，导入后自动分块并生成向量',
+        'Completely unrelated text about router firmware upgrades',
+        'ab',
+    ]
+
+    def test_signatures_ignore_case_and_whitespace(self):
+        signatures = compute_simhashes(['Hello   World', 'hello world', 'ab'])
+        self.assertEqual(signatures[0], signatures[1])
+        self.assertIsNone(signatures[2])
+
+    def test_link_plan_and_bind(self):
+        detector = NearDuplicateDetector(1, policy='link', max_distance=3)
+        detector._register(7, compute_simhashes([self.TEXTS[2]])[0])
+
+        plan = detector.plan(self.TEXTS)
+        self.assertEqual(plan['duplicate_of'], [None, ('pending', 0), 7, None])
+        self.assertEqual(plan['store'], [0, 1, 2, 3])
+        self.assertEqual(plan['embed'], [0, 3])
+
+        with mock.patch('knowledge_mgt.utils.dedup.connection') as connection:
+            detector.bind(plan, [101, 102, 103, 104])
+        cursor = connection.cursor.return_value.__enter__.return_value
+        self.assertEqual(cursor.executemany.call_args[0][1], [[101, 102], [7, 103]])
+        self.assertNotIn(('pending', 0), detector.signatures)
+        self.assertEqual(detector.find(plan['signatures'][0]), 101)
+
+        report = detector.report()
+        self.assertEqual(report['checked_chunks'], 3)
+        self.assertEqual(report['duplicate_chunks'], 2)
+        self.assertEqual(report['saved_embeddings'], 2)
+
+    def test_skip_plan_does_not_store_duplicates(self):
+        detector = NearDuplicateDetector(1, policy='skip', max_distance=3)
+        plan = detector.plan(self.TEXTS[:2])
+        self.assertEqual(plan['store'], [0])
+        self.assertEqual(plan['embed'], [0])
+        self.assertEqual(detector.report()['skipped_chunks'], 1)
+
+
+class ReleaseDuplicatesTests(SimpleTestCase):
+    """删除原始分块前解除重复引用"""
+
+    def test_empty_chunk_ids(self):
+        with mock.patch('knowledge_mgt.utils.dedup.connection') as connection:
+            self.assertEqual(release_duplicates([]), [])
+        connection.cursor.assert_not_called()
+
+    def test_returns_duplicates_without_vectors(self):
+        with mock.patch('knowledge_mgt.utils.dedup.connection') as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [(12,), (15,)]
+            self.assertEqual(release_duplicates([3, 4]), [12, 15])
+
+        select_call, update_call = cursor.execute.call_args_list
+        self.assertIn('vector_id IS NULL', select_call[0][0])
+        self.assertEqual(select_call[0][1], [3, 4, 3, 4])
+        self.assertIn('SET duplicate_of = NULL', update_call[0][0])
+        self.assertEqual(update_call[0][1], [3, 4, 3, 4])
@@ -0,0 +1,50 @@
+import os
+import random
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from knowledge_mgt.utils.document_processor import DocumentProcessor
+
+
+class IterChunksTests(SimpleTestCase):
+    """流式分块与整篇一次分块的结果一致"""
+
+    BUFFER_CHARS = 3000
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        rng = random.Random(0)
+        words = ['alpha', 'beta', 'gamma', 'delta', '知识库', '检索', '向量', '分块']
+        paragraphs = []
+        for _ in range(1000):
+            sentences = [
+                ' '.join(rng.choice(words) for _ in range(rng.randint(3, 15))) + rng.choice(['.', '!', '。', '；'])
+                for _ in range(rng.randint(1, 5))
+            ]
+            paragraphs.append(' '.join(sentences))
+        self.text = '\n\n'.join(paragraphs)
+        # 文本文件按 64 KiB 分块读取，缓冲区边界和读取边界都会落在单词中间
+        self.assertGreater(len(self.text), 65536)
+        self.file_path = os.path.join(self.media_root.name, 'document.txt')
+        with open(self.file_path, 'w', encoding='utf-8') as file:
+            file.write(self.text)
+
+    def test_streamed_chunks_match_single_pass(self):
+        for method in ('token', 'sentence', 'paragraph', 'semantic', 'custom_delimiter'):
+            with self.subTest(method=method):
+                processor = DocumentProcessor(chunking_method=method, chunk_size=300,
+                                              min_chunk_size=20, max_chunk_size=800)
+                expected = processor.split_text(self.text)
+                streamed = list(processor.iter_chunks(self.file_path, buffer_chars=self.BUFFER_CHARS))
+                self.assertEqual(streamed, expected)
+
+    def test_buffer_larger_than_document(self):
+        processor = DocumentProcessor(chunking_method='token', chunk_size=300)
+        self.assertEqual(list(processor.iter_chunks(self.file_path, buffer_chars=len(self.text) * 2)),
+                         processor.split_text(self.text))
@@ -0,0 +1,138 @@
+import random
+
+from django.test import SimpleTestCase
+
+from knowledge_mgt.utils.heading_parser import HeadingParser, format_heading_path
+
+
+def parse(text, split_points=(), max_body_chars=200000):
+    parser = HeadingParser(max_body_chars=max_body_chars)
+    sections = []
+    start = 0
+    for end in list(split_points) + [len(text)]:
+        sections.extend(parser.feed(text[start:end]))
+        start = end
+    sections.extend(parser.close())
+    return sections
+
+
+def merge_sections(sections):
+    """合并同一标题路径下相邻的正文，正文超长时会分多次返回"""
+    merged = []
+    for path, body in sections:
+        if merged and merged[-1][0] == path:
+            merged[-1] = (path, merged[-1][1] + body)
+        else:
+            merged.append((path, body))
+    return merged
+
+
+CHAPTER_TEXT = """前言部分的正文。
+
+第一章 概述
+本章介绍系统的整体结构。
+
+1.1 设计目标
+支持中英文混合文档。
+
+1.2 术语
+知识库、分块、向量。
+
+第二章 安装
+安装前需要准备运行环境。
+
+2.1 环境要求
+Python 3.10 及以上。
+
+INSTALLATION NOTES
+Check the firewall settings.
+"""
+
+MARKDOWN_TEXT = """# User Guide
+
+Intro paragraph.
+
+Getting Started
+---------------
+
+Run the installer.
+
+```
+# this is a shell comment, not a heading
+1. nor is this
+```
+
+### Options
+
+1. first option
+2. second option
+
+Reference
+=========
+
+See the appendix.
+"""
+
+
+class HeadingParserTests(SimpleTestCase):
+    """标题层级识别"""
+
+    def test_chapter_styles_take_levels_in_order_of_appearance(self):
+        paths = [path for path, _ in parse(CHAPTER_TEXT)]
+        self.assertEqual(paths, [
+            (),
+            ('第一章 概述',),
+            ('第一章 概述', '1.1 设计目标'),
+            ('第一章 概述', '1.2 术语'),
+            ('第二章 安装',),
+            ('第二章 安装', '2.1 环境要求'),
+            ('第二章 安装', '2.1 环境要求', 'INSTALLATION NOTES'),
+        ])
+
+    def test_markdown_headings_and_code_fence(self):
+        sections = parse(MARKDOWN_TEXT)
+        self.assertEqual([path for path, _ in sections], [
+            ('User Guide',),
+            ('User Guide', 'Getting Started'),
+            ('User Guide', 'Getting Started', 'Options'),
+            ('Reference',),
+        ])
+        # 代码围栏内的行和出现Markdown标题后的编号列表都按正文处理
+        self.assertIn('# this is a shell comment', sections[1][1])
+        self.assertIn('1. first option', sections[2][1])
+
+    def test_bodyless_heading_is_kept_as_body(self):
+        sections = parse("第一章 概述\n第二章 安装\n正文。\n")
+        self.assertEqual(sections, [(('第一章 概述',), '第一章 概述'), (('第二章 安装',), '\n正文。\n')])
+
+    def test_format_heading_path(self):
+        self.assertEqual(format_heading_path(('第三章 安装', '3.2 环境配置')), '第三章 安装 > 3.2 环境配置')
+        self.assertEqual(format_heading_path(()), '')
+
+
+class HeadingParserStreamingTests(SimpleTestCase):
+    """分多次输入与一次输入的结果一致，缓冲区边界可以落在标题行、Setext下划线和代码围栏中间"""
+
+    def assert_split_matches(self, text):
+        expected = parse(text)
+        for split in range(1, len(text)):
+            with self.subTest(split=split):
+                self.assertEqual(merge_sections(parse(text, [split])), expected)
+
+        rng = random.Random(0)
+        for _ in range(200):
+            split_points = sorted(rng.sample(range(1, len(text)), rng.randint(2, 20)))
+            with self.subTest(split_points=split_points):
+                self.assertEqual(merge_sections(parse(text, split_points)), expected)
+
+    def test_chapter_levels_across_boundaries(self):
+        self.assert_split_matches(CHAPTER_TEXT)
+
+    def test_markdown_levels_across_boundaries(self):
+        self.assert_split_matches(MARKDOWN_TEXT)
+
+    def test_long_body_is_returned_in_parts(self):
+        text = "第一章 概述\n" + "正文内容。\n" * 100 + "第二章 安装\n安装说明。\n"
+        sections = parse(text, range(10, len(text), 17), max_body_chars=50)
+        self.assertGreater(len(sections), 3)
+        self.assertEqual(merge_sections(sections), parse(text))
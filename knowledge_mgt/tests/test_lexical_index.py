@@ -0,0 +1,99 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from knowledge_mgt.utils.lexical_index import LexicalIndex, tokenize
+
+
+class TokenizeTests(SimpleTestCase):
+    """中英文混合分词"""
+
+    def test_english_words_are_lowercased(self):
+        self.assertEqual(tokenize('Reset the Router'), ['reset', 'the', 'router'])
+
+    def test_identifier_keeps_whole_and_parts(self):
+        self.assertEqual(tokenize('错误码 E-1024'), ['错误', '误码', 'e-1024', 'e', '1024'])
+        self.assertEqual(tokenize('v2.3.1'), ['v2.3.1', 'v2', '3', '1'])
+
+    def test_chinese_bigrams_and_single_character(self):
+        self.assertEqual(tokenize('向量检索'), ['向量', '量检', '检索'])
+        self.assertEqual(tokenize('库 index'), ['库', 'index'])
+
+    def test_empty_text(self):
+        self.assertEqual(tokenize(''), [])
+        self.assertEqual(tokenize(None), [])
+
+
+class LexicalIndexTests(SimpleTestCase):
+    """BM25索引的增删、事务和排序"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        lexical_index = LexicalIndex.create(self.directory.name)
+        lexical_index.add([1, 2, 3, 4], [
+            '路由器 重置 步骤',
+            '路由器 固件 升级 路由器 路由器',
+            '错误码 E-1024 表示 固件 校验失败',
+            'router reset guide',
+        ])
+        lexical_index.publish()
+
+    def open_index(self, read_only=False):
+        lexical_index = LexicalIndex.open(self.directory.name, read_only=read_only)
+        self.addCleanup(lexical_index.close)
+        return lexical_index
+
+    def test_open_missing_index_returns_none(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(LexicalIndex.open(directory))
+
+    def test_publish_replaces_staging_file(self):
+        self.assertTrue(LexicalIndex.exists(self.directory.name))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory.name, LexicalIndex.INDEX_FILE + LexicalIndex.STAGING_SUFFIX)
+        ))
+        self.assertEqual(self.open_index(read_only=True).count(), 4)
+
+    def test_higher_term_frequency_ranks_higher(self):
+        results = self.open_index(read_only=True).search('路由器', top_k=5)
+        self.assertEqual([chunk_id for chunk_id, _ in results], [2, 1])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_rarer_term_ranks_higher(self):
+        # "固件" 出现在两个分块中，"步骤" 只出现在分块1中，逆文档频率更高
+        results = self.open_index(read_only=True).search('固件 步骤', top_k=5)
+        self.assertEqual(results[0][0], 1)
+        self.assertEqual({chunk_id for chunk_id, _ in results}, {1, 2, 3})
+
+    def test_identifier_matches_whole_and_parts(self):
+        lexical_index = self.open_index(read_only=True)
+        self.assertEqual([chunk_id for chunk_id, _ in lexical_index.search('e-1024')], [3])
+        self.assertEqual([chunk_id for chunk_id, _ in lexical_index.search('1024')], [3])
+
+    def test_top_k_and_no_match(self):
+        lexical_index = self.open_index(read_only=True)
+        self.assertEqual(len(lexical_index.search('路由器 固件', top_k=1)), 1)
+        self.assertEqual(lexical_index.search('不存在的词'), [])
+
+    def test_remove_and_re_add(self):
+        lexical_index = self.open_index()
+        lexical_index.remove([2])
+        lexical_index.add([1], ['固件 下载'])
+        lexical_index.commit()
+
+        reader = self.open_index(read_only=True)
+        self.assertEqual(reader.count(), 3)
+        self.assertEqual([chunk_id for chunk_id, _ in reader.search('路由器')], [])
+        self.assertEqual({chunk_id for chunk_id, _ in reader.search('固件')}, {1, 3})
+
+    def test_rollback_discards_uncommitted_changes(self):
+        lexical_index = self.open_index()
+        lexical_index.add([5], ['路由器 路由器 路由器 路由器'])
+        lexical_index.remove([1])
+        lexical_index.rollback()
+
+        reader = self.open_index(read_only=True)
+        self.assertEqual(reader.count(), 4)
+        self.assertEqual([chunk_id for chunk_id, _ in reader.search('路由器')], [2, 1])
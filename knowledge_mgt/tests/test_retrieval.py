@@ -0,0 +1,50 @@
+from django.test import SimpleTestCase
+
+from knowledge_mgt.utils.retrieval import mmr_select, reciprocal_rank_fusion, select_diverse_chunks
+
+QUERY = [1.0, 0.0]
+# 0 与查询最相关，1 与 0 几乎相同，2 相关性较低但方向不同
+CANDIDATES = [[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]]
+
+
+class MmrSelectTests(SimpleTestCase):
+    """最大边际相关性选择的顺序"""
+
+    def test_lambda_one_orders_by_relevance(self):
+        self.assertEqual(mmr_select(QUERY, CANDIDATES, 3, lambda_mult=1.0), [0, 1, 2])
+
+    def test_low_lambda_prefers_diverse_candidate(self):
+        self.assertEqual(mmr_select(QUERY, CANDIDATES, 3, lambda_mult=0.3), [0, 2, 1])
+
+    def test_top_k_limits_selection(self):
+        self.assertEqual(mmr_select(QUERY, CANDIDATES, 2, lambda_mult=0.3), [0, 2])
+        self.assertEqual(mmr_select(QUERY, CANDIDATES, 10, lambda_mult=0.3), [0, 2, 1])
+        self.assertEqual(mmr_select(QUERY, [], 3), [])
+
+    def test_select_diverse_chunks(self):
+        chunks = [{'id': i, 'vector': vector} for i, vector in enumerate(CANDIDATES)]
+        self.assertEqual([chunk['id'] for chunk in select_diverse_chunks(QUERY, chunks, 2, 0.3)], [0, 2])
+        # 不启用多样性时按原顺序截取
+        self.assertEqual([chunk['id'] for chunk in select_diverse_chunks(QUERY, chunks, 2, None)], [0, 1])
+        self.assertEqual([chunk['id'] for chunk in select_diverse_chunks(QUERY, chunks, 2, 1.0)], [0, 1])
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    """加权倒数排名融合的顺序"""
+
+    def test_items_ranked_in_both_lists_come_first(self):
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['c', 'a']], k=60)
+        self.assertEqual([key for key, _ in fused], ['a', 'c', 'b'])
+        self.assertAlmostEqual(dict(fused)['a'], 1 / 61 + 1 / 62)
+        self.assertAlmostEqual(dict(fused)['b'], 1 / 62)
+
+    def test_weights_change_order(self):
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['c', 'a']], weights=[0.2, 1.0], k=60)
+        self.assertEqual([key for key, _ in fused], ['c', 'a', 'b'])
+
+    def test_zero_weight_list_is_ignored(self):
+        fused = reciprocal_rank_fusion([['a', 'b'], ['c']], weights=[1.0, 0.0])
+        self.assertEqual([key for key, _ in fused], ['a', 'b'])
+
+    def test_empty_lists(self):
+        self.assertEqual(reciprocal_rank_fusion([[], []]), [])
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from knowledge_mgt.utils.token_estimator import (
+    SENTENCE_SPLIT_PATTERN, TokenCounter, default_token_counter, estimate_tokens, get_token_counter
+)
+
+
+class FakeTokenizer:
+    """按字符切分的分词器，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, **kwargs):
+        self.calls += 1
+        return {'input_ids': [list(text) for text in texts]}
+
+
+class EstimateTokensTests(SimpleTestCase):
+    """规则估算：中文字符=1，英文单词=1，标点=0.5"""
+
+    def test_chinese_english_and_punctuation(self):
+        self.assertEqual(estimate_tokens('知识库'), 3)
+        self.assertEqual(estimate_tokens('hello world'), 2)
+        self.assertEqual(estimate_tokens('...'), 1.5)
+        self.assertEqual(estimate_tokens('知识库 RAG 检索!'), 6.5)
+
+    def test_words_joined_with_digits_are_not_counted(self):
+        self.assertEqual(estimate_tokens('abc123 gpu4'), 0)
+        self.assertEqual(estimate_tokens(''), 0)
+
+    def test_sentence_split_pattern(self):
+        self.assertEqual(SENTENCE_SPLIT_PATTERN.split('第一句。第二句！ Third. Fourth'),
+                         ['第一句', '第二句', 'Third', 'Fourth'])
+
+
+class TokenCounterTests(SimpleTestCase):
+    """分块使用的token计数器"""
+
+    def test_estimate_counter(self):
+        self.assertEqual(default_token_counter.source, 'estimate')
+        self.assertEqual(default_token_counter.count_batch(['知识库', 'hello']), [3, 1])
+
+    def test_tokenizer_counter_counts_in_one_batch(self):
+        tokenizer = FakeTokenizer()
+        counter = TokenCounter(tokenizer)
+        self.assertEqual(counter.source, 'tokenizer')
+        self.assertEqual(counter.count_batch(['知识库', 'hello', '']), [3, 5, 0])
+        self.assertEqual(tokenizer.calls, 1)
+        self.assertEqual(counter.count_batch([]), [])
+        self.assertEqual(tokenizer.calls, 1)
+
+    @override_settings(CHUNK_TOKEN_COUNTER='tokenizer')
+    def test_get_token_counter_uses_model_tokenizer(self):
+        tokenizer = FakeTokenizer()
+        counter = get_token_counter(SimpleNamespace(model=SimpleNamespace(tokenizer=tokenizer)))
+        self.assertIs(counter.tokenizer, tokenizer)
+        # 客户端模式、在线模型没有本地分词器
+        self.assertIs(get_token_counter(SimpleNamespace(model=None)), default_token_counter)
+        self.assertIs(get_token_counter(None), default_token_counter)
+
+    @override_settings(CHUNK_TOKEN_COUNTER='estimate')
+    def test_get_token_counter_defaults_to_estimate(self):
+        tokenizer = FakeTokenizer()
+        counter = get_token_counter(SimpleNamespace(model=SimpleNamespace(tokenizer=tokenizer)))
+        self.assertIs(counter, default_token_counter)
@@ -0,0 +1,269 @@
+import hashlib
+import logging
+import re
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 近似重复分块的处理策略：keep 照常入库和向量化，只记录重复关系；link 入库并指向原始分块，但不生成向量、不进入索引；
+# skip 不写入分块
+DUPLICATE_POLICIES = ('keep', 'link', 'skip')
+
+# 按字符3-gram生成签名，对中英文一致有效
+SHINGLE_SIZE = 3
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+_SHINGLE_MULTIPLIER = np.uint64(0x100000001B3)
+_MIX_INCREMENT = np.uint64(0x9E3779B97F4A7C15)
+_MIX_MULTIPLIER_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_MULTIPLIER_2 = np.uint64(0x94D049BB133111EB)
+
+
+def content_hash(text):
+    """分块内容的SHA-256，用于文档更新时按内容比对分块"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _mix64(values):
+    """splitmix64 混合，把字符组合的多项式哈希打散到64位上"""
+    values = values + _MIX_INCREMENT
+    values = (values ^ (values >> np.uint64(30))) * _MIX_MULTIPLIER_1
+    values = (values ^ (values >> np.uint64(27))) * _MIX_MULTIPLIER_2
+    return values ^ (values >> np.uint64(31))
+
+
+def compute_simhashes(texts, shingle_size=SHINGLE_SIZE):
+    """批量计算64位SimHash签名，返回与 texts 等长的列表，规范化后不足 shingle_size 个字符的文本为None
+
+    文本转小写并合并空白后按字符n-gram取哈希，一批文本的全部n-gram在一个数组中统一混合、展开为位矩阵，
+    再按文本分段求和投票，不逐个n-gram循环
+    """
+    signatures = [None] * len(texts)
+    shingle_hashes = []
+    owners = []
+    counts = []
+    for position, text in enumerate(texts):
+        normalized = WHITESPACE_PATTERN.sub(' ', (text or '').lower()).strip()
+        if len(normalized) < shingle_size:
+            continue
+        codes = np.frombuffer(normalized.encode('utf-32-le'), dtype='<u4').astype(np.uint64)
+        shingle_count = len(codes) - shingle_size + 1
+        hashes = codes[:shingle_count]
+        for offset in range(1, shingle_size):
+            hashes = hashes * _SHINGLE_MULTIPLIER + codes[offset:offset + shingle_count]
+        shingle_hashes.append(hashes)
+        owners.append(position)
+        counts.append(shingle_count)
+
+    if not owners:
+        return signatures
+
+    hashes = _mix64(np.concatenate(shingle_hashes)).astype('<u8')
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ones = np.add.reduceat(bits, offsets, axis=0, dtype=np.int64)
+    packed = np.packbits(ones * 2 > counts[:, None], axis=1, bitorder='little')
+    for position, signature in zip(owners, packed.view('<u8').ravel()):
+        signatures[position] = int(signature)
+    return signatures
+
+
+class NearDuplicateDetector:
+    """知识库级别的入库近重复检测
+
+    SimHash签名按位切分为 max_distance + 1 段建立分段索引，汉明距离不超过 max_distance 的两个签名至少有一段完全相同，
+    只需对同段的候选计算汉明距离。已入库的原始分块在加载时读入，本次入库的新原始分块随写入追加
+    """
+
+    SIGNATURE_BITS = 64
+
+    def __init__(self, database_id, policy='keep', max_distance=None):
+        if policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"不支持的重复分块处理策略: {policy}")
+        if max_distance is None:
+            max_distance = getattr(settings, 'NEAR_DUPLICATE_MAX_DISTANCE', 3)
+        self.database_id = database_id
+        self.policy = policy
+        # 段数过多时每段位数太少，同段候选会急剧增加
+        self.max_distance = max(0, min(int(max_distance), 15))
+
+        band_count = self.max_distance + 1
+        bounds = [round(self.SIGNATURE_BITS * i / band_count) for i in range(band_count + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+
+        self.buckets = {}
+        self.signatures = {}
+        self.stats = {
+            'policy': policy,
+            'checked_chunks': 0,
+            'duplicate_chunks': 0,
+            'skipped_chunks': 0,
+            'linked_chunks': 0,
+            'embedded_chunks': 0,
+            'embedding_seconds': 0.0
+        }
+
+    @classmethod
+    def load(cls, database_id, policy='keep', max_distance=None):
+        """读取知识库中已有原始分块的签名"""
+        detector = cls(database_id, policy or 'keep', max_distance)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, simhash FROM knowledge_document_chunk
+                WHERE database_id = %s AND simhash IS NOT NULL AND duplicate_of IS NULL
+            """, [database_id])
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                for chunk_id, signature in rows:
+                    detector._register(chunk_id, int(signature))
+        logger.debug(f"知识库 {database_id} 已加载 {len(detector.signatures)} 个分块签名用于近重复检测")
+        return detector
+
+    def _band_keys(self, signature):
+        return [(band, (signature >> start) & mask) for band, (start, mask) in enumerate(self.bands)]
+
+    def _register(self, key, signature):
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def forget(self, chunk_ids):
+        """移除即将删除的分块，避免新分块被判定为它们的重复"""
+        for chunk_id in chunk_ids:
+            signature = self.signatures.pop(chunk_id, None)
+            if signature is None:
+                continue
+            for band_key in self._band_keys(signature):
+                bucket = self.buckets[band_key]
+                bucket.remove(chunk_id)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def find(self, signature):
+        """返回与签名最接近且不超过最大汉明距离的已登记分块，没有时返回None"""
+        best_key, best_distance = None, self.max_distance + 1
+        seen = set()
+        for band_key in self._band_keys(signature):
+            for key in self.buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = bin(self.signatures[key] ^ signature).count('1')
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        return best_key
+        return best_key
+
+    def plan(self, texts):
+        """检测一批待入库分块，返回处理计划
+
+        signatures: 每个分块的签名；duplicate_of: 重复的原始分块（已入库分块ID，或本批中的 ('pending', 序号)）；
+        store: 需要写入的分块序号；embed: 需要生成向量的分块序号
+        """
+        signatures = compute_simhashes(texts)
+        duplicate_of = []
+        for position, signature in enumerate(signatures):
+            original = self.find(signature) if signature is not None else None
+            if signature is not None and original is None:
+                self._register(('pending', position), signature)
+            duplicate_of.append(original)
+
+        duplicates = {position for position, original in enumerate(duplicate_of) if original is not None}
+        all_positions = list(range(len(texts)))
+        unique_positions = [position for position in all_positions if position not in duplicates]
+        if self.policy == 'skip':
+            store, embed = unique_positions, unique_positions
+        elif self.policy == 'link':
+            store, embed = all_positions, unique_positions
+        else:
+            store, embed = all_positions, all_positions
+
+        self.stats['checked_chunks'] += sum(signature is not None for signature in signatures)
+        self.stats['duplicate_chunks'] += len(duplicates)
+        if self.policy == 'skip':
+            self.stats['skipped_chunks'] += len(duplicates)
+        elif self.policy == 'link':
+            self.stats['linked_chunks'] += len(duplicates)
+
+        return {'signatures': signatures, 'duplicate_of': duplicate_of, 'store': store, 'embed': embed}
+
+    def bind(self, plan, chunk_ids):
+        """分块写入后调用，chunk_ids 与 plan['store'] 一一对应
+
+        把本批新原始分块的登记替换为真实分块ID，并写入重复分块的 duplicate_of
+        """
+        chunk_id_by_position = dict(zip(plan['store'], chunk_ids))
+        for position, signature in enumerate(plan['signatures']):
+            pending_key = ('pending', position)
+            if pending_key not in self.signatures:
+                continue
+            chunk_id = chunk_id_by_position[position]
+            del self.signatures[pending_key]
+            self.signatures[chunk_id] = signature
+            for band_key in self._band_keys(signature):
+                bucket = self.buckets[band_key]
+                bucket[bucket.index(pending_key)] = chunk_id
+
+        links = []
+        for position, original in enumerate(plan['duplicate_of']):
+            if original is None or position not in chunk_id_by_position:
+                continue
+            if isinstance(original, tuple):
+                original = chunk_id_by_position[original[1]]
+            links.append([original, chunk_id_by_position[position]])
+
+        if links:
+            with connection.cursor() as cursor:
+                cursor.executemany("""
+                    UPDATE knowledge_document_chunk SET duplicate_of = %s WHERE id = %s
+                """, links)
+
+    def record_embedding(self, chunk_count, seconds):
+        """记录实际生成向量的分块数和耗时，用于估算节省的向量化时间"""
+        self.stats['embedded_chunks'] += chunk_count
+        self.stats['embedding_seconds'] += seconds
+
+    def report(self):
+        """入库完成后的去重统计，节省时间按本次入库每个分块的平均向量化耗时估算"""
+        saved_chunks = self.stats['skipped_chunks'] + self.stats['linked_chunks']
+        embedded_chunks = self.stats['embedded_chunks']
+        seconds_per_chunk = self.stats['embedding_seconds'] / embedded_chunks if embedded_chunks else 0.0
+        return {
+            'policy': self.policy,
+            'checked_chunks': self.stats['checked_chunks'],
+            'duplicate_chunks': self.stats['duplicate_chunks'],
+            'skipped_chunks': self.stats['skipped_chunks'],
+            'linked_chunks': self.stats['linked_chunks'],
+            'saved_embeddings': saved_chunks,
+            'saved_embedding_seconds': round(saved_chunks * seconds_per_chunk, 3)
+        }
+
+
+def release_duplicates(chunk_ids):
+    """删除分块前调用：解除其他分块对这些分块的重复引用
+
+    以 link 策略入库、没有向量的重复分块随之成为原始分块，需要生成向量；返回这类分块的ID列表
+    """
+    if not chunk_ids:
+        return []
+    placeholders = ','.join(['%s'] * len(chunk_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id FROM knowledge_document_chunk
+            WHERE duplicate_of IN ({placeholders}) AND id NOT IN ({placeholders}) AND vector_id IS NULL
+        """, list(chunk_ids) * 2)
+        promoted = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"""
+            UPDATE knowledge_document_chunk SET duplicate_of = NULL
+            WHERE duplicate_of IN ({placeholders}) AND id NOT IN ({placeholders})
+        """, list(chunk_ids) * 2)
+    if promoted:
+        logger.info(f"{len(promoted)} 个重复分块的原始分块被删除，转为原始分块重新生成向量")
+    return promoted
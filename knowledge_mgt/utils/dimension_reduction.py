@@ -0,0 +1,177 @@
+import os
+import json
+import logging
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 支持的降维方式：matryoshka 截断并重新归一化（适用于Matryoshka训练的模型），pca 按知识库训练PCA矩阵
+REDUCTION_METHODS = ('matryoshka', 'pca')
+
+
+class DimensionReducer:
+    """知识库向量降维器
+
+    索引中保存降维后的向量用于第一阶段检索，完整维度向量按索引顺序追加保存在 full_vectors.f32 中，
+    第 i 行对应索引中的第 i 个向量，用于对候选结果按完整维度重新打分
+    """
+
+    CONFIG_FILE = "reduction.json"
+    FULL_VECTORS_FILE = "full_vectors.f32"
+    PCA_FILE = "pca.matrix"
+
+    # 重建索引时临时文件的后缀
+    STAGING_SUFFIX = ".rebuild"
+
+    def __init__(self, db_vector_dir, full_dimension, reduced_dimension, method, suffix=''):
+        self.db_vector_dir = db_vector_dir
+        self.full_dimension = full_dimension
+        self.reduced_dimension = reduced_dimension
+        self.method = method
+        self.suffix = suffix
+        self.config_path = os.path.join(db_vector_dir, self.CONFIG_FILE + suffix)
+        self.full_vectors_path = os.path.join(db_vector_dir, self.FULL_VECTORS_FILE + suffix)
+        self.pca_path = os.path.join(db_vector_dir, self.PCA_FILE + suffix)
+        self._pca = None
+
+    @classmethod
+    def load(cls, db_vector_dir):
+        """从索引目录读取降维配置，未配置降维时返回None"""
+        config_path = os.path.join(db_vector_dir, cls.CONFIG_FILE)
+        if not os.path.exists(config_path):
+            return None
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        return cls(db_vector_dir, config['full_dimension'], config['reduced_dimension'], config['method'])
+
+    def save_config(self):
+        """保存降维配置"""
+        with open(self.config_path, 'w') as f:
+            json.dump({
+                'full_dimension': self.full_dimension,
+                'reduced_dimension': self.reduced_dimension,
+                'method': self.method
+            }, f)
+
+    def reset(self):
+        """清空已保存的完整维度向量和PCA矩阵（创建新索引时使用）"""
+        for path in (self.full_vectors_path, self.pca_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._pca = None
+
+    @classmethod
+    def staging(cls, db_vector_dir, full_dimension, reduced_dimension, method):
+        """返回写入临时文件的降维器，重建索引时使用
+
+        新的降维配置、完整维度向量和PCA矩阵先写入临时文件，索引写入成功后调用 commit() 替换正式文件，
+        重建失败时调用 discard() 删除临时文件，原有文件保持不变
+        """
+        reducer = cls(db_vector_dir, full_dimension, reduced_dimension, method, suffix=cls.STAGING_SUFFIX)
+        reducer.discard()
+        return reducer
+
+    def commit(self):
+        """用临时文件替换正式的降维配置、完整维度向量和PCA矩阵，之后按正式文件读写"""
+        for name in (self.FULL_VECTORS_FILE, self.PCA_FILE, self.CONFIG_FILE):
+            path = os.path.join(self.db_vector_dir, name)
+            if os.path.exists(path + self.suffix):
+                os.replace(path + self.suffix, path)
+            elif os.path.exists(path):
+                os.remove(path)
+        self.suffix = ''
+        self.config_path = os.path.join(self.db_vector_dir, self.CONFIG_FILE)
+        self.full_vectors_path = os.path.join(self.db_vector_dir, self.FULL_VECTORS_FILE)
+        self.pca_path = os.path.join(self.db_vector_dir, self.PCA_FILE)
+
+    def discard(self):
+        """删除临时文件"""
+        for path in (self.config_path, self.full_vectors_path, self.pca_path):
+            if self.suffix and os.path.exists(path):
+                os.remove(path)
+        self._pca = None
+
+    def get_pca_min_train_size(self):
+        """训练PCA所需的最少向量数"""
+        return max(self.reduced_dimension, 256)
+
+    def needs_training(self):
+        """PCA尚未训练且已积累足够的向量时需要训练"""
+        if self.method != 'pca' or os.path.exists(self.pca_path):
+            return False
+        return self.count_full_vectors() >= self.get_pca_min_train_size()
+
+    def train(self):
+        """使用已保存的完整维度向量训练PCA矩阵"""
+        full_vectors = np.ascontiguousarray(self.load_full_vectors())
+        pca = faiss.PCAMatrix(self.full_dimension, self.reduced_dimension)
+        pca.train(full_vectors)
+        faiss.write_VectorTransform(pca, self.pca_path)
+        self._pca = pca
+        logger.info(f"已使用 {len(full_vectors)} 个向量训练PCA矩阵: {self.full_dimension} -> {self.reduced_dimension}")
+
+    def _get_pca(self):
+        if self._pca is None and os.path.exists(self.pca_path):
+            self._pca = faiss.read_VectorTransform(self.pca_path)
+        return self._pca
+
+    def reduce(self, vectors):
+        """将完整维度向量降维"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.method == 'pca':
+            pca = self._get_pca()
+            if pca is not None:
+                return pca.apply_py(vectors)
+            # PCA训练前先直接截断，训练完成后会用完整向量重建索引
+            return np.ascontiguousarray(vectors[:, :self.reduced_dimension])
+
+        truncated = np.ascontiguousarray(vectors[:, :self.reduced_dimension])
+        faiss.normalize_L2(truncated)
+        return truncated
+
+    def append_full_vectors(self, vectors):
+        """追加保存完整维度向量"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with open(self.full_vectors_path, 'ab') as f:
+            f.write(vectors.tobytes())
+
+    def count_full_vectors(self):
+        """已保存的完整维度向量数量"""
+        if not os.path.exists(self.full_vectors_path):
+            return 0
+        return os.path.getsize(self.full_vectors_path) // (self.full_dimension * 4)
+
+    def truncate_full_vectors(self, count):
+        """丢弃第 count 个之后追加的完整维度向量（入库失败、索引未保存时使用）"""
+        if os.path.exists(self.full_vectors_path):
+            with open(self.full_vectors_path, 'r+b') as f:
+                f.truncate(count * self.full_dimension * 4)
+
+    def load_full_vectors(self):
+        """以内存映射方式读取完整维度向量，不会一次性读入内存"""
+        if self.count_full_vectors() == 0:
+            return np.zeros((0, self.full_dimension), dtype=np.float32)
+        return np.memmap(self.full_vectors_path, dtype=np.float32, mode='r').reshape(-1, self.full_dimension)
+
+    def rebuild_reduced_index(self, index, batch_size=4096):
+        """用完整维度向量重新生成索引中的降维向量"""
+        index.reset()
+        full_vectors = self.load_full_vectors()
+        for start in range(0, len(full_vectors), batch_size):
+            index.add(self.reduce(full_vectors[start:start + batch_size]))
+
+    def rerank(self, query_vector, candidate_ids, top_k):
+        """按完整维度L2距离对候选向量重新排序，返回 [(向量ID, 距离)]"""
+        candidate_ids = np.asarray([idx for idx in candidate_ids if idx != -1], dtype=np.int64)
+        if len(candidate_ids) == 0:
+            return []
+
+        full_vectors = self.load_full_vectors()
+        candidate_ids = candidate_ids[candidate_ids < len(full_vectors)]
+        candidates = np.asarray(full_vectors[candidate_ids])
+        distances = ((candidates - query_vector.reshape(1, -1)) ** 2).sum(axis=1)
+
+        order = np.argsort(distances)[:top_k]
+        return [(int(candidate_ids[i]), float(distances[i])) for i in order]
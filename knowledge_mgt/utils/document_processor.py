@@ -1,26 +1,86 @@
 import os
+import codecs
 import logging
+import math
 import re
 from pathlib import Path
-import fitz  # PyMuPDF
 import docx
 import uuid
 import numpy as np
 import faiss
 import pickle
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from django.conf import settings
+from django.core.files.move import file_move_safe
+from filelock import FileLock
+
+from knowledge_mgt.utils.dimension_reduction import DimensionReducer
+from knowledge_mgt.utils.heading_parser import HEADING_PATH_MAX_CHARS, HeadingParser, format_heading_path
+from knowledge_mgt.utils.lexical_index import LexicalIndex
+from knowledge_mgt.utils.pdf_extraction import iter_pdf_pages
+from knowledge_mgt.utils.retrieval import reciprocal_rank_fusion
+from knowledge_mgt.utils.token_estimator import SENTENCE_DELIMITERS, SENTENCE_SPLIT_PATTERN, default_token_counter
 
 logger = logging.getLogger('knowledge_mgt')
 
+# 语义分块统计词汇和标点使用的模式
+WORD_PATTERN = re.compile(r'\w+')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+# 分块在原文中定位时，字符之间允许出现分块时可能去掉的空白和句子结束标点
+CHUNK_GAP_PATTERN = rf'[\s{re.escape(SENTENCE_DELIMITERS)}]*'
+
+# 混合检索时在后台线程执行BM25检索，与向量检索并发
+lexical_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='lexical-search')
+# 已提示过缺少BM25索引的知识库，每个进程只提示一次
+_missing_lexical_index_warned = set()
+
+
+def index_lock(db_vector_dir):
+    """知识库索引目录的文件锁，写入索引、ID映射、BM25索引和降维文件时持有
+
+    跨进程、跨线程互斥，同一线程内可重入（同一路径共用一个锁对象）
+    """
+    os.makedirs(db_vector_dir, exist_ok=True)
+    return FileLock(os.path.join(db_vector_dir, '.index.lock'), is_singleton=True)
+
+
+def _find_chunk_start(text, chunk):
+    """返回分块在原文中的起始位置，找不到时返回None
+
+    分块内的空白和标点可能与原文不同（切分句子时去掉了结束标点，句子、段落重新以空格或空行连接），
+    按非空白字符逐个匹配，字符之间允许任意空白和句子结束标点。从右向左查找，分块的非空白字符都在起始位置之后
+    """
+    chars = ''.join(chunk.split())
+    if not chars:
+        return None
+    pattern = re.compile(CHUNK_GAP_PATTERN.join(re.escape(char) for char in chars))
+    position = len(text) - len(chars) + 1
+    while position > 0:
+        position = text.rfind(chars[0], 0, position)
+        if position < 0:
+            return None
+        if pattern.match(text, position):
+            return position
+    return None
+
+
+# 可以解析的文档类型
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt', '.md')
+
+
+class DocumentExtractionError(Exception):
+    """文档解析失败或文件类型不支持"""
+
 
 class DocumentProcessor:
     """文档处理类，用于解析不同类型的文档并分块"""
 
     def __init__(self, chunking_method="token", chunk_size=500, similarity_threshold=0.7, overlap_size=100, 
-                 custom_delimiter=None, window_size=3, step_size=1, min_chunk_size=50, max_chunk_size=2000):
+                 custom_delimiter=None, window_size=3, step_size=1, min_chunk_size=50, max_chunk_size=2000,
+                 token_counter=None, embedding_model=None):
         self.chunking_method = chunking_method
         self.chunk_size = chunk_size
         self.similarity_threshold = similarity_threshold
@@ -30,6 +90,13 @@ class DocumentProcessor:
         self.step_size = step_size
         self.min_chunk_size = min_chunk_size
         self.max_chunk_size = max_chunk_size
+        # token计数器，各分块方法共用，默认使用规则估算
+        self.token_counter = token_counter or default_token_counter
+        # 嵌入语义分块使用的嵌入模型，以及分块时已算出的分块向量（按分块文本索引，入库时复用）
+        self.embedding_model = embedding_model
+        self.chunk_vectors = {}
+        # 章节分块时每个分块的标题路径（按分块文本索引，入库时写入分块元数据）
+        self.chunk_headings = {}
         # 文档存储目录
         self.storage_dir = os.path.join(settings.MEDIA_ROOT, 'knowledge_docs')
         os.makedirs(self.storage_dir, exist_ok=True)
@@ -37,93 +104,148 @@ class DocumentProcessor:
         self.vector_dir = os.path.join(settings.MEDIA_ROOT, 'vector_indexes')
         os.makedirs(self.vector_dir, exist_ok=True)
 
-    def save_file(self, file, knowledge_db_id):
-        """保存上传的文件"""
-        # 为文件创建唯一目录
-        db_dir = os.path.join(self.storage_dir, str(knowledge_db_id))
-        os.makedirs(db_dir, exist_ok=True)
-
-        # 生成唯一文件名
-        filename = file.name
-        file_path = os.path.join(db_dir, filename)
-
-        # 如果文件已存在，在文件名前添加时间戳
-        if os.path.exists(file_path):
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            name, ext = os.path.splitext(filename)
-            filename = f"{name}_{timestamp}{ext}"
+    def save_file(self, file, knowledge_db_id, file_path=None):
+        """保存上传的文件，指定 file_path 时直接写入该路径（用于文档更新）"""
+        if file_path is not None:
+            filename = os.path.basename(file_path)
+        else:
+            # 为文件创建唯一目录
+            db_dir = os.path.join(self.storage_dir, str(knowledge_db_id))
+            os.makedirs(db_dir, exist_ok=True)
+
+            # 生成唯一文件名
+            filename = file.name
             file_path = os.path.join(db_dir, filename)
 
-        # 保存文件
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
+            # 如果文件已存在，在文件名前添加时间戳
+            if os.path.exists(file_path):
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                name, ext = os.path.splitext(filename)
+                filename = f"{name}_{timestamp}{ext}"
+                file_path = os.path.join(db_dir, filename)
+
+        # 保存文件，已流式写入临时文件的上传直接移动到目标位置，不再复制一遍
+        if hasattr(file, 'temporary_file_path'):
+            file_move_safe(file.temporary_file_path(), file_path, allow_overwrite=True)
+        else:
+            with open(file_path, 'wb+') as destination:
+                for chunk in file.chunks():
+                    destination.write(chunk)
 
         # 获取文件信息
         file_info = {
             'filename': filename,
             'file_path': file_path,
             'file_type': os.path.splitext(filename)[1][1:].lower(),
-            'file_size': os.path.getsize(file_path)
+            'file_size': os.path.getsize(file_path),
+            'file_hash': getattr(file, 'sha256', None)
         }
 
         return file_info
 
-    def process_document(self, file_path):
-        """处理文档，提取文本内容"""
+    def iter_document(self, file_path, block_size=65536):
+        """流式提取文档，逐段返回文本片段（PDF按页，Word按段落，文本文件按固定大小的块），不在内存中拼接整个文档
+
+        解析失败或文件类型不支持时抛出 DocumentExtractionError
+        """
         file_ext = os.path.splitext(file_path)[1].lower()
 
-        try:
-            if file_ext == '.pdf':
-                return self._extract_from_pdf(file_path)
-            elif file_ext in ['.docx', '.doc']:
-                return self._extract_from_docx(file_path)
-            elif file_ext in ['.txt', '.md']:
-                return self._extract_from_text(file_path)
-            else:
-                logger.warning(f"不支持的文件类型: {file_ext}")
-                return "不支持的文件类型"
-        except Exception as e:
-            logger.error(f"处理文档时出错: {str(e)}", exc_info=True)
-            return f"处理文档失败: {str(e)}"
+        if file_ext == '.pdf':
+            segments = (text for _, text in iter_pdf_pages(file_path))
+        elif file_ext in ['.docx', '.doc']:
+            segments = self._iter_docx_paragraphs(file_path)
+        elif file_ext in ['.txt', '.md']:
+            segments = self._iter_text_blocks(file_path, block_size)
+        else:
+            logger.warning(f"不支持的文件类型: {file_ext}")
+            raise DocumentExtractionError(f"不支持的文件类型: {file_ext}")
 
-    def _extract_from_pdf(self, file_path):
-        """从PDF文件中提取文本"""
-        text = ""
         try:
-            with fitz.open(file_path) as doc:
-                for page in doc:
-                    text += page.get_text()
-            return text
-        except Exception as e:
-            logger.error(f"从PDF提取文本出错: {str(e)}", exc_info=True)
+            yield from segments
+        except DocumentExtractionError:
             raise
-
-    def _extract_from_docx(self, file_path):
-        """从Word文档中提取文本"""
-        text = ""
-        try:
-            doc = docx.Document(file_path)
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
         except Exception as e:
-            logger.error(f"从Word提取文本出错: {str(e)}", exc_info=True)
-            raise
+            logger.error(f"解析文档 {file_path} 时出错: {str(e)}", exc_info=True)
+            raise DocumentExtractionError(f"处理文档失败: {str(e)}") from e
 
-    def _extract_from_text(self, file_path):
-        """从文本文件中提取文本"""
+    def _iter_docx_paragraphs(self, file_path):
+        """逐段落返回Word文档文本"""
+        doc = docx.Document(file_path)
+        for para in doc.paragraphs:
+            yield para.text + "\n"
+
+    def _iter_text_blocks(self, file_path, block_size):
+        """按固定大小读取文本文件，增量解码，多字节字符跨块时由解码器保留到下一块"""
+        encoding = self._detect_text_encoding(file_path, block_size)
+        decoder = codecs.getincrementaldecoder(encoding)()
+        with open(file_path, 'rb') as file:
+            while True:
+                block = file.read(block_size)
+                text = decoder.decode(block, final=not block)
+                if text:
+                    yield text
+                if not block:
+                    break
+
+    def _detect_text_encoding(self, file_path, block_size=65536):
+        """逐块校验文件是否为合法的UTF-8，否则按GBK读取"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            with open(file_path, 'rb') as file:
+                while True:
+                    block = file.read(block_size)
+                    decoder.decode(block, final=not block)
+                    if not block:
+                        return 'utf-8'
         except UnicodeDecodeError:
-            # 尝试其他编码
-            try:
-                with open(file_path, 'r', encoding='gbk') as file:
-                    return file.read()
-            except Exception as e:
-                logger.error(f"从文本文件提取内容出错: {str(e)}", exc_info=True)
-                raise
+            return 'gbk'
+
+    def iter_chunks(self, file_path, buffer_chars=None):
+        """流式分块：边提取边分块，文本累积到缓冲区上限后分块并立即产出，峰值内存与文档大小无关，
+        调用方可以在提取完成前开始处理前面的分块
+
+        缓冲区末尾的分块可能在边界处被截断，其原文保留到缓冲区中与下一段文本一起重新分块，结果与整篇一次分块相同
+        （固定长度、滑动窗口和带重叠的递归分块按位置切分，缓冲区边界附近的分块位置可能不同）；
+        超过缓冲区上限的文本只分出一个分块、或末尾分块无法在原文中定位时直接产出
+        """
+        if buffer_chars is None:
+            buffer_chars = getattr(settings, 'INGESTION_BUFFER_CHARS', 200000)
+        # 每个文档重新记录分块向量，不保留上一个文档未取出的向量
+        self.chunk_vectors = {}
+
+        if self.chunking_method == "chapter":
+            # 章节分块由标题解析器维护跨缓冲区的标题层级，直接流式处理
+            yield from self._iter_chapter_chunks(self.iter_document(file_path), buffer_chars)
+            return
+
+        buffer = []
+        buffer_size = 0
+        for segment in self.iter_document(file_path):
+            buffer.append(segment)
+            buffer_size += len(segment)
+            if not buffer_chars or buffer_size < buffer_chars:
+                continue
+
+            text = ''.join(buffer)
+            chunks = self.split_text(text)
+            # 末尾分块可能在边界处被截断，合并小分块时倒数第二个分块是否合并也取决于它，两者一起重新分块
+            carried = chunks[-2:] if len(chunks) > 2 else chunks[-1:]
+            tail_start = _find_chunk_start(text, carried[0]) if len(chunks) > 1 else None
+            if tail_start:
+                yield from chunks[:-len(carried)]
+                # 重新分块的原文放回缓冲区，与下一段文本直接拼接，丢弃为这些分块记录的向量
+                for chunk in carried:
+                    self.chunk_vectors.pop(chunk, None)
+                buffer = [text[tail_start:]]
+                buffer_size = len(buffer[0])
+            else:
+                # 超过缓冲区上限仍只有一个分块（如自定义分隔符很少出现），直接产出，避免缓冲区无限增长、反复分块
+                yield from chunks
+                buffer = []
+                buffer_size = 0
+
+        if buffer:
+            yield from self.split_text(''.join(buffer))
 
     def split_text(self, text):
         """根据指定方法分割文本"""
@@ -139,6 +261,12 @@ class DocumentProcessor:
             chunks = self._split_by_chapter(text)
         elif self.chunking_method == "semantic":
             chunks = self._split_by_semantic(text)
+        elif self.chunking_method == "embedding_semantic":
+            if self.embedding_model is None:
+                logger.warning("嵌入语义分块没有可用的嵌入模型，使用词汇语义分块")
+                chunks = self._split_by_semantic(text)
+            else:
+                chunks = self._split_by_embedding_semantic(text)
         elif self.chunking_method == "recursive":
             chunks = self._split_recursive(text)
         elif self.chunking_method == "sliding_window":
@@ -154,8 +282,8 @@ class DocumentProcessor:
         # 过滤空块和过小的块
         chunks = [chunk.strip() for chunk in chunks if chunk.strip() and len(chunk.strip()) >= self.min_chunk_size]
         
-        # 对于自定义分隔符分块，不进行自动合并，保持用户指定的分割结果
-        if self.chunking_method != "custom_delimiter":
+        # 对于自定义分隔符分块，不进行自动合并，保持用户指定的分割结果；章节分块在章节内部已经合并
+        if self.chunking_method not in ("custom_delimiter", "chapter"):
             # 合并过小的块（使用改进的合并逻辑）
             chunks = self._merge_small_chunks(chunks)
         
@@ -163,26 +291,15 @@ class DocumentProcessor:
         return chunks
 
     def _split_by_token(self, text):
-        """按Token数量分块（基于简单的Token估算）"""
-        # 简单的Token估算：中文字符=1token，英文单词=1token，标点=0.5token
-        def estimate_tokens(text):
-            chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-            english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-            punctuation = len(re.findall(r'[^\w\s\u4e00-\u9fff]', text))
-            return chinese_chars + english_words + punctuation * 0.5
-        
+        """按Token数量分块（规则估算或嵌入模型分词器计数，整批句子一次计数）"""
         chunks = []
-        sentences = re.split(r'[.!?。！？；;]\s*', text)
+        sentences = [sentence.strip() for sentence in SENTENCE_SPLIT_PATTERN.split(text)]
+        sentences = [sentence for sentence in sentences if sentence]
+        sentence_token_counts = self.token_counter.count_batch(sentences)
         current_chunk = []
         current_tokens = 0
         
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-                
-            sentence_tokens = estimate_tokens(sentence)
-            
+        for sentence, sentence_tokens in zip(sentences, sentence_token_counts):
             # 如果单个句子就超过限制，需要按字符分割
             if sentence_tokens > self.chunk_size:
                 if current_chunk:
@@ -191,7 +308,7 @@ class DocumentProcessor:
                     current_tokens = 0
                 
                 # 按字符分割长句子
-                char_chunks = self._split_long_sentence_by_chars(sentence, self.chunk_size)
+                char_chunks = self._split_long_sentence_by_chars(sentence, self.chunk_size, sentence_tokens)
                 chunks.extend(char_chunks)
                 continue
             
@@ -210,17 +327,13 @@ class DocumentProcessor:
         
         return chunks
     
-    def _split_long_sentence_by_chars(self, sentence, max_tokens):
+    def _split_long_sentence_by_chars(self, sentence, max_tokens, sentence_tokens=None):
         """将长句子按字符分割"""
         chunks = []
         # 估算每个字符的token数
-        def estimate_tokens(text):
-            chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-            english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-            punctuation = len(re.findall(r'[^\w\s\u4e00-\u9fff]', text))
-            return chinese_chars + english_words + punctuation * 0.5
-        
-        estimated_char_per_token = len(sentence) / max(1, estimate_tokens(sentence))
+        if sentence_tokens is None:
+            sentence_tokens = self.token_counter.count(sentence)
+        estimated_char_per_token = len(sentence) / max(1, sentence_tokens)
         chars_per_chunk = int(max_tokens * estimated_char_per_token)
         
         start = 0
@@ -243,9 +356,8 @@ class DocumentProcessor:
 
     def _split_by_sentence(self, text):
         """按句子边界分块"""
-        # 中英文句子分割正则表达式
-        sentence_pattern = r'[.!?。！？；;]\s*'
-        sentences = re.split(sentence_pattern, text)
+        # 中英文句子分割
+        sentences = SENTENCE_SPLIT_PATTERN.split(text)
         
         chunks = []
         current_chunk = []
@@ -332,55 +444,80 @@ class DocumentProcessor:
 
     def _split_by_chapter(self, text):
         """按章节标题分块"""
-        # 检测标题模式：# ## ### 或 第一章 第二节 等
-        title_patterns = [
-            r'^#{1,6}\s+.+$',  # Markdown标题
-            r'^第[一二三四五六七八九十\d]+[章节部分]\s*.+$',  # 中文章节
-            r'^Chapter\s+\d+.*$',  # 英文章节
-            r'^Section\s+\d+.*$',  # 英文节
-            r'^\d+\.\s+.+$',  # 数字标题
-            r'^[A-Z][A-Z\s]+$',  # 全大写标题
-        ]
-        
-        lines = text.split('\n')
-        chunks = []
-        current_chunk = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                if current_chunk:
-                    current_chunk.append('')
-                continue
-            
-            # 检查是否是标题
-            is_title = False
-            for pattern in title_patterns:
-                if re.match(pattern, line, re.MULTILINE):
-                    is_title = True
-                    break
-            
-            if is_title and current_chunk:
-                # 保存当前块
-                chunk_text = '\n'.join(current_chunk).strip()
-                if len(chunk_text) >= self.min_chunk_size:
-                    chunks.append(chunk_text)
-                current_chunk = [line]
-            else:
-                current_chunk.append(line)
-        
-        # 添加最后一个块
-        if current_chunk:
-            chunk_text = '\n'.join(current_chunk).strip()
-            if len(chunk_text) >= self.min_chunk_size:
-                chunks.append(chunk_text)
-        
-        # 如果没有检测到章节，回退到段落分块
-        if len(chunks) <= 1:
-            logger.info("未检测到明显的章节结构，回退到段落分块")
-            return self._split_by_paragraph(text)
-        
-        return chunks
+        return list(self._iter_chapter_chunks([text]))
+
+    def _iter_chapter_chunks(self, segments, buffer_chars=None):
+        """按标题层级流式分块，每个分块以所在章节的标题路径开头（如 "第三章 安装 > 3.2 环境配置"），
+        标题路径同时记录为分块元数据
+
+        标题解析器一次扫描识别全部标题，耗时与文本长度成线性关系。不超过 max_chunk_size 的章节整体作为一个分块，
+        相邻的小章节合并到 chunk_size，合并后的分块以共同的上级标题路径开头，各章节保留自己的下级标题；
+        超长的章节按段落切分，每个分块都带上标题路径。没有标题的文档等同于按段落分块
+        """
+        parser = HeadingParser(max_body_chars=buffer_chars or 200000)
+        pending = []
+        pending_size = 0
+        chunk_count = 0
+
+        def flush():
+            nonlocal pending, pending_size
+            sections, pending, pending_size = pending, [], 0
+            if not sections:
+                return []
+            common = sections[0][0]
+            for path, _ in sections[1:]:
+                shared = 0
+                while shared < min(len(common), len(path)) and common[shared] == path[shared]:
+                    shared += 1
+                common = common[:shared]
+            parts = []
+            for path, body in sections:
+                sub_path = format_heading_path(path[len(common):])
+                parts.append(f"{sub_path}\n{body}" if sub_path else body)
+            body = '\n\n'.join(parts)
+            if len(body) < self.min_chunk_size:
+                return []
+            return [self._make_chapter_chunk(common, body)]
+
+        def pack(sections):
+            nonlocal pending_size
+            for path, body in sections:
+                body = body.strip()
+                if len(body) > self.max_chunk_size:
+                    yield from flush()
+                    for piece in self._split_by_paragraph(body):
+                        if len(piece) >= self.min_chunk_size:
+                            yield self._make_chapter_chunk(path, piece)
+                    continue
+                # 按带完整标题路径的长度估算合并后的大小
+                section_size = len(format_heading_path(path)) + len(body) + 1
+                if pending and pending_size + section_size > self.chunk_size:
+                    yield from flush()
+                pending.append((path, body))
+                pending_size += section_size
+                if pending_size >= self.chunk_size:
+                    yield from flush()
+
+        for segment in segments:
+            for chunk in pack(parser.feed(segment)):
+                chunk_count += 1
+                yield chunk
+        for chunk in pack(parser.close()):
+            chunk_count += 1
+            yield chunk
+        for chunk in flush():
+            chunk_count += 1
+            yield chunk
+
+        logger.info(f"使用 chapter 方法分割文本，识别 {parser.heading_count} 个标题，生成 {chunk_count} 个分块")
+
+    def _make_chapter_chunk(self, path, body):
+        heading_path = format_heading_path(path)
+        if not heading_path:
+            return body
+        chunk = f"{heading_path}\n{body}"
+        self.chunk_headings[chunk] = heading_path[:HEADING_PATH_MAX_CHARS]
+        return chunk
 
     def _split_by_custom_delimiter(self, text):
         """按自定义分隔符分块"""
@@ -415,7 +552,7 @@ class DocumentProcessor:
 
     def _split_by_sliding_window(self, text):
         """滑动窗口分块"""
-        sentences = re.split(r'[.!?。！？；;]\s*', text)
+        sentences = SENTENCE_SPLIT_PATTERN.split(text)
         sentences = [s.strip() for s in sentences if s.strip()]
         
         if len(sentences) < self.window_size:
@@ -470,9 +607,13 @@ class DocumentProcessor:
         return merged_chunks
 
     def _split_by_semantic(self, text):
-        """按语义相似度分块（改进实现）"""
+        """按语义相似度分块（增量实现）
+
+        当前块的词集合、标点集合和文本长度随句子加入增量维护，每个句子只扫描一次，
+        相似度由集合交集大小推出，整体耗时与文本长度成线性关系
+        """
         # 先按句子分割
-        sentences = re.split(r'[.!?。！？；;]\s*', text)
+        sentences = SENTENCE_SPLIT_PATTERN.split(text)
         sentences = [s.strip() for s in sentences if s.strip()]
         
         if len(sentences) <= 1:
@@ -480,20 +621,34 @@ class DocumentProcessor:
         
         chunks = []
         current_chunk = [sentences[0]]
+        current_words = set(WORD_PATTERN.findall(sentences[0].lower()))
+        current_punct = set(PUNCTUATION_PATTERN.findall(sentences[0]))
+        # 当前块以空格连接后的文本长度
+        current_length = len(sentences[0])
         
-        for i in range(1, len(sentences)):
-            current_text = ' '.join(current_chunk)
+        for sentence in sentences[1:]:
+            sentence_words = set(WORD_PATTERN.findall(sentence.lower()))
+            sentence_punct = set(PUNCTUATION_PATTERN.findall(sentence))
+            sentence_length = len(sentence)
             
-            # 多维度相似度计算
-            lexical_similarity = self._calculate_lexical_similarity(current_text, sentences[i])
-            structural_similarity = self._calculate_structural_similarity(current_text, sentences[i])
+            # 词汇相似度：词集合的Jaccard系数
+            lexical_similarity = 0.0
+            if current_words and sentence_words:
+                common = len(sentence_words & current_words)
+                lexical_similarity = common / (len(current_words) + len(sentence_words) - common)
+            
+            # 结构相似度：长度比例和标点集合的Jaccard系数
+            len_ratio = min(current_length, sentence_length) / max(current_length, sentence_length, 1)
+            common_punct = len(sentence_punct & current_punct)
+            punct_similarity = common_punct / max(len(current_punct) + len(sentence_punct) - common_punct, 1)
+            structural_similarity = 0.6 * len_ratio + 0.4 * punct_similarity
             
             # 综合相似度
             combined_similarity = 0.7 * lexical_similarity + 0.3 * structural_similarity
             
             # 检查长度限制
-            would_exceed_max = len(current_text) + len(sentences[i]) > self.max_chunk_size
-            would_be_too_small = len(current_text) < self.min_chunk_size
+            would_exceed_max = current_length + sentence_length > self.max_chunk_size
+            would_be_too_small = current_length < self.min_chunk_size
             
             # 决策逻辑
             should_split = (
@@ -502,41 +657,90 @@ class DocumentProcessor:
             ) or would_exceed_max
             
             if should_split:
-                chunks.append(current_text)
-                current_chunk = [sentences[i]]
+                chunks.append(' '.join(current_chunk))
+                current_chunk = [sentence]
+                current_words = sentence_words
+                current_punct = sentence_punct
+                current_length = sentence_length
             else:
-                current_chunk.append(sentences[i])
+                current_chunk.append(sentence)
+                current_words |= sentence_words
+                current_punct |= sentence_punct
+                current_length += sentence_length + 1
         
         # 添加最后一个块
         if current_chunk:
             chunks.append(' '.join(current_chunk))
         
         return chunks
-    
-    def _calculate_lexical_similarity(self, text1, text2):
-        """计算词汇相似度"""
-        words1 = set(re.findall(r'\w+', text1.lower()))
-        words2 = set(re.findall(r'\w+', text2.lower()))
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
-    
-    def _calculate_structural_similarity(self, text1, text2):
-        """计算结构相似度（基于句子长度、标点等）"""
-        # 句子长度相似度
-        len_ratio = min(len(text1), len(text2)) / max(len(text1), len(text2), 1)
-        
-        # 标点符号相似度
-        punct1 = set(re.findall(r'[^\w\s]', text1))
-        punct2 = set(re.findall(r'[^\w\s]', text2))
-        punct_similarity = len(punct1.intersection(punct2)) / max(len(punct1.union(punct2)), 1)
-        
-        return 0.6 * len_ratio + 0.4 * punct_similarity
+
+    def _split_by_embedding_semantic(self, text):
+        """基于句向量的语义分块
+
+        全部句子一次批量编码，向量化计算相邻句子的余弦相似度，在低于 similarity_threshold 的
+        相似度低谷处切分；块长度不足 min_chunk_size 时不切分，超过 max_chunk_size 时在块内
+        相似度最低处强制切分。只含一个句子的块直接记录句向量，入库时不再重复编码
+        """
+        sentences = SENTENCE_SPLIT_PATTERN.split(text)
+        sentences = [s.strip() for s in sentences if s.strip()]
+        if len(sentences) <= 1:
+            return sentences
+
+        vectors = np.asarray(self.embedding_model.embed_texts(sentences), dtype=np.float32)
+        if len(vectors) != len(sentences):
+            logger.warning(f"句向量数量与句子数量不一致（{len(vectors)} != {len(sentences)}），使用词汇语义分块")
+            return self._split_by_semantic(text)
+
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        # similarities[i] 为第 i 句与第 i+1 句的余弦相似度
+        similarities = np.einsum('ij,ij->i', normalized[:-1], normalized[1:])
+        # 相似度低谷：不高于两侧相邻位置
+        left = np.concatenate([[np.inf], similarities[:-1]])
+        right = np.concatenate([similarities[1:], [np.inf]])
+        split_points = (similarities < self.similarity_threshold) & (similarities <= left) & (similarities <= right)
+
+        # prefix[k] 为前k个句子的总长度，句子之间以空格连接
+        prefix = np.concatenate([[0], np.cumsum([len(sentence) for sentence in sentences])])
+
+        def span_length(start, end):
+            return int(prefix[end] - prefix[start]) + (end - start - 1)
+
+        boundaries = []
+        start = 0
+        for i in range(1, len(sentences)):
+            # 加入第 i 句后超过最大长度时强制切分，切分后剩余部分仍超长时继续切分
+            while i > start and span_length(start, i + 1) > self.max_chunk_size:
+                fitting = [b for b in range(start + 1, i + 1) if span_length(start, b) <= self.max_chunk_size]
+                # 在不超过最大长度、满足最小长度的位置中选相似度最低处切分
+                candidates = [b for b in fitting if span_length(start, b) >= self.min_chunk_size]
+                if candidates:
+                    cut = min(candidates, key=lambda b: similarities[b - 1])
+                else:
+                    # 单个句子超过最大长度时只能单独成块
+                    cut = fitting[-1] if fitting else start + 1
+                boundaries.append(cut)
+                start = cut
+            if i > start and split_points[i - 1] and span_length(start, i) >= self.min_chunk_size:
+                boundaries.append(i)
+                start = i
+
+        chunks = []
+        for chunk_start, chunk_end in zip([0] + boundaries, boundaries + [len(sentences)]):
+            chunk = ' '.join(sentences[chunk_start:chunk_end])
+            chunks.append(chunk)
+            if chunk_end - chunk_start == 1:
+                self.chunk_vectors[chunk] = vectors[chunk_start]
+
+        logger.debug(f"嵌入语义分块: {len(sentences)} 个句子, {len(chunks)} 个分块")
+        return chunks
+
+    def take_chunk_vectors(self, chunks):
+        """取出分块时已算出的分块向量，返回与 chunks 等长的列表（没有时为None）"""
+        return [self.chunk_vectors.pop(chunk, None) for chunk in chunks]
+
+    def take_chunk_headings(self, chunks):
+        """取出章节分块的标题路径，返回与 chunks 等长的列表（没有时为None）"""
+        return [self.chunk_headings.pop(chunk, None) for chunk in chunks]
 
     def _split_recursive(self, text):
         """递归分块（带重叠）"""
@@ -572,9 +776,17 @@ class DocumentProcessor:
 class VectorStore:
     """向量存储类，用于管理FAISS索引"""
 
-    def __init__(self, vector_dimension=384, index_type="Flat"):
+    # 重建索引时每批读取和编码的分块数量
+    REBUILD_BATCH_SIZE = 256
+    # 降维知识库第一阶段检索的候选数量倍数，候选结果再按完整维度向量重新打分
+    RERANK_CANDIDATE_FACTOR = 4
+
+    def __init__(self, vector_dimension=384, index_type="Flat", reduced_dimension=None, reduction_method=None):
         self.vector_dimension = vector_dimension
         self.index_type = index_type
+        # 降维配置，reduced_dimension 为空表示不降维
+        self.reduced_dimension = reduced_dimension
+        self.reduction_method = reduction_method or 'matryoshka'
         # 向量库存储目录
         self.vector_dir = os.path.join(settings.MEDIA_ROOT, 'vector_indexes')
         os.makedirs(self.vector_dir, exist_ok=True)
@@ -582,8 +794,10 @@ class VectorStore:
     def create_index(self, knowledge_db_id):
         """为知识库创建FAISS索引"""
         db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
-        os.makedirs(db_vector_dir, exist_ok=True)
+        with index_lock(db_vector_dir):
+            return self._create_index(knowledge_db_id, db_vector_dir)
 
+    def _create_index(self, knowledge_db_id, db_vector_dir):
         index_path = os.path.join(db_vector_dir, "faiss.index")
         mapping_path = os.path.join(db_vector_dir, "id_mapping.json")
 
@@ -593,30 +807,25 @@ class VectorStore:
             return True
 
         try:
+            # 配置了降维时索引中保存降维后的向量
+            index_dimension = self.vector_dimension
+            if self.reduced_dimension:
+                reducer = DimensionReducer(db_vector_dir, self.vector_dimension,
+                                           self.reduced_dimension, self.reduction_method)
+                reducer.reset()
+                reducer.save_config()
+                index_dimension = self.reduced_dimension
+
             # 创建FAISS索引
-            if self.index_type == "Flat":
-                index = faiss.IndexFlatL2(self.vector_dimension)
-            elif self.index_type == "IVF":
-                # 为IVF创建量化器
-                quantizer = faiss.IndexFlatL2(self.vector_dimension)
-                # 创建IVF索引，nlist是聚类的数量
-                index = faiss.IndexIVFFlat(quantizer, self.vector_dimension, 100)
-                # IVF索引需要训练
-                # 这里需要一些训练数据，通常实际应用中需要真实数据
-                # 如果没有训练数据，这里使用随机数据
-                random_data = np.random.random((100, self.vector_dimension)).astype('float32')
-                index.train(random_data)
-            else:
-                # 默认使用Flat
-                logger.warning(f"不支持的索引类型 {self.index_type}，使用默认Flat")
-                index = faiss.IndexFlatL2(self.vector_dimension)
+            index = self._new_index(index_dimension, self.index_type)
 
             # 保存索引
             faiss.write_index(index, index_path)
 
-            # 创建空的ID映射
+            # 创建空的ID映射和BM25索引
             with open(mapping_path, 'w') as f:
                 json.dump({}, f)
+            LexicalIndex.create(db_vector_dir).publish()
 
             logger.info(f"已为知识库 {knowledge_db_id} 创建索引")
             return True
@@ -624,58 +833,145 @@ class VectorStore:
             logger.error(f"创建索引时出错: {str(e)}", exc_info=True)
             return False
 
-    def add_vectors(self, knowledge_db_id, chunk_ids, vectors):
-        """添加向量到索引"""
+    def add_vectors(self, knowledge_db_id, chunk_ids, vectors, texts=None):
+        """添加向量到索引，texts 为分块内容，用于同步更新BM25索引（不传时从数据库读取）"""
         if len(chunk_ids) != len(vectors):
             logger.error("分块ID和向量数量不匹配")
             return False
 
+        try:
+            writer = self.open_index_writer(knowledge_db_id)
+            try:
+                vector_ids = writer.add(chunk_ids, vectors, texts)
+                writer.save()
+            except Exception:
+                writer.discard()
+                raise
+
+            logger.info(f"已将 {len(vectors)} 个向量添加到知识库 {knowledge_db_id} 的索引")
+            return vector_ids
+        except Exception as e:
+            logger.error(f"添加向量时出错: {str(e)}", exc_info=True)
+            return []
+
+    def open_index_writer(self, knowledge_db_id):
+        """打开知识库索引用于连续追加多批向量，全部追加完成后调用 save() 一次性写回
+
+        写入器从打开到 save()/discard() 一直持有知识库的索引锁，其他写入方（上传、更新、删除、重建）等待，
+        不会互相覆盖；调用方应尽量缩短打开的时间
+        """
         db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
         index_path = os.path.join(db_vector_dir, "faiss.index")
         mapping_path = os.path.join(db_vector_dir, "id_mapping.json")
 
+        # 检查索引是否存在
+        if not os.path.exists(index_path) or not os.path.exists(mapping_path):
+            self.create_index(knowledge_db_id)
+
+        return VectorIndexWriter(db_vector_dir)
+
+    def search(self, knowledge_db_id, query_vector, top_k=5, with_vectors=False):
+        """搜索最相似的向量
+
+        with_vectors 为True时在结果中附带从索引（降维知识库为完整维度向量文件）还原的向量，供MMR等后处理使用
+        """
+        loaded = self._load_index(knowledge_db_id)
+        if loaded is None:
+            return []
+
         try:
-            # 检查索引是否存在
-            if not os.path.exists(index_path) or not os.path.exists(mapping_path):
-                self.create_index(knowledge_db_id)
+            return self._search_loaded(*loaded, query_vector, top_k, with_vectors)
+        except Exception as e:
+            logger.error(f"搜索向量时出错: {str(e)}", exc_info=True)
+            return []
 
-            # 读取索引
-            index = faiss.read_index(index_path)
+    def hybrid_search(self, knowledge_db_id, query, query_vector, top_k=5, vector_weight=1.0,
+                      lexical_weight=1.0, with_vectors=False):
+        """向量检索与BM25检索混合
 
-            # 读取ID映射
-            with open(mapping_path, 'r') as f:
-                id_mapping = json.load(f)
+        两路检索并发执行，各取 top_k 个结果后按加权倒数排名融合。结果字段与 search 一致，
+        另附 lexical_score（未被BM25召回时为None）、lexical_relevance（BM25得分除以本次最高得分，取值 (0, 1]，
+        未被BM25召回时为None）和 fusion_score；只被BM25召回的分块按向量ID还原向量并计算与查询的距离，
+        保证 distance 和 vector 字段对所有结果有效
+        """
+        if not lexical_weight:
+            return self.search(knowledge_db_id, query_vector, top_k, with_vectors)
+
+        loaded = self._load_index(knowledge_db_id)
+        if loaded is None:
+            return []
+        db_vector_dir, index, id_mapping = loaded
 
-            # 将向量添加到索引
-            vectors_array = np.array(vectors).astype('float32')
-            vector_ids = list(range(index.ntotal, index.ntotal + len(vectors)))
+        if not LexicalIndex.exists(db_vector_dir):
+            # 早于BM25索引创建的知识库，由 build_lexical_index 命令生成索引之前只做向量检索
+            if knowledge_db_id not in _missing_lexical_index_warned:
+                _missing_lexical_index_warned.add(knowledge_db_id)
+                logger.warning(f"知识库 {knowledge_db_id} 没有BM25索引，混合检索退化为向量检索，"
+                               f"请运行 python manage.py build_lexical_index --database-id {knowledge_db_id}")
+            return self._search_loaded(db_vector_dir, index, id_mapping, query_vector, top_k, with_vectors)
 
-            index.add(vectors_array)
+        def search_lexical():
+            with LexicalIndex.open(db_vector_dir, read_only=True) as lexical_index:
+                return lexical_index.search(query, top_k)
 
-            # 更新ID映射
-            for i, chunk_id in enumerate(chunk_ids):
-                id_mapping[str(vector_ids[i])] = chunk_id
+        try:
+            lexical_future = lexical_search_executor.submit(search_lexical)
+            vector_results = self._search_loaded(db_vector_dir, index, id_mapping, query_vector, top_k, with_vectors)
+            lexical_results = lexical_future.result()
 
-            # 保存更新后的索引和映射
-            faiss.write_index(index, index_path)
-            with open(mapping_path, 'w') as f:
-                json.dump(id_mapping, f)
+            fused = reciprocal_rank_fusion(
+                [[result['chunk_id'] for result in vector_results], [chunk_id for chunk_id, _ in lexical_results]],
+                [vector_weight, lexical_weight],
+                getattr(settings, 'HYBRID_RRF_K', 60)
+            )[:top_k]
 
-            logger.info(f"已将 {len(vectors)} 个向量添加到知识库 {knowledge_db_id} 的索引")
-            return vector_ids
+            vector_dict = {result['chunk_id']: result for result in vector_results}
+            lexical_dict = dict(lexical_results)
+            top_lexical_score = lexical_results[0][1] if lexical_results else 0.0
+            vector_id_by_chunk = None
+            results = []
+            lexical_only = []
+            for chunk_id, fusion_score in fused:
+                result = vector_dict.get(chunk_id)
+                if result is None:
+                    if vector_id_by_chunk is None:
+                        vector_id_by_chunk = {chunk: int(vector_id) for vector_id, chunk in id_mapping.items()}
+                    if chunk_id not in vector_id_by_chunk:
+                        continue
+                    result = {'chunk_id': chunk_id, 'vector_id': vector_id_by_chunk[chunk_id]}
+                    lexical_only.append(result)
+                result['lexical_score'] = lexical_dict.get(chunk_id)
+                result['lexical_relevance'] = (
+                    result['lexical_score'] / top_lexical_score
+                    if result['lexical_score'] is not None and top_lexical_score > 0 else None
+                )
+                result['fusion_score'] = fusion_score
+                results.append(result)
+
+            if lexical_only:
+                query_array = np.ascontiguousarray(query_vector, dtype=np.float32).reshape(-1)
+                vectors = self._get_vectors(db_vector_dir, index, [result['vector_id'] for result in lexical_only])
+                for result, vector in zip(lexical_only, vectors):
+                    result['distance'] = float(np.sum((vector[:len(query_array)] - query_array) ** 2))
+                    if with_vectors:
+                        result['vector'] = vector
+
+            logger.debug(f"混合检索: 向量 {len(vector_results)} 个, BM25 {len(lexical_results)} 个, "
+                         f"融合后 {len(results)} 个（其中仅BM25召回 {len(lexical_only)} 个）")
+            return results
         except Exception as e:
-            logger.error(f"添加向量时出错: {str(e)}", exc_info=True)
+            logger.error(f"混合检索时出错: {str(e)}", exc_info=True)
             return []
 
-    def search(self, knowledge_db_id, query_vector, top_k=5):
-        """搜索最相似的向量"""
+    def _load_index(self, knowledge_db_id):
+        """读取知识库的索引和ID映射，返回 (目录, 索引, ID映射)，索引不存在时返回None"""
         db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
         index_path = os.path.join(db_vector_dir, "faiss.index")
         mapping_path = os.path.join(db_vector_dir, "id_mapping.json")
 
         if not os.path.exists(index_path) or not os.path.exists(mapping_path):
             logger.error(f"知识库 {knowledge_db_id} 的索引不存在")
-            return []
+            return None
 
         try:
             # 读取索引
@@ -684,61 +980,203 @@ class VectorStore:
             # 读取ID映射
             with open(mapping_path, 'r') as f:
                 id_mapping = json.load(f)
+        except Exception as e:
+            logger.error(f"读取知识库 {knowledge_db_id} 的索引时出错: {str(e)}", exc_info=True)
+            return None
 
-            # 确保query_vector是正确的形状
-            query_vector = np.array([query_vector]).astype('float32')
-            
-            # 调试信息：检查维度
-            logger.debug(f"索引维度: {index.d}, 查询向量维度: {query_vector.shape[1]}, 配置维度: {self.vector_dimension}")
-            
-            # 检查维度是否匹配
-            if query_vector.shape[1] != index.d:
-                logger.error(f"维度不匹配: 查询向量维度 {query_vector.shape[1]}, 索引维度 {index.d}")
-                # 如果维度不匹配，尝试调整查询向量
-                if query_vector.shape[1] < index.d:
-                    # 如果查询向量维度小，用零填充
-                    padding = np.zeros((1, index.d - query_vector.shape[1]), dtype='float32')
-                    query_vector = np.concatenate([query_vector, padding], axis=1)
-                    logger.warning(f"查询向量维度过小，已用零填充到 {index.d} 维")
-                else:
-                    # 如果查询向量维度大，截断
-                    query_vector = query_vector[:, :index.d]
-                    logger.warning(f"查询向量维度过大，已截断到 {index.d} 维")
+        return db_vector_dir, index, id_mapping
 
-            # 搜索
-            distances, indices = index.search(query_vector, top_k)
+    def _search_loaded(self, db_vector_dir, index, id_mapping, query_vector, top_k, with_vectors):
+        """在已读取的索引中检索"""
+        # 确保query_vector是形状为 (1, D) 的连续float32数组，已满足时不复制
+        query_vector = np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1)
 
-            # 获取对应的分块ID
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx != -1:  # -1表示无效索引
-                    chunk_id = id_mapping.get(str(idx))
-                    if chunk_id:
-                        results.append({
-                            'chunk_id': chunk_id,
-                            'distance': float(distances[0][i])
-                        })
+        # 增量删除的分块只从ID映射中移除，向量仍在索引中，按已删除的比例多取候选，保证过滤后仍有 top_k 条
+        requested_k = top_k
+        if 0 < len(id_mapping) < index.ntotal:
+            top_k = min(index.ntotal, math.ceil(top_k * index.ntotal / len(id_mapping)))
 
+        # 降维知识库先在降维索引中召回更多候选，再按完整维度向量重新打分
+        reducer = DimensionReducer.load(db_vector_dir)
+        if reducer is not None:
+            _, indices = index.search(reducer.reduce(query_vector), top_k * self.RERANK_CANDIDATE_FACTOR)
+            live_indices = [idx for idx in indices[0] if id_mapping.get(str(idx))]
+            reranked = reducer.rerank(query_vector[0], live_indices, requested_k)
+            results = [
+                {'chunk_id': id_mapping[str(idx)], 'vector_id': int(idx), 'distance': distance}
+                for idx, distance in reranked
+                if id_mapping.get(str(idx))
+            ]
+            if with_vectors and results:
+                vectors = self._get_vectors(db_vector_dir, index, [result['vector_id'] for result in results], reducer)
+                for result, vector in zip(results, vectors):
+                    result['vector'] = vector
             return results
-        except Exception as e:
-            logger.error(f"搜索向量时出错: {str(e)}", exc_info=True)
-            return []
+        
+        # 调试信息：检查维度
+        logger.debug(f"索引维度: {index.d}, 查询向量维度: {query_vector.shape[1]}, 配置维度: {self.vector_dimension}")
+        
+        # 检查维度是否匹配
+        if query_vector.shape[1] != index.d:
+            logger.error(f"维度不匹配: 查询向量维度 {query_vector.shape[1]}, 索引维度 {index.d}")
+            # 如果维度不匹配，尝试调整查询向量
+            if query_vector.shape[1] < index.d:
+                # 如果查询向量维度小，用零填充
+                padding = np.zeros((1, index.d - query_vector.shape[1]), dtype='float32')
+                query_vector = np.concatenate([query_vector, padding], axis=1)
+                logger.warning(f"查询向量维度过小，已用零填充到 {index.d} 维")
+            else:
+                # 如果查询向量维度大，截断
+                query_vector = query_vector[:, :index.d]
+                logger.warning(f"查询向量维度过大，已截断到 {index.d} 维")
+
+        # 搜索
+        distances, indices = index.search(query_vector, top_k)
+
+        # 获取对应的分块ID
+        results = []
+        for i, idx in enumerate(indices[0]):
+            if idx != -1:  # -1表示无效索引
+                chunk_id = id_mapping.get(str(idx))
+                if chunk_id:
+                    results.append({
+                        'chunk_id': chunk_id,
+                        'vector_id': int(idx),
+                        'distance': float(distances[0][i])
+                    })
+        results = results[:requested_k]
+
+        if with_vectors and results:
+            vectors = self._get_vectors(db_vector_dir, index, [result['vector_id'] for result in results], reducer)
+            for result, vector in zip(results, vectors):
+                result['vector'] = vector
+
+        return results
+
+    def _get_vectors(self, db_vector_dir, index, vector_ids, reducer=False):
+        """获取指定向量ID的向量，降维知识库从完整维度向量文件读取，否则从索引中还原
+
+        reducer 未传入时按目录读取降维配置
+        """
+        if reducer is False:
+            reducer = DimensionReducer.load(db_vector_dir)
+        if reducer is not None:
+            return np.asarray(reducer.load_full_vectors()[vector_ids])
+
+        ivf_index = faiss.try_extract_index_ivf(index)
+        if ivf_index is not None:
+            ivf_index.make_direct_map()
+        return np.vstack([index.reconstruct(int(vector_id)) for vector_id in vector_ids])
+
+    def evaluate_reduction_recall(self, knowledge_db_id, sample_size=100, top_k=10):
+        """评估降维对召回率的影响
+
+        从已入库的向量中抽样作为查询，以完整维度精确检索的结果为基准，
+        分别计算仅降维检索和降维检索+完整维度重新打分的 recall@top_k
+        """
+        db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
+        index_path = os.path.join(db_vector_dir, "faiss.index")
+        reducer = DimensionReducer.load(db_vector_dir)
+        if reducer is None or not os.path.exists(index_path):
+            return None
+
+        full_vectors = reducer.load_full_vectors()
+        total = len(full_vectors)
+        result = {
+            'method': reducer.method,
+            'full_dimension': reducer.full_dimension,
+            'reduced_dimension': reducer.reduced_dimension,
+            'index_size_ratio': round(reducer.reduced_dimension / reducer.full_dimension, 4),
+            'vector_count': total,
+            'sample_size': 0,
+            'top_k': top_k
+        }
+        if total == 0:
+            return result
+
+        # 完整维度精确检索作为基准
+        exact_index = faiss.IndexFlatL2(reducer.full_dimension)
+        for start in range(0, total, 4096):
+            exact_index.add(np.ascontiguousarray(full_vectors[start:start + 4096]))
+
+        sample_ids = np.random.default_rng(0).choice(total, min(sample_size, total), replace=False)
+        queries = np.ascontiguousarray(full_vectors[np.sort(sample_ids)])
+        k = min(top_k, total)
+        _, exact_ids = exact_index.search(queries, k)
+
+        index = faiss.read_index(index_path)
+        _, candidate_ids = index.search(reducer.reduce(queries), k * self.RERANK_CANDIDATE_FACTOR)
+
+        first_pass_hits = 0
+        rerank_hits = 0
+        for i, query in enumerate(queries):
+            expected = set(exact_ids[i].tolist())
+            first_pass_hits += len(expected & set(candidate_ids[i][:k].tolist()))
+            reranked = reducer.rerank(query, candidate_ids[i], k)
+            rerank_hits += len(expected & {idx for idx, _ in reranked})
+
+        result.update({
+            'sample_size': len(queries),
+            'top_k': k,
+            'first_pass_recall': round(first_pass_hits / (len(queries) * k), 4),
+            'rerank_recall': round(rerank_hits / (len(queries) * k), 4)
+        })
+        return result
 
     def delete_chunks(self, knowledge_db_id, chunk_ids):
-        """从索引中删除指定的分块"""
+        """从向量和BM25索引中增量删除指定的分块，返回删除的向量数
+
+        应在数据库中删除分块记录之后调用，避免期间的索引重建把这些分块重新写入索引
+        """
         logger.info(f"开始删除知识库 {knowledge_db_id} 中的分块: {chunk_ids}")
-        
-        # FAISS不支持直接删除，我们通过重建整个索引来实现
-        return self.rebuild_index(knowledge_db_id)
+
+        db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
+        if not os.path.exists(os.path.join(db_vector_dir, "faiss.index")) or \
+                not os.path.exists(os.path.join(db_vector_dir, "id_mapping.json")):
+            return 0
+
+        index_writer = VectorIndexWriter(db_vector_dir)
+        try:
+            removed = index_writer.remove(chunk_ids)
+        except Exception:
+            index_writer.discard()
+            raise
+        index_writer.save()
+        return removed
+
+    def rebuild_lexical_index(self, knowledge_db_id):
+        """从数据库流式读取分块，重新生成知识库的BM25索引（不需要嵌入模型），返回索引的分块数
+
+        生成期间持有索引锁，由 build_lexical_index 命令调用，不在检索请求中执行
+        """
+        db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
+        with index_lock(db_vector_dir):
+            lexical_index = LexicalIndex.create(db_vector_dir)
+            try:
+                for chunk_ids, contents in self._iter_chunk_batches(knowledge_db_id, self.REBUILD_BATCH_SIZE):
+                    lexical_index.add(chunk_ids, contents)
+                chunk_count = lexical_index.count()
+                lexical_index.publish()
+            except Exception:
+                lexical_index.close()
+                raise
+        logger.info(f"已为知识库 {knowledge_db_id} 生成BM25索引: {chunk_count} 个分块")
+        return chunk_count
     
     def rebuild_index(self, knowledge_db_id):
-        """重建知识库的向量索引"""
+        """重建知识库的向量索引（通过共享的嵌入模型管理器，流式分批生成向量），重建期间持有索引锁"""
         logger.info(f"开始重建知识库 {knowledge_db_id} 的向量索引")
         
+        with index_lock(os.path.join(self.vector_dir, str(knowledge_db_id))):
+            return self._rebuild_index(knowledge_db_id)
+
+    def _rebuild_index(self, knowledge_db_id):
+        reducer = None
+        lexical_index = None
         try:
             # 导入必要的模块
             from open_ragbook_server.utils.db_utils import execute_query_with_params
-            from sentence_transformers import SentenceTransformer
+            from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
             
             # 1. 获取知识库信息
             kb_sql = "SELECT * FROM knowledge_database WHERE id = %s"
@@ -749,82 +1187,284 @@ class VectorStore:
             
             kb = kb_info[0]
             
-            # 2. 获取所有有效的文档分块
-            chunk_sql = """
-                SELECT dc.id, dc.content
+            # 2. 统计有效的文档分块数量
+            count_sql = """
+                SELECT COUNT(*) AS chunk_count
                 FROM knowledge_document_chunk dc
                 JOIN knowledge_document d ON dc.document_id = d.id
-                WHERE d.database_id = %s
-                ORDER BY dc.id
+                LEFT JOIN knowledge_document_chunk original
+                    ON dc.duplicate_of = original.id AND dc.vector_id IS NULL
+                WHERE d.database_id = %s AND original.id IS NULL
             """
-            chunks = execute_query_with_params(chunk_sql, [knowledge_db_id])
+            chunk_count = execute_query_with_params(count_sql, [knowledge_db_id])[0]['chunk_count']
             
             db_vector_dir = os.path.join(self.vector_dir, str(knowledge_db_id))
             os.makedirs(db_vector_dir, exist_ok=True)
             index_path = os.path.join(db_vector_dir, "faiss.index")
             mapping_path = os.path.join(db_vector_dir, "id_mapping.json")
             
-            if not chunks:
+            full_dimension = kb['vector_dimension'] or self.vector_dimension
+            # 降维文件先写入临时文件，索引写入成功后再替换，重建失败时原有的完整向量和PCA矩阵保持不变
+            if kb.get('reduced_dimension'):
+                reducer = DimensionReducer.staging(db_vector_dir, full_dimension, kb['reduced_dimension'],
+                                                   kb.get('dimension_reduction') or 'matryoshka')
+                reducer.save_config()
+            
+            if not chunk_count:
                 logger.info(f"知识库 {knowledge_db_id} 没有文档分块，创建空索引")
-                # 创建空索引
-                index = faiss.IndexFlatL2(self.vector_dimension)
-                faiss.write_index(index, index_path)
-                
-                # 创建空映射
-                with open(mapping_path, 'w') as f:
-                    json.dump({}, f)
+                # 创建空索引和空映射
+                index = faiss.IndexFlatL2(reducer.reduced_dimension if reducer else full_dimension)
+                self._replace_index_files(index_path, mapping_path, index, {}, reducer)
+                LexicalIndex.create(db_vector_dir).publish()
                 
                 logger.info(f"已为知识库 {knowledge_db_id} 创建空索引")
                 return True
             
-            # 3. 获取嵌入模型
-            model_sql = "SELECT * FROM embedding_model WHERE id = %s"
-            model_info = execute_query_with_params(model_sql, [kb['embedding_model_id']])
-            if not model_info:
-                logger.error(f"知识库 {knowledge_db_id} 的嵌入模型不存在")
-                return False
-            
-            model = model_info[0]
-            model_path = model['local_path']
-            
-            if not os.path.exists(model_path):
-                logger.error(f"嵌入模型文件不存在: {model_path}")
+            # 3. 通过模型管理器获取嵌入模型（复用已加载的模型，不再单独加载一份）
+            embedding_model = get_knowledge_embedding_model(kb['embedding_model_id'])
+            if embedding_model is None:
+                logger.error(f"知识库 {knowledge_db_id} 的嵌入模型不存在或未加载")
+                if reducer is not None:
+                    reducer.discard()
                 return False
             
-            # 4. 加载嵌入模型并生成向量
-            embedding_model = SentenceTransformer(model_path)
-            
-            chunk_ids = [chunk['id'] for chunk in chunks]
-            contents = [chunk['content'] for chunk in chunks]
-            
-            # 批量生成向量
-            vectors = embedding_model.encode(contents, show_progress_bar=False)
-            logger.info(f"为知识库 {knowledge_db_id} 生成了 {len(vectors)} 个向量")
-            
-            # 5. 创建新的FAISS索引
-            if self.index_type == "Flat":
-                index = faiss.IndexFlatL2(self.vector_dimension)
+            # 4. 创建新的FAISS索引
+            if reducer is not None:
+                reducer.full_dimension = embedding_model.get_dimension()
+                reducer.save_config()
+                index = self._new_index(reducer.reduced_dimension, kb['index_type'])
             else:
-                # 默认使用Flat
-                index = faiss.IndexFlatL2(self.vector_dimension)
-            
-            # 添加向量
-            vectors_array = np.array(vectors).astype('float32')
-            index.add(vectors_array)
+                index = self._new_index(embedding_model.get_dimension(), kb['index_type'])
             
-            # 6. 创建新的ID映射
+            # 5. 流式读取分块，分批生成向量并添加到索引，同时重新生成BM25索引
             id_mapping = {}
-            for i, chunk_id in enumerate(chunk_ids):
-                id_mapping[str(i)] = chunk_id
+            lexical_index = LexicalIndex.create(db_vector_dir)
+            for chunk_ids, contents in self._iter_chunk_batches(knowledge_db_id, self.REBUILD_BATCH_SIZE):
+                lexical_index.add(chunk_ids, contents)
+                vectors = embedding_model.embed_texts(contents)
+                if len(vectors) != len(chunk_ids):
+                    raise ValueError(f"生成的向量数量与分块数量不匹配: {len(vectors)} != {len(chunk_ids)}")
+                
+                start_id = len(id_mapping)
+                vectors_array = np.ascontiguousarray(vectors, dtype=np.float32)
+                if reducer is None:
+                    index.add(vectors_array)
+                else:
+                    # 先保存完整维度向量，全部读取完成后再统一生成降维索引
+                    reducer.append_full_vectors(vectors_array)
+                for offset, chunk_id in enumerate(chunk_ids):
+                    id_mapping[str(start_id + offset)] = chunk_id
+                
+                logger.debug(f"知识库 {knowledge_db_id} 重建进度: {len(id_mapping)}/{chunk_count}")
             
-            # 7. 保存索引和映射
-            faiss.write_index(index, index_path)
-            with open(mapping_path, 'w') as f:
-                json.dump(id_mapping, f)
+            if reducer is not None:
+                # PCA在全部向量上训练，向量不足时先使用截断，后续入库达到数量后再训练
+                if reducer.needs_training():
+                    reducer.train()
+                reducer.rebuild_reduced_index(index)
+            
+            # 6. 保存索引和映射
+            self._replace_index_files(index_path, mapping_path, index, id_mapping, reducer)
+            lexical_index.publish()
+            lexical_index = None
             
             logger.info(f"成功重建知识库 {knowledge_db_id} 的索引: {index.ntotal} 个向量, {len(id_mapping)} 个映射")
             return True
             
         except Exception as e:
             logger.error(f"重建知识库 {knowledge_db_id} 索引失败: {str(e)}", exc_info=True)
+            if reducer is not None:
+                reducer.discard()
+            if lexical_index is not None:
+                lexical_index.close()
             return False
+
+    def _replace_index_files(self, index_path, mapping_path, index, id_mapping, reducer):
+        """索引和映射先写入临时文件，全部写入成功后与降维文件一起替换正式文件"""
+        staging_suffix = DimensionReducer.STAGING_SUFFIX
+        faiss.write_index(index, index_path + staging_suffix)
+        with open(mapping_path + staging_suffix, 'w') as f:
+            json.dump(id_mapping, f)
+        if reducer is not None:
+            reducer.commit()
+        os.replace(index_path + staging_suffix, index_path)
+        os.replace(mapping_path + staging_suffix, mapping_path)
+
+    def _new_index(self, dimension, index_type):
+        """创建指定类型的空FAISS索引"""
+        if index_type == "Flat":
+            return faiss.IndexFlatL2(dimension)
+        elif index_type == "IVF":
+            # 为IVF创建量化器
+            quantizer = faiss.IndexFlatL2(dimension)
+            # 创建IVF索引，nlist是聚类的数量
+            index = faiss.IndexIVFFlat(quantizer, dimension, 100)
+            # IVF索引需要训练
+            # 这里需要一些训练数据，通常实际应用中需要真实数据
+            # 如果没有训练数据，这里使用随机数据
+            random_data = np.random.random((100, dimension)).astype('float32')
+            index.train(random_data)
+            return index
+        else:
+            # 默认使用Flat
+            logger.warning(f"不支持的索引类型 {index_type}，使用默认Flat")
+            return faiss.IndexFlatL2(dimension)
+
+    def _iter_chunk_batches(self, knowledge_db_id, batch_size):
+        """使用服务端游标流式读取知识库的文档分块，每次返回一批 (分块ID列表, 内容列表)
+
+        以 link 策略入库的重复分块在原始分块存在时不生成向量，跳过
+        """
+        from django.db import connection
+        from pymysql.cursors import SSCursor
+        
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(SSCursor)
+        try:
+            cursor.execute("""
+                SELECT dc.id, dc.content
+                FROM knowledge_document_chunk dc
+                JOIN knowledge_document d ON dc.document_id = d.id
+                LEFT JOIN knowledge_document_chunk original
+                    ON dc.duplicate_of = original.id AND dc.vector_id IS NULL
+                WHERE d.database_id = %s AND original.id IS NULL
+                ORDER BY dc.id
+            """, [knowledge_db_id])
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [row[0] for row in rows], [row[1] for row in rows]
+        finally:
+            cursor.close()
+
+
+class VectorIndexWriter:
+    """知识库索引的追加写入器，索引、ID映射和BM25索引只在 save() 时写回磁盘
+
+    创建时获取知识库的索引锁并在锁内读取磁盘上的最新状态，save() 或 discard() 后释放锁，之后不能再使用
+    """
+
+    def __init__(self, db_vector_dir):
+        self.index_path = os.path.join(db_vector_dir, "faiss.index")
+        self.mapping_path = os.path.join(db_vector_dir, "id_mapping.json")
+        self.lexical_index = None
+        self.lock = index_lock(db_vector_dir)
+        self.lock.acquire()
+        try:
+            # 读取索引
+            self.index = faiss.read_index(self.index_path)
+
+            # 读取ID映射
+            with open(self.mapping_path, 'r') as f:
+                self.id_mapping = json.load(f)
+
+            # 早于BM25索引创建的知识库没有BM25索引，只维护向量索引，由 build_lexical_index 命令从数据库生成
+            self.lexical_index = LexicalIndex.open(db_vector_dir)
+            self.reducer = DimensionReducer.load(db_vector_dir)
+            self.saved_full_vector_count = self.reducer.count_full_vectors() if self.reducer else 0
+            self.trained_pca = False
+        except Exception:
+            self._release()
+            raise
+
+    def add(self, chunk_ids, vectors, texts=None):
+        """追加一批向量，返回分配的向量ID列表
+
+        texts 为分块内容，用于更新BM25索引，不传时从数据库读取
+        """
+        if len(chunk_ids) != len(vectors):
+            raise ValueError(f"分块ID和向量数量不匹配: {len(chunk_ids)} != {len(vectors)}")
+        if texts is None:
+            texts = self._load_chunk_texts(chunk_ids)
+
+        vectors_array = np.ascontiguousarray(vectors, dtype=np.float32)
+        vector_ids = list(range(self.index.ntotal, self.index.ntotal + len(vectors_array)))
+
+        if self.reducer is None:
+            self.index.add(vectors_array)
+        else:
+            # 保存完整维度向量用于重新打分，索引中只添加降维后的向量
+            self.reducer.append_full_vectors(vectors_array)
+            if self.reducer.needs_training():
+                # PCA首次训练后用全部完整向量重新生成索引
+                self.reducer.train()
+                self.reducer.rebuild_reduced_index(self.index)
+                self.trained_pca = True
+            else:
+                self.index.add(self.reducer.reduce(vectors_array))
+
+        # 更新ID映射
+        for vector_id, chunk_id in zip(vector_ids, chunk_ids):
+            self.id_mapping[str(vector_id)] = chunk_id
+
+        if self.lexical_index is not None:
+            self.lexical_index.add(chunk_ids, texts)
+
+        return vector_ids
+
+    def remove(self, chunk_ids):
+        """增量删除分块，返回删除的向量数
+
+        FAISS索引不支持按位置删除后保持其余向量ID不变，这里只从ID映射和BM25索引中移除，
+        向量保留在索引中由检索时过滤，下次重建索引时清理
+        """
+        chunk_id_set = set(chunk_ids)
+        removed = [vector_id for vector_id, chunk_id in self.id_mapping.items() if chunk_id in chunk_id_set]
+        for vector_id in removed:
+            del self.id_mapping[vector_id]
+        if self.lexical_index is not None:
+            self.lexical_index.remove(list(chunk_ids))
+        return len(removed)
+
+    def save(self):
+        """保存更新后的索引和映射，并释放索引锁"""
+        try:
+            if self.index.ntotal and len(self.id_mapping) < self.index.ntotal * 0.7:
+                logger.info(f"索引 {self.index_path} 中已删除的向量超过30% "
+                            f"({self.index.ntotal - len(self.id_mapping)}/{self.index.ntotal})，建议重建索引")
+            faiss.write_index(self.index, self.index_path)
+            with open(self.mapping_path, 'w') as f:
+                json.dump(self.id_mapping, f)
+            if self.lexical_index is not None:
+                self.lexical_index.commit()
+        except Exception:
+            # 写入失败时恢复降维知识库的完整向量文件，由 discard() 释放锁
+            self.discard()
+            raise
+        self._release()
+
+    def _load_chunk_texts(self, chunk_ids):
+        """按分块ID读取分块内容，顺序与 chunk_ids 一致"""
+        from open_ragbook_server.utils.db_utils import execute_query_with_params
+
+        if not chunk_ids:
+            return []
+        placeholders = ','.join(['%s'] * len(chunk_ids))
+        rows = execute_query_with_params(
+            f"SELECT id, content FROM knowledge_document_chunk WHERE id IN ({placeholders})", list(chunk_ids)
+        )
+        contents = {row['id']: row['content'] for row in rows}
+        return [contents.get(chunk_id, '') for chunk_id in chunk_ids]
+
+    def discard(self):
+        """放弃未保存的追加，恢复降维知识库的完整向量文件，使其与磁盘上的索引保持一致，并释放索引锁"""
+        if not self.lock.is_locked:
+            return
+        try:
+            if self.lexical_index is not None:
+                self.lexical_index.rollback()
+            if self.reducer is not None:
+                self.reducer.truncate_full_vectors(self.saved_full_vector_count)
+                if self.trained_pca and os.path.exists(self.reducer.pca_path):
+                    os.remove(self.reducer.pca_path)
+        finally:
+            self._release()
+
+    def _release(self):
+        if self.lexical_index is not None:
+            self.lexical_index.close()
+            self.lexical_index = None
+        if self.lock.is_locked:
+            self.lock.release()
@@ -0,0 +1,234 @@
+import base64
+import http.client
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+
+logger = logging.getLogger('knowledge_mgt')
+
+
+def encode_vectors(vectors):
+    """将向量矩阵编码为base64字符串（float32小端序），避免JSON浮点列表的开销"""
+    array = np.ascontiguousarray(vectors, dtype='<f4')
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def decode_vectors(data, count, dimension):
+    """将base64字符串解码为向量矩阵"""
+    array = np.frombuffer(base64.b64decode(data), dtype='<f4')
+    return array.reshape(count, dimension).astype(np.float32, copy=False)
+
+
+class EmbeddingServiceHandler(BaseHTTPRequestHandler):
+    """嵌入服务请求处理器
+
+    GET  /health  返回已加载模型信息
+    POST /load    {"model_id": 1} 加载模型并返回维度和设备
+    POST /embed   {"model_id": 1, "texts": [...]} 批量生成向量
+    """
+
+    # 使用HTTP/1.1以支持客户端复用连接
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self._send_json({'error': '接口不存在'}, 404)
+
+        from knowledge_mgt.utils.embeddings import get_local_model_pool_info
+        return self._send_json({'status': 'ok', 'model_pool': get_local_model_pool_info()})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+        except (ValueError, UnicodeDecodeError) as e:
+            return self._send_json({'error': f'请求解析失败: {str(e)}'}, 400)
+
+        try:
+            if self.path == '/load':
+                return self._handle_load(payload)
+            elif self.path == '/embed':
+                return self._handle_embed(payload)
+            return self._send_json({'error': '接口不存在'}, 404)
+        except Exception as e:
+            logger.error(f"嵌入服务处理请求失败: {str(e)}", exc_info=True)
+            return self._send_json({'error': str(e)}, 500)
+
+    def _get_model(self, model_id):
+        from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+        if not model_id:
+            raise ValueError('缺少必要参数: model_id')
+        embedding_model = get_knowledge_embedding_model(model_id)
+        if embedding_model is None:
+            raise ValueError(f'嵌入模型不存在或已禁用: {model_id}')
+        return embedding_model
+
+    def _handle_load(self, payload):
+        embedding_model = self._get_model(payload.get('model_id'))
+        return self._send_json({
+            'model_name': embedding_model.model_name,
+            'dimension': embedding_model.get_dimension(),
+            'device': embedding_model.get_device(),
+            'precision': getattr(embedding_model, 'precision', 'fp32'),
+            'precision_check': getattr(embedding_model, 'precision_check', None),
+            'load_time': round(embedding_model.load_time, 2),
+            'memory_mb': round(embedding_model.memory_bytes / (1024 ** 2), 1)
+        })
+
+    def _handle_embed(self, payload):
+        embedding_model = self._get_model(payload.get('model_id'))
+        texts = payload.get('texts') or []
+        dimension = embedding_model.get_dimension()
+
+        vectors, stats = embedding_model.embed_texts_with_stats(texts)
+        vectors = vectors.reshape(-1, dimension)
+        return self._send_json({
+            'count': len(vectors),
+            'dimension': dimension,
+            'vectors': encode_vectors(vectors),
+            'stats': stats
+        })
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket连接没有客户端地址
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(f"嵌入服务请求: {self.address_string()} {format % args}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """基于Unix socket的多线程HTTP服务"""
+
+    daemon_threads = True
+
+
+def create_embedding_server(host='127.0.0.1', port=8765, socket_path=None):
+    """创建嵌入服务，指定socket_path时监听Unix socket，否则监听TCP端口"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, EmbeddingServiceHandler)
+    return ThreadingHTTPServer((host, port), EmbeddingServiceHandler)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过Unix socket通信的HTTP连接"""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EmbeddingServiceError(Exception):
+    """嵌入服务返回错误"""
+
+
+class EmbeddingServiceClient:
+    """嵌入服务客户端，每个线程复用一条长连接
+
+    service_url 支持 http://host:port 和 unix:///path/to/socket 两种形式
+    """
+
+    def __init__(self, service_url, timeout=60):
+        self.service_url = service_url
+        self.timeout = timeout
+        self._local = threading.local()
+
+        parsed = urlparse(service_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.socket_path = parsed.path if parsed.scheme == 'unix' else None
+
+    def _create_connection(self):
+        if self.socket_path:
+            return UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._create_connection()
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+
+        # 复用的连接可能已被服务端关闭，失败时重建连接重试一次
+        for attempt in range(2):
+            conn = self._get_connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = json.loads(response.read().decode('utf-8'))
+                break
+            except (http.client.HTTPException, ConnectionError, socket.timeout, OSError):
+                self._reset_connection()
+                if attempt == 1:
+                    raise
+
+        if response.status != 200:
+            raise EmbeddingServiceError(data.get('error') or f'嵌入服务返回状态码 {response.status}')
+        return data
+
+    def health(self):
+        """检查服务状态"""
+        return self._request('GET', '/health')
+
+    def load_model(self, model_id):
+        """请求服务加载模型，返回模型维度和设备等信息"""
+        return self._request('POST', '/load', {'model_id': model_id})
+
+    def embed(self, model_id, texts):
+        """批量生成向量，返回 (N, D) 的float32矩阵"""
+        return self.embed_with_stats(model_id, texts)[0]
+
+    def embed_with_stats(self, model_id, texts):
+        """批量生成向量，同时返回超长分块的切分统计"""
+        data = self._request('POST', '/embed', {'model_id': model_id, 'texts': texts})
+        return decode_vectors(data['vectors'], data['count'], data['dimension']), data.get('stats')
+
+
+# 按服务地址缓存的客户端
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_embedding_service_client(service_url, timeout=60):
+    """获取嵌入服务客户端（同一地址共享一个实例）"""
+    with _clients_lock:
+        client = _clients.get(service_url)
+        if client is None:
+            client = EmbeddingServiceClient(service_url, timeout=timeout)
+            _clients[service_url] = client
+        return client
@@ -0,0 +1,236 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 工作进程内的模型实例（每个工作进程各自加载一份）
+_worker_model = None
+
+
+def _init_worker(model_config, worker_counter, threads_per_worker):
+    """工作进程初始化：绑定CPU核心、设置torch线程数并加载模型"""
+    global _worker_model
+
+    from knowledge_mgt.utils.embeddings import EmbeddingModel, configure_torch_threads
+
+    # 为每个工作进程分配一段连续的CPU核心
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+
+    if hasattr(os, 'sched_setaffinity'):
+        available_cores = sorted(os.sched_getaffinity(0))
+        start = (worker_index * threads_per_worker) % len(available_cores)
+        cores = available_cores[start:start + threads_per_worker] or available_cores
+        os.sched_setaffinity(0, cores)
+
+    configure_torch_threads(threads_per_worker, 1)
+
+    model_name = model_config.get('model_name') or model_config.get('local_path', 'all-MiniLM-L6-v2')
+    _worker_model = EmbeddingModel(model_name=model_name, model_config=model_config)
+    _worker_model.load_model()
+
+
+def _embed_batch(texts, shm_name, offset, total, dimension):
+    """在工作进程中生成一批向量，直接写入共享内存中的结果矩阵，返回超长分块切分统计"""
+    vectors, stats = _worker_model.embed_texts_with_stats(texts)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        result = np.ndarray((total, dimension), dtype=np.float32, buffer=shm.buf)
+        result[offset:offset + len(texts)] = vectors
+    finally:
+        shm.close()
+    return stats
+
+
+class EmbeddingWorkerPool:
+    """嵌入工作进程池，用于文档入库时在独立进程中生成向量，避免占用Web进程的GIL和线程
+
+    进程池与模型池中的模型同生命周期：模型被卸载或淘汰时进程池随之关闭，正在使用时推迟到使用结束后关闭
+    """
+
+    def __init__(self, model_id, model_config, num_workers, threads_per_worker):
+        self.model_id = model_id
+        self.model_config = model_config
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.active_calls = 0
+        self.shutdown_pending = False
+        self._usage_lock = threading.Lock()
+
+        # 使用spawn方式创建进程，避免fork继承Web进程中的torch线程池和数据库连接
+        mp_context = multiprocessing.get_context('spawn')
+        worker_counter = mp_context.Value('i', 0)
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(model_config, worker_counter, threads_per_worker)
+        )
+        logger.info(f"已启动嵌入工作进程池: 模型 {model_id}, 进程数 {num_workers}, 每进程线程数 {threads_per_worker}")
+
+    def embed_texts(self, texts, dimension):
+        """将文本按批次分发给工作进程，结果通过共享内存汇总，返回 (向量, 切分统计)"""
+        from knowledge_mgt.utils.embeddings import merge_embedding_stats
+
+        if not texts:
+            return np.zeros((0, dimension), dtype=np.float32), None
+
+        total = len(texts)
+        batch_size = self.model_config.get('batch_size') or 32
+        shm = shared_memory.SharedMemory(create=True, size=total * dimension * np.dtype(np.float32).itemsize)
+        try:
+            futures = [
+                self.executor.submit(_embed_batch, texts[offset:offset + batch_size], shm.name, offset, total, dimension)
+                for offset in range(0, total, batch_size)
+            ]
+            wait(futures)
+            stats = None
+            for future in futures:
+                # 任一批次失败时抛出异常
+                stats = merge_embedding_stats(stats, future.result())
+
+            result = np.ndarray((total, dimension), dtype=np.float32, buffer=shm.buf)
+            # 共享内存随后释放，需要复制一份
+            return result.copy(), stats
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def acquire(self):
+        """登记一次使用，使用期间进程池不会被关闭"""
+        with self._usage_lock:
+            self.active_calls += 1
+
+    def release(self):
+        """结束一次使用，进程池已被移出且没有其他使用时关闭"""
+        with self._usage_lock:
+            self.active_calls -= 1
+            shutdown = not self.active_calls and self.shutdown_pending
+        if shutdown:
+            self.shutdown()
+
+    def shutdown_when_idle(self):
+        """空闲时立即关闭，使用中时推迟到最后一次使用结束"""
+        with self._usage_lock:
+            if self.active_calls:
+                self.shutdown_pending = True
+                return
+        self.shutdown()
+
+    def shutdown(self):
+        """关闭工作进程池"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        logger.info(f"已关闭嵌入工作进程池: 模型 {self.model_id}")
+
+
+# 按模型ID管理的工作进程池
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_settings():
+    """获取工作进程配置：(进程数, 每进程线程数)，进程数为0表示未启用"""
+    num_workers = getattr(settings, 'EMBEDDING_WORKER_PROCESSES', 0)
+    if num_workers <= 0:
+        return 0, 0
+
+    threads_per_worker = getattr(settings, 'EMBEDDING_WORKER_THREADS', 0)
+    if threads_per_worker <= 0:
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        threads_per_worker = max(1, (cpu_count or 1) // num_workers)
+    return num_workers, threads_per_worker
+
+
+def get_embedding_worker_pool(model_id, model_config):
+    """获取指定模型的工作进程池并登记使用，用完后调用 pool.release()；未启用时返回None"""
+    from knowledge_mgt.utils.embeddings import local_embedding_manager
+
+    num_workers, threads_per_worker = get_worker_settings()
+    if num_workers <= 0:
+        return None
+
+    with _worker_pools_lock:
+        pool = _worker_pools.get(model_id)
+        if pool is None:
+            pool = EmbeddingWorkerPool(model_id, model_config, num_workers, threads_per_worker)
+            _worker_pools[model_id] = pool
+        pool.acquire()
+    # 模型在此之前已被卸载时不会再有卸载事件来关闭进程池，这里移出进程池，本次使用结束后关闭
+    # （不在持有进程池锁时访问模型池，避免与模型池淘汰时的加锁顺序相反）
+    if local_embedding_manager.get_model(model_id) is None:
+        release_embedding_worker_pool(model_id)
+    return pool
+
+
+def release_embedding_worker_pool(model_id):
+    """模型从模型池中卸载时调用，关闭该模型的工作进程池（正在使用时推迟到使用结束）"""
+    with _worker_pools_lock:
+        pool = _worker_pools.pop(model_id, None)
+    if pool is not None:
+        pool.shutdown_when_idle()
+
+
+def embed_texts_for_ingestion(model_id, embedding_model, texts, cached_vectors=None):
+    """文档入库时生成向量：启用工作进程池时在独立进程中计算，否则使用进程内模型
+
+    cached_vectors 为与 texts 等长的已有向量列表（如嵌入语义分块时算出的句向量），只为其中为None的文本生成向量；
+    返回 (向量, 超长分块切分统计)
+    """
+    if cached_vectors is not None and any(vector is not None for vector in cached_vectors):
+        missing = [i for i, vector in enumerate(cached_vectors) if vector is None]
+        stats = None
+        vectors = np.zeros((len(texts), embedding_model.get_dimension()), dtype=np.float32)
+        if missing:
+            missing_vectors, stats = embed_texts_for_ingestion(model_id, embedding_model, [texts[i] for i in missing])
+            vectors[missing] = missing_vectors
+            if stats:
+                from knowledge_mgt.utils.embeddings import PER_TEXT_STATS_KEYS
+                # 逐文本明细与 texts 对齐，复用向量的文本窗口数和token数记为0
+                for key in PER_TEXT_STATS_KEYS:
+                    if key in stats:
+                        values = [0] * len(texts)
+                        for i, value in zip(missing, stats[key]):
+                            values[i] = value
+                        stats[key] = values
+        for i, vector in enumerate(cached_vectors):
+            if vector is not None:
+                vectors[i] = vector
+        logger.debug(f"复用 {len(texts) - len(missing)} 个分块时已生成的向量，新生成 {len(missing)} 个")
+        return vectors, stats
+
+    # 在线模型和客户端模式下向量不在本机计算，不需要本地工作进程
+    is_local = embedding_model.model_config.get('api_type', 'local') == 'local'
+    if not model_id or not is_local or embedding_model.service_client is not None:
+        return embedding_model.embed_texts_with_stats(texts)
+
+    pool = get_embedding_worker_pool(model_id, embedding_model.model_config)
+    if pool is None:
+        return embedding_model.embed_texts_with_stats(texts)
+
+    # 与进程内实现保持一致，过滤空文本
+    filtered_texts = [text for text in texts if text and text.strip()]
+    try:
+        return pool.embed_texts(filtered_texts, embedding_model.get_dimension())
+    finally:
+        pool.release()
+
+
+def shutdown_embedding_worker_pools():
+    """关闭所有工作进程池"""
+    with _worker_pools_lock:
+        for pool in _worker_pools.values():
+            pool.shutdown()
+        _worker_pools.clear()
+
+
+atexit.register(shutdown_embedding_worker_pools)
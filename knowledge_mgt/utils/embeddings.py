@@ -1,27 +1,169 @@
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import numpy as np
 import torch
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import Normalize
+from django.conf import settings
 from django.db import connection
 
 logger = logging.getLogger('knowledge_mgt')
 
-class EmbeddingModel:
-    """文本嵌入模型"""
+# 预热编码使用的样例文本，覆盖中英文和不同长度
+WARMUP_TEXTS = [
+    "预热",
+    "This is a warm-up sentence for the embedding model.",
+    "知识库检索需要先将文档切分为分块，再为每个分块生成向量并写入索引，查询时使用同一个模型编码问题。" * 4,
+]
+
+# 支持的本地模型推理精度
+PRECISION_DTYPES = {
+    'fp32': torch.float32,
+    'bf16': torch.bfloat16,
+    'fp16': torch.float16,
+}
+
+# 切分统计中逐文本的窗口数和token数，用于把跨文档批量编码的统计拆分到各文档，不写入文档统计
+PER_TEXT_STATS_KEYS = ('text_window_counts', 'text_token_counts')
+
+# 进程内的torch线程配置，只设置一次（跨操作并行线程数在torch开始并行计算后不能再修改）
+_torch_thread_settings = None
+_torch_thread_lock = threading.Lock()
+
+def get_cpu_cores():
+    """获取当前进程可用的CPU核心数（考虑容器和CPU亲和性限制）"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def configure_torch_threads(intra_op_threads=None, interop_threads=None):
+    """配置本进程的torch线程数，未指定时读取配置项，配置为0时按CPU核心数和Web进程数自动计算"""
+    global _torch_thread_settings
     
-    def __init__(self, model_name="all-MiniLM-L6-v2", model_config=None):
+    with _torch_thread_lock:
+        if _torch_thread_settings is not None:
+            return _torch_thread_settings
+        
+        cpu_cores = get_cpu_cores()
+        web_workers = max(1, getattr(settings, 'EMBEDDING_WEB_WORKERS', 1))
+        intra_op_threads = intra_op_threads or getattr(settings, 'EMBEDDING_TORCH_THREADS', 0)
+        interop_threads = interop_threads or getattr(settings, 'EMBEDDING_TORCH_INTEROP_THREADS', 0)
+        source = 'configured' if intra_op_threads else 'auto'
+        
+        if not intra_op_threads:
+            intra_op_threads = max(1, cpu_cores // web_workers)
+        if not interop_threads:
+            # 句向量编码基本没有可并行的独立算子，跨操作并行线程只会额外抢占CPU
+            interop_threads = 1
+        
+        torch.set_num_threads(intra_op_threads)
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"设置torch跨操作并行线程数失败（torch已开始并行计算）: {str(e)}")
+        
+        _torch_thread_settings = {
+            'source': source,
+            'cpu_cores': cpu_cores,
+            'web_workers': web_workers,
+            'intra_op_threads': intra_op_threads,
+            'interop_threads': interop_threads
+        }
+        logger.info(f"torch线程配置: 计算线程 {intra_op_threads}, 跨操作并行线程 {interop_threads} "
+                    f"（{source}，CPU核心 {cpu_cores}，Web进程 {web_workers}）")
+        return _torch_thread_settings
+
+def get_torch_thread_settings():
+    """获取本进程生效的torch线程配置"""
+    configured = _torch_thread_settings or {}
+    return {
+        'source': configured.get('source', 'default'),
+        'cpu_cores': configured.get('cpu_cores', get_cpu_cores()),
+        'web_workers': configured.get('web_workers', getattr(settings, 'EMBEDDING_WEB_WORKERS', 1)),
+        'intra_op_threads': torch.get_num_threads(),
+        'interop_threads': torch.get_num_interop_threads()
+    }
+
+class PooledModel:
+    """模型池中的模型：记录正在进行的编码调用数，模型池只淘汰空闲的模型，卸载使用中的模型时推迟到调用结束"""
+
+    def __init__(self):
+        self.active_calls = 0
+        self.unload_pending = False
+        self._usage_lock = threading.Lock()
+
+    @contextmanager
+    def in_use(self):
+        """编码调用期间登记为使用中，登记后模型池不会卸载模型，调用方应在登记后再检查模型是否已加载"""
+        with self._usage_lock:
+            self.active_calls += 1
+        try:
+            yield
+        finally:
+            with self._usage_lock:
+                self.active_calls -= 1
+                if not self.active_calls and self.unload_pending:
+                    self.unload_pending = False
+                    self.unload_model()
+
+    def is_idle(self):
+        return not self.active_calls
+
+    def _check_loaded(self):
+        """在 in_use() 内调用：模型在登记使用之前已被卸载或淘汰时抛出异常"""
+        if not self.is_loaded:
+            raise RuntimeError(f"模型 {self.model_name} 尚未加载或已被卸载，请先调用 load_model()")
+
+    def unload_when_idle(self):
+        """空闲时立即卸载并返回True，使用中时推迟到最后一个调用结束并返回False"""
+        with self._usage_lock:
+            if self.active_calls:
+                self.unload_pending = True
+                return False
+            self.unload_model()
+            return True
+
+
+class EmbeddingModel(PooledModel):
+    """文本嵌入模型
+
+    指定 service_url 时以客户端模式运行：模型由独立的嵌入服务进程加载，本实例只负责转发请求
+    """
+    
+    def __init__(self, model_name="all-MiniLM-L6-v2", model_config=None, service_url=None):
+        super().__init__()
         self.model_name = model_name
         self.model_config = model_config or {}
         self.model = None
         self.is_loaded = False
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+        self.memory_bytes = 0
+        # 实际生效的推理精度和低精度校验结果
+        self.precision = 'fp32'
+        self.precision_check = None
+        self.service_url = service_url
+        self.service_client = None
+        self.remote_info = {}
         
     def load_model(self):
         """加载模型到内存"""
         if self.is_loaded:
             logger.info(f"模型 {self.model_name} 已经加载")
             return
+        
+        if self.service_url:
+            return self._load_remote_model()
             
         try:
+            # 加载前配置torch线程数，避免多个Web进程抢占CPU
+            configure_torch_threads()
+            
             # 检测是否有可用的GPU
             if torch.cuda.is_available():
                 device = "cuda"
@@ -44,132 +186,471 @@ class EmbeddingModel:
                 logger.info(f"使用模型名称: {model_path}")
             
             # 使用指定设备加载模型，不自动下载
+            start_time = time.time()
             self.model = SentenceTransformer(model_path, device=device, cache_folder=None)
+            self.load_time = time.time() - start_time
+            if getattr(settings, 'EMBEDDING_WARMUP_ON_LOAD', True):
+                self._warm_up()
+            requested_precision = self.model_config.get('inference_precision') or 'fp32'
+            if requested_precision != 'fp32':
+                self._apply_precision(requested_precision, device)
+            self.memory_bytes = self._estimate_memory_bytes()
             self.is_loaded = True
-            logger.info(f"成功加载嵌入模型: {model_path} 到设备: {device}")
+            logger.info(f"成功加载嵌入模型: {model_path} 到设备: {device}，"
+                        f"精度 {self.precision}，耗时 {self.load_time:.2f}s，预热 {self.warmup_time:.2f}s，"
+                        f"占用内存约 {self.memory_bytes / (1024 ** 2):.1f}MB")
         except Exception as e:
             logger.error(f"加载嵌入模型失败: {str(e)}", exc_info=True)
             raise
     
+    def _warm_up(self):
+        """执行一次预热编码，完成算子初始化和内存分配"""
+        start_time = time.time()
+        try:
+            self.model.encode(WARMUP_TEXTS, batch_size=len(WARMUP_TEXTS))
+        except Exception as e:
+            logger.warning(f"嵌入模型预热失败: {str(e)}")
+        self.warmup_time = time.time() - start_time
+    
+    def _apply_precision(self, precision, device):
+        """切换到低精度推理，并与fp32输出对比校验，相似度不足时回退到fp32"""
+        if precision not in PRECISION_DTYPES:
+            logger.warning(f"不支持的推理精度 {precision}，使用fp32")
+            return
+        if precision == 'fp16' and device == 'cpu':
+            logger.warning("CPU不支持fp16推理，使用fp32")
+            return
+        
+        def timed_encode():
+            # 取多次运行的最短耗时，减少抖动
+            best_time = None
+            for _ in range(3):
+                start_time = time.time()
+                vectors = np.asarray(self.model.encode(WARMUP_TEXTS, batch_size=len(WARMUP_TEXTS)), dtype=np.float32)
+                elapsed = time.time() - start_time
+                best_time = elapsed if best_time is None else min(best_time, elapsed)
+            return vectors, best_time
+        
+        reference, fp32_time = timed_encode()
+        self.model.to(PRECISION_DTYPES[precision])
+        vectors, precision_time = timed_encode()
+        
+        norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+        min_cosine = float(np.min((reference * vectors).sum(axis=1) / np.maximum(norms, 1e-12)))
+        threshold = getattr(settings, 'EMBEDDING_PRECISION_PARITY_THRESHOLD', 0.99)
+        applied = min_cosine >= threshold
+        
+        if applied:
+            self.precision = precision
+        else:
+            self.model.to(torch.float32)
+            logger.warning(f"{precision} 推理结果与fp32差异过大（最小余弦相似度 {min_cosine:.4f} < {threshold}），回退到fp32")
+        
+        self.precision_check = {
+            'requested': precision,
+            'applied': applied,
+            'min_cosine': round(min_cosine, 6),
+            'fp32_time_ms': round(fp32_time * 1000, 2),
+            'precision_time_ms': round(precision_time * 1000, 2),
+            'speedup': round(fp32_time / precision_time, 2) if precision_time > 0 else None
+        }
+        logger.info(f"推理精度校验: {self.precision_check}")
+    
+    def _load_remote_model(self):
+        """客户端模式：请求嵌入服务加载模型"""
+        from knowledge_mgt.utils.embedding_service import get_embedding_service_client
+        
+        try:
+            start_time = time.time()
+            self.service_client = get_embedding_service_client(
+                self.service_url, timeout=self.model_config.get('timeout') or 60
+            )
+            self.remote_info = self.service_client.load_model(self.model_config.get('id'))
+            self.precision = self.remote_info.get('precision', 'fp32')
+            self.precision_check = self.remote_info.get('precision_check')
+            self.load_time = time.time() - start_time
+            self.is_loaded = True
+            logger.info(f"嵌入服务 {self.service_url} 已加载模型: {self.model_name}，"
+                        f"设备: {self.remote_info.get('device')}")
+        except Exception as e:
+            self.service_client = None
+            logger.error(f"通过嵌入服务加载模型失败: {str(e)}", exc_info=True)
+            raise
+    
     def unload_model(self):
         """卸载模型释放内存"""
+        if self.service_client is not None:
+            # 服务端模型可能被其他Web进程共享，这里只断开本地引用
+            self.service_client = None
+            self.is_loaded = False
+            logger.info(f"已断开嵌入服务模型: {self.model_name}")
+            return
+        
         if self.model is not None:
             del self.model
             self.model = None
             self.is_loaded = False
+            self.memory_bytes = 0
             # 清理GPU缓存
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
             logger.info(f"已卸载嵌入模型: {self.model_name}")
     
     def embed_text(self, text):
-        """为单个文本生成嵌入向量"""
-        if not self.is_loaded:
-            raise RuntimeError(f"模型 {self.model_name} 尚未加载，请先调用 load_model()")
-            
+        """为单个查询文本生成嵌入向量，返回形状为 (D,) 的float32数组，生成失败时返回零向量"""
         if not text or not text.strip():
             logger.warning("嵌入空文本")
-            return np.zeros(self.get_dimension())
+            return np.zeros(self.get_dimension(), dtype=np.float32)
         
-        try:
-            vector = self.model.encode(text)
-            return vector.tolist()
-        except Exception as e:
-            logger.error(f"生成嵌入向量失败: {str(e)}", exc_info=True)
-            return np.zeros(self.get_dimension()).tolist()
+        with self.in_use():
+            self._check_loaded()
+            try:
+                return self._encode(text)
+            except Exception as e:
+                logger.error(f"生成嵌入向量失败: {str(e)}", exc_info=True)
+                return np.zeros(self.get_dimension(), dtype=np.float32)
     
     def embed_texts(self, texts):
-        """为多个文本生成嵌入向量"""
-        if not self.is_loaded:
-            raise RuntimeError(f"模型 {self.model_name} 尚未加载，请先调用 load_model()")
-            
+        """为多个文本生成嵌入向量，返回形状为 (N, D) 的连续float32数组"""
+        return self.embed_texts_with_stats(texts)[0]
+    
+    def embed_texts_with_stats(self, texts):
+        """为多个文本生成嵌入向量，同时返回超长分块的切分统计 (向量, 统计)，生成失败时抛出异常"""
         if not texts:
             logger.warning("嵌入空文本列表")
-            return []
+            return np.zeros((0, self.get_dimension()), dtype=np.float32), None
         
         # 过滤空文本
         filtered_texts = [text for text in texts if text and text.strip()]
         
         if not filtered_texts:
-            return []
+            return np.zeros((0, self.get_dimension()), dtype=np.float32), None
         
+        # 嵌入服务、超时和编码错误直接抛出，由调用方终止入库，不能把零向量写入索引
         try:
-            vectors = self.model.encode(filtered_texts)
-            return vectors.tolist()
+            with self.in_use():
+                self._check_loaded()
+                if self.service_client is not None:
+                    return self.service_client.embed_with_stats(self.model_config.get('id'), filtered_texts)
+                if getattr(self.model, 'tokenizer', None) is None:
+                    return self._encode(filtered_texts), None
+                return self._encode_windowed(filtered_texts)
         except Exception as e:
             logger.error(f"批量生成嵌入向量失败: {str(e)}", exc_info=True)
-            return [np.zeros(self.get_dimension()).tolist() for _ in filtered_texts]
+            raise
+    
+    def get_max_tokens(self):
+        """单次编码的最大token数：取模型配置的max_tokens和模型自身序列长度上限中的较小值"""
+        max_seq_length = self.model.max_seq_length or 512
+        max_tokens = self.model_config.get('max_tokens') or max_seq_length
+        return min(max_tokens, max_seq_length)
+    
+    def _encode_windowed(self, texts):
+        """只做一次分词：超过max_tokens的文本切分为多个窗口，与其他文本在同一批次编码，
+        再按窗口token数加权平均回每个文本一个向量，避免超长部分被模型静默截断
+        """
+        tokenizer = self.model.tokenizer
+        prompt, normalize = self._get_encode_options()
+        # 与 model.encode 一致，每个窗口前加上模型的默认提示词
+        prompt_ids = tokenizer(prompt, add_special_tokens=False)['input_ids'] if prompt else []
+        max_tokens = self.get_max_tokens()
+        window_size = max(1, max_tokens - tokenizer.num_special_tokens_to_add(pair=False) - len(prompt_ids))
+        token_ids = tokenizer(texts, add_special_tokens=False, truncation=False)['input_ids']
+        
+        window_inputs = []
+        owners = []
+        weights = []
+        over_length_chunks = 0
+        text_window_counts = []
+        for text_index, ids in enumerate(token_ids):
+            windows = [ids[start:start + window_size] for start in range(0, len(ids), window_size)] or [[]]
+            if len(windows) > 1:
+                over_length_chunks += 1
+            text_window_counts.append(len(windows))
+            for window in windows:
+                window_inputs.append(tokenizer.build_inputs_with_special_tokens(prompt_ids + window))
+                owners.append(text_index)
+                weights.append(max(len(window), 1))
+        
+        prompt_length = len(tokenizer.build_inputs_with_special_tokens(prompt_ids)) - 1 if prompt_ids else None
+        window_vectors = self._forward_token_ids(window_inputs, prompt_length)
+        
+        owners = np.asarray(owners)
+        weights = np.asarray(weights, dtype=np.float32)
+        vectors = np.zeros((len(texts), window_vectors.shape[1]), dtype=np.float32)
+        np.add.at(vectors, owners, window_vectors * weights[:, None])
+        vectors /= np.bincount(owners, weights=weights, minlength=len(texts)).astype(np.float32)[:, None]
+        
+        # 与 model.encode 的 normalize_embeddings 一致，平均后的向量重新归一化
+        if normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        
+        stats = {
+            'chunk_count': len(texts),
+            'over_length_chunks': over_length_chunks,
+            'window_count': len(window_inputs),
+            'token_count': int(sum(len(ids) for ids in token_ids)),
+            'max_tokens': max_tokens,
+            'text_window_counts': text_window_counts,
+            'text_token_counts': [len(ids) for ids in token_ids]
+        }
+        return vectors, stats
+    
+    def _get_encode_options(self):
+        """编码时使用的提示词和是否归一化，返回 (提示词, 是否归一化)
+
+        提示词取模型配置的默认提示词（如查询/文档前缀），输出层包含归一化模块的模型输出归一化向量；
+        model.encode 和按窗口编码使用同一组选项，保证两种方式生成的向量一致
+        """
+        prompt_name = getattr(self.model, 'default_prompt_name', None)
+        prompt = (getattr(self.model, 'prompts', None) or {}).get(prompt_name) if prompt_name else None
+        normalize = any(isinstance(module, Normalize) for module in self.model)
+        return prompt or None, normalize
+
+    def _forward_token_ids(self, input_ids, prompt_length=None):
+        """直接用已分词的输入做前向计算，按长度排序分批以减少填充
+
+        prompt_length 为提示词的token数，与 model.encode 一样传给池化层，由模型决定是否在池化时去掉提示词
+        """
+        batch_size = self.model_config.get('batch_size') or 32
+        order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]), reverse=True)
+        vectors = np.zeros((len(input_ids), self.get_dimension()), dtype=np.float32)
+        
+        for start in range(0, len(order), batch_size):
+            batch_index = order[start:start + batch_size]
+            features = self.model.tokenizer.pad(
+                {'input_ids': [input_ids[i] for i in batch_index]}, padding=True, return_tensors='pt'
+            )
+            features = {key: value.to(self.model.device) for key, value in features.items()}
+            if prompt_length is not None:
+                features['prompt_length'] = prompt_length
+            with torch.inference_mode():
+                embeddings = self.model(features)['sentence_embedding']
+            vectors[batch_index] = embeddings.float().cpu().numpy()
+        return vectors
+    
+    def _encode(self, texts):
+        """生成连续的float32向量，客户端模式下由嵌入服务计算"""
+        if self.service_client is not None:
+            model_id = self.model_config.get('id')
+            if isinstance(texts, str):
+                return self.service_client.embed(model_id, [texts])[0]
+            return self.service_client.embed(model_id, texts)
+        prompt, normalize = self._get_encode_options()
+        # 低精度模型输出统一转换为float32，已是float32时不复制
+        return np.ascontiguousarray(
+            self.model.encode(texts, convert_to_numpy=True, prompt=prompt, normalize_embeddings=normalize),
+            dtype=np.float32
+        )
     
     def get_dimension(self):
         """获取嵌入向量的维度"""
         if not self.is_loaded:
             # 如果模型未加载，从配置中获取维度
             return self.model_config.get('vector_dimension', 384)
+        if self.service_client is not None:
+            return self.remote_info['dimension']
         return self.model.get_sentence_embedding_dimension()
     
     def get_device(self):
         """获取模型当前运行的设备"""
         if not self.is_loaded:
             return "未加载"
+        if self.service_client is not None:
+            return f"service:{self.remote_info.get('device')}"
         return self.model.device.type
 
+    def _estimate_memory_bytes(self):
+        """按参数和缓冲区大小估算模型占用的内存（字节）"""
+        if self.model is None:
+            return 0
+        total = 0
+        for tensor in list(self.model.parameters()) + list(self.model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+
 # 全局本地嵌入模型管理器
 class LocalEmbeddingManager:
-    """本地嵌入模型管理器 - 单例模式，同时只能加载一个本地模型"""
+    """本地嵌入模型管理器 - 单例模式，按模型ID常驻多个本地模型，超出内存预算时按LRU淘汰空闲的模型"""
     
     _instance = None
-    _current_model = None
-    _current_model_id = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(LocalEmbeddingManager, cls).__new__(cls)
+            # 模型池：model_id -> EmbeddingModel，按最近使用顺序排列（末尾为最近使用）
+            cls._instance._models = OrderedDict()
+            cls._instance._lock = threading.RLock()
+            # 正在加载的模型：model_id -> 加载结束时触发的事件
+            cls._instance._loading = {}
+            # 嵌入服务地址，None表示使用配置项 EMBEDDING_SERVICE_URL
+            cls._instance._service_url = None
         return cls._instance
     
+    def get_service_url(self):
+        """获取嵌入服务地址，为空时在本进程内加载模型"""
+        if self._service_url is not None:
+            return self._service_url
+        return getattr(settings, 'EMBEDDING_SERVICE_URL', '')
+    
+    def set_service_url(self, service_url):
+        """设置嵌入服务地址，嵌入服务进程自身设置为空字符串以在进程内加载模型"""
+        self._service_url = service_url
+    
+    def get_memory_budget(self):
+        """获取模型池内存预算（字节）"""
+        return getattr(settings, 'EMBEDDING_MODEL_POOL_MEMORY_MB', 4096) * 1024 * 1024
+    
+    def get_max_models(self):
+        """获取模型池最多常驻的模型数量"""
+        return getattr(settings, 'EMBEDDING_MODEL_POOL_MAX_MODELS', 4)
+    
+    def get_model(self, model_id):
+        """获取已加载的指定模型，未加载返回None"""
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                self._models.move_to_end(model_id)
+            return model
+    
     def get_current_model(self):
-        """获取当前加载的模型"""
-        return self._current_model
+        """获取最近使用的嵌入模型（不含交叉编码器重排序模型）"""
+        with self._lock:
+            current = self._current_embedding_item()
+            return current[1] if current else None
     
     def get_current_model_id(self):
-        """获取当前加载的模型ID"""
-        return self._current_model_id
+        """获取最近使用的嵌入模型ID（不含交叉编码器重排序模型）"""
+        with self._lock:
+            current = self._current_embedding_item()
+            return current[0] if current else None
+    
+    def _current_embedding_item(self):
+        """按最近使用顺序查找第一个嵌入模型，返回 (模型ID, 模型)，重排序模型与嵌入模型共用模型池，这里跳过"""
+        for model_id, model in reversed(self._models.items()):
+            if model.model_config.get('model_type') != 'cross_encoder':
+                return model_id, model
+        return None
+    
+    def get_loaded_model_ids(self):
+        """获取所有已加载的模型ID（按最近使用顺序，最近使用的在后）"""
+        with self._lock:
+            return list(self._models.keys())
     
     def load_model(self, model_id, model_config):
-        """加载指定的本地模型"""
-        # 如果已经加载了相同的模型，直接返回
-        if self._current_model_id == model_id and self._current_model is not None:
-            logger.info(f"模型 {model_id} 已经加载")
-            return self._current_model
-        
-        # 卸载当前模型
-        if self._current_model is not None:
-            logger.info(f"卸载当前模型 {self._current_model_id}")
-            self._current_model.unload_model()
-            self._current_model = None
-            self._current_model_id = None
+        """加载指定的本地模型到模型池
+
+        加载在模型池锁外进行，加载期间其他模型照常使用；同一模型同时只由一个线程加载，其他线程等待加载结束
+        """
+        while True:
+            with self._lock:
+                # 如果已经加载了相同的模型，直接返回
+                model = self.get_model(model_id)
+                if model is not None:
+                    logger.info(f"模型 {model_id} 已经加载")
+                    return model
+                loading = self._loading.get(model_id)
+                if loading is None:
+                    loading = self._loading[model_id] = threading.Event()
+                    break
+            # 其他线程正在加载该模型，等待结束后重新检查（加载失败时由本线程重试）
+            loading.wait()
         
         # 加载新模型
         try:
             model_name = model_config.get('model_name') or model_config.get('local_path', 'all-MiniLM-L6-v2')
-            embedding_model = EmbeddingModel(model_name=model_name, model_config=model_config)
+            if model_config.get('model_type') == 'cross_encoder':
+                # 交叉编码器重排序模型与嵌入模型共用模型池，始终在本进程内加载
+                from knowledge_mgt.utils.reranker import RerankerModel
+                embedding_model = RerankerModel(model_name=model_name, model_config=model_config)
+            else:
+                embedding_model = EmbeddingModel(
+                    model_name=model_name, model_config=model_config, service_url=self.get_service_url()
+                )
             embedding_model.load_model()
             
-            self._current_model = embedding_model
-            self._current_model_id = model_id
-            
-            logger.info(f"成功加载本地嵌入模型 {model_id}: {model_name}")
+            with self._lock:
+                self._models[model_id] = embedding_model
+                logger.info(f"成功加载本地嵌入模型 {model_id}: {model_name}")
+                self._evict(keep_model_id=model_id)
             return embedding_model
         except Exception as e:
             logger.error(f"加载本地嵌入模型失败: {str(e)}", exc_info=True)
             raise
+        finally:
+            with self._lock:
+                self._loading.pop(model_id, None)
+            loading.set()
+    
+    def _evict(self, keep_model_id=None):
+        """按LRU顺序淘汰空闲的模型，直到满足内存预算和数量上限；正在编码的模型不淘汰"""
+        memory_budget = self.get_memory_budget()
+        max_models = self.get_max_models()
+        
+        while len(self._models) > 1:
+            total_memory = sum(model.memory_bytes for model in self._models.values())
+            if total_memory <= memory_budget and len(self._models) <= max_models:
+                break
+            
+            # 取最久未使用的空闲模型，跳过刚加载的模型
+            victim_id = next((
+                model_id for model_id, model in self._models.items()
+                if model_id != keep_model_id and model.is_idle()
+            ), None)
+            if victim_id is None:
+                logger.warning(f"模型池超出预算（{total_memory / (1024 ** 2):.1f}MB/"
+                               f"{memory_budget / (1024 ** 2):.1f}MB，{len(self._models)}/{max_models} 个模型），"
+                               f"其余模型都在使用中，暂不淘汰")
+                break
+            
+            logger.info(f"模型池超出预算（{total_memory / (1024 ** 2):.1f}MB/"
+                        f"{memory_budget / (1024 ** 2):.1f}MB，{len(self._models)}/{max_models} 个模型），"
+                        f"淘汰最久未使用的模型 {victim_id}")
+            self.unload_model(victim_id)
+    
+    def unload_model(self, model_id):
+        """卸载指定模型，模型正在编码时先移出模型池，调用结束后卸载；该模型的入库工作进程池一并关闭"""
+        from knowledge_mgt.utils.embedding_workers import release_embedding_worker_pool
+
+        with self._lock:
+            model = self._models.pop(model_id, None)
+            if model is not None:
+                logger.info(f"卸载模型 {model_id}")
+                if not model.unload_when_idle():
+                    logger.info(f"模型 {model_id} 正在使用，调用结束后卸载")
+        if model is not None:
+            release_embedding_worker_pool(model_id)
+        return model is not None
     
     def unload_current_model(self):
-        """卸载当前模型"""
-        if self._current_model is not None:
-            logger.info(f"卸载当前模型 {self._current_model_id}")
-            self._current_model.unload_model()
-            self._current_model = None
-            self._current_model_id = None
+        """卸载最近使用的嵌入模型"""
+        with self._lock:
+            current_model_id = self.get_current_model_id()
+            if current_model_id is not None:
+                self.unload_model(current_model_id)
+    
+    def unload_all_models(self):
+        """卸载模型池中的所有模型"""
+        with self._lock:
+            for model_id in list(self._models.keys()):
+                self.unload_model(model_id)
+    
+    def get_pool_info(self):
+        """获取模型池中所有模型的信息"""
+        with self._lock:
+            models = [
+                _build_model_info(model_id, model)
+                for model_id, model in reversed(self._models.items())
+            ]
+            total_memory = sum(model.memory_bytes for model in self._models.values())
+        
+        return {
+            'models': models,
+            'model_count': len(models),
+            'max_models': self.get_max_models(),
+            'memory_used_mb': round(total_memory / (1024 ** 2), 1),
+            'memory_budget_mb': round(self.get_memory_budget() / (1024 ** 2), 1)
+        }
 
 # 全局管理器实例
 local_embedding_manager = LocalEmbeddingManager()
@@ -180,7 +661,7 @@ def get_embedding_model_by_id(model_id):
         with connection.cursor() as cursor:
             cursor.execute("""
                 SELECT id, name, model_type, api_type, api_key, api_url, model_name, local_path,
-                       vector_dimension, max_tokens, batch_size, timeout
+                       vector_dimension, max_tokens, batch_size, timeout, inference_precision
                 FROM embedding_model 
                 WHERE id = %s AND is_active = 1
             """, [model_id])
@@ -202,7 +683,8 @@ def get_embedding_model_by_id(model_id):
                 'vector_dimension': result[8],
                 'max_tokens': result[9],
                 'batch_size': result[10],
-                'timeout': result[11]
+                'timeout': result[11],
+                'inference_precision': result[12]
             }
                 
     except Exception as e:
@@ -230,10 +712,82 @@ def get_default_embedding_model():
         logger.error(f"获取默认嵌入模型失败: {str(e)}", exc_info=True)
         return None
 
+def get_knowledge_embedding_model(embedding_model_id):
+    """获取知识库绑定的嵌入模型实例，本地模型未加载时按需加载到模型池，在线模型使用在线API"""
+    if not embedding_model_id:
+        # 旧知识库未绑定模型时，使用最近使用的嵌入模型
+        return local_embedding_manager.get_current_model()
+    
+    embedding_model = local_embedding_manager.get_model(embedding_model_id)
+    if embedding_model is not None:
+        return embedding_model
+    
+    model_config = get_embedding_model_by_id(embedding_model_id)
+    if not model_config:
+        return None
+    
+    if model_config['api_type'] != 'local':
+        from knowledge_mgt.utils.online_embeddings import get_online_embedding_model
+        return get_online_embedding_model(model_config)
+    
+    logger.info(f"知识库使用的嵌入模型 {embedding_model_id} 未加载，按需加载到模型池")
+    return local_embedding_manager.load_model(embedding_model_id, model_config)
+
+def merge_embedding_stats(total, stats):
+    """累加超长分块切分统计，逐文本明细按顺序拼接"""
+    if stats is None:
+        return total
+    if total is None:
+        return {key: list(value) if key in PER_TEXT_STATS_KEYS else value for key, value in stats.items()}
+    for key in ('chunk_count', 'over_length_chunks', 'window_count', 'token_count'):
+        total[key] = total.get(key, 0) + stats.get(key, 0)
+    for key in PER_TEXT_STATS_KEYS:
+        if key in total and key in stats:
+            total[key].extend(stats[key])
+        else:
+            total.pop(key, None)
+    return total
+
+def select_embedding_stats(stats, positions):
+    """从一批文本的切分统计中取出指定位置文本的统计（不含逐文本明细），没有逐文本明细时返回None
+
+    用于跨文档批量生成向量后把统计拆分到各文档；窗口数为0的位置是复用已有向量、没有编码的文本
+    """
+    if not stats or any(key not in stats for key in PER_TEXT_STATS_KEYS):
+        return None
+    window_counts = [stats['text_window_counts'][i] for i in positions]
+    return {
+        'chunk_count': sum(1 for count in window_counts if count),
+        'over_length_chunks': sum(1 for count in window_counts if count > 1),
+        'window_count': sum(window_counts),
+        'token_count': sum(stats['text_token_counts'][i] for i in positions),
+        'max_tokens': stats.get('max_tokens')
+    }
+
+def summarize_embedding_stats(stats):
+    """去掉逐文本明细，用于写入文档统计和导入汇总"""
+    if stats is None:
+        return None
+    return {key: value for key, value in stats.items() if key not in PER_TEXT_STATS_KEYS}
+
 def unload_local_embedding_model():
     """卸载当前本地嵌入模型"""
     local_embedding_manager.unload_current_model()
 
+def _build_model_info(model_id, model):
+    """构建单个已加载模型的信息"""
+    return {
+        'model_id': model_id,
+        'model_name': model.model_name,
+        'is_loaded': model.is_loaded,
+        'dimension': model.get_dimension(),
+        'device': model.get_device(),
+        'precision': getattr(model, 'precision', None),
+        'load_time': round(model.load_time, 2),
+        'warmup_time': round(getattr(model, 'warmup_time', 0.0), 2),
+        'memory_mb': round(model.memory_bytes / (1024 ** 2), 1)
+    }
+
 def get_current_local_model_info():
     """获取当前加载的本地模型信息"""
     current_model = local_embedding_manager.get_current_model()
@@ -242,13 +796,19 @@ def get_current_local_model_info():
     if current_model is None:
         return None
     
-    return {
-        'model_id': current_model_id,
-        'model_name': current_model.model_name,
-        'is_loaded': current_model.is_loaded,
-        'dimension': current_model.get_dimension(),
-        'device': current_model.get_device()
-    }
+    return _build_model_info(current_model_id, current_model)
+
+def get_local_model_info(model_id):
+    """获取指定已加载本地模型的信息"""
+    model = local_embedding_manager.get_model(model_id)
+    if model is None:
+        return None
+    
+    return _build_model_info(model_id, model)
+
+def get_local_model_pool_info():
+    """获取本地模型池信息"""
+    return local_embedding_manager.get_pool_info()
 
 # 兼容性函数 - 保持向后兼容
 def get_embedding_model(model_name="all-MiniLM-L6-v2"):
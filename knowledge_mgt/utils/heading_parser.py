@@ -0,0 +1,182 @@
+import re
+
+# 标题行的最大字符数，更长的行按正文处理（显式的Markdown标题除外）
+HEADING_MAX_CHARS = 80
+
+# 以这些标点结尾的行是句子或列表项，不作为标题
+SENTENCE_END_CHARS = '。.!?！？；;，,：:'
+
+# 标题路径的分隔符，以及写入分块元数据的最大长度
+HEADING_PATH_SEPARATOR = ' > '
+HEADING_PATH_MAX_CHARS = 500
+
+# 一次扫描识别全部结构行：代码围栏、Markdown ATX/Setext 标题、中文章节、英文章节、数字编号标题、全大写标题。
+# 多行模式下只在行首尝试匹配，各分支用命名分组区分，每行只匹配一次，整体耗时与文本长度成线性关系
+STRUCTURE_PATTERN = re.compile(r"""
+    ^[ \t]{0,3}(?:
+        (?P<fence>```|~~~)[^\n]*
+      | (?P<atx>\#{1,6})(?:[ \t]+(?P<atx_title>[^\n]*))?$
+      | (?P<setext_title>[^\n]+)\n[ \t]{0,3}(?P<setext>=+|-+)[ \t]*$
+      | (?P<cn>第[一二三四五六七八九十百千零〇两\d]+(?P<cn_unit>部分|[部篇章节条]))[^\n]*$
+      | (?P<en>Part|Chapter|Section)[ \t]+[\dIVXLC]+\b[^\n]*$
+      | (?P<number>\d+(?:\.\d+)+\.?|\d+\.)[ \t]+[^\n]+$
+      | (?P<caps>[A-Z][A-Z \t]+)$
+    )
+""", re.MULTILINE | re.VERBOSE)
+
+# Setext 标题的下划线行，与上一行组成标题
+SETEXT_UNDERLINE_PATTERN = re.compile(r'[ \t]{0,3}(?:=+|-+)[ \t]*\n')
+
+
+def format_heading_path(path):
+    """把标题路径格式化为文本，如 "第三章 安装 > 3.2 环境配置"，没有标题时返回空字符串"""
+    return HEADING_PATH_SEPARATOR.join(path)
+
+
+class HeadingParser:
+    """流式解析文档的标题层级，按章节返回 (标题路径, 正文)
+
+    Markdown ATX/Setext 标题按 # 数量和下划线确定层级；中文章节、英文章节、数字编号、全大写等没有显式层级的标题，
+    按 reStructuredText 的规则在某种标题样式首次出现时取当前层级的下一级，之后同样式的标题保持该层级。
+    出现过 Markdown 标题后，数字编号和全大写行多为列表项和强调文字，按正文处理。代码围栏内的行不识别为标题；
+    没有正文的标题被同级标题替换时，标题文字作为该章节的正文返回，不会丢失。文本可以分多次输入，章节正文累积超过 max_body_chars 时先返回已有部分，
+    内存占用与文档大小无关
+    """
+
+    def __init__(self, max_body_chars=200000):
+        self.max_body_chars = max_body_chars
+        # 当前标题栈 [(层级, 标题)]
+        self.stack = []
+        self.style_levels = {}
+        self.fence = None
+        self.heading_count = 0
+        # 是否出现过 Markdown ATX/Setext 标题
+        self.markdown_headings = False
+        # 当前标题下是否已有正文
+        self.has_body = True
+        self.tail = ''
+        self.body = []
+        self.body_size = 0
+        self.sections = []
+
+    @property
+    def path(self):
+        return tuple(title for _, title in self.stack)
+
+    def feed(self, text):
+        """输入一段文本，返回其中已完整的章节 [(标题路径, 正文)]"""
+        text = self.tail + text
+        # 末尾不完整的一行和它前面的一行留到下一次扫描；留下的第一行是下划线、上一行可以作为标题时再往前留一行，
+        # 保证 Setext 标题的两行在同一次扫描中（下划线行本身不能作为标题）
+        last = text.rfind('\n')
+        cut = text.rfind('\n', 0, last) + 1 if last > 0 else 0
+        if cut > 0 and SETEXT_UNDERLINE_PATTERN.match(text, cut):
+            previous = text.rfind('\n', 0, cut - 1) + 1
+            if not SETEXT_UNDERLINE_PATTERN.match(text, previous):
+                cut = previous
+        if len(text) - cut > self.max_body_chars:
+            # 超长的行不可能是标题，直接作为正文处理，避免末尾文本无限累积
+            cut = last + 1 if last >= 0 else len(text)
+        self.tail = text[cut:]
+        self._scan(text[:cut])
+        return self._take_sections()
+
+    def close(self):
+        """输入结束，返回剩余的章节"""
+        self._scan(self.tail)
+        self.tail = ''
+        self._emit()
+        self._emit_bodyless_heading()
+        return self._take_sections()
+
+    def _take_sections(self):
+        sections, self.sections = self.sections, []
+        return sections
+
+    def _scan(self, text):
+        position = 0
+        for match in STRUCTURE_PATTERN.finditer(text):
+            heading = self._parse_heading(match)
+            if heading is None:
+                continue
+            self._append_body(text[position:match.start()])
+            position = match.end()
+            self._start_section(*heading)
+        self._append_body(text[position:])
+
+    def _parse_heading(self, match):
+        """返回 (层级, 标题)，不是标题（代码围栏、围栏内的行、像句子的行）时返回None"""
+        fence = match.group('fence')
+        if fence:
+            if self.fence is None:
+                self.fence = fence
+            elif fence == self.fence:
+                self.fence = None
+            return None
+        if self.fence is not None:
+            return None
+
+        if match.group('atx'):
+            title = (match.group('atx_title') or '').strip().rstrip('#').strip()
+            if not title:
+                return None
+            self.markdown_headings = True
+            return len(match.group('atx')), title
+
+        if match.group('setext'):
+            title = match.group('setext_title').strip()
+            if not title or len(title) > HEADING_MAX_CHARS or title.startswith(('-', '=', '*', '+', '>', '|')):
+                return None
+            self.markdown_headings = True
+            return (1 if match.group('setext')[0] == '=' else 2), title
+
+        if self.markdown_headings and (match.group('number') or match.group('caps')):
+            return None
+        title = match.group(0).strip()
+        if len(title) > HEADING_MAX_CHARS or title[-1] in SENTENCE_END_CHARS:
+            return None
+        if match.group('cn'):
+            style = ('cn', match.group('cn_unit'))
+        elif match.group('en'):
+            style = ('en', match.group('en'))
+        elif match.group('number'):
+            style = ('number', match.group('number').rstrip('.').count('.') + 1)
+        else:
+            style = ('caps',)
+
+        level = self.style_levels.get(style)
+        if level is None:
+            level = self.style_levels[style] = self.stack[-1][0] + 1 if self.stack else 1
+        return level, title
+
+    def _start_section(self, level, title):
+        self._emit()
+        if self.stack and self.stack[-1][0] >= level:
+            self._emit_bodyless_heading()
+        while self.stack and self.stack[-1][0] >= level:
+            self.stack.pop()
+        self.stack.append((level, title))
+        self.heading_count += 1
+        self.has_body = False
+
+    def _emit_bodyless_heading(self):
+        """当前标题下没有正文时，把标题文字作为正文返回"""
+        if self.stack and not self.has_body:
+            self.sections.append((self.path, self.stack[-1][1]))
+            self.has_body = True
+
+    def _append_body(self, text):
+        if not text:
+            return
+        self.body.append(text)
+        self.body_size += len(text)
+        if self.body_size >= self.max_body_chars:
+            self._emit()
+
+    def _emit(self):
+        body = ''.join(self.body)
+        self.body = []
+        self.body_size = 0
+        if body.strip():
+            self.sections.append((self.path, body))
+            self.has_body = True
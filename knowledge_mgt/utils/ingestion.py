@@ -0,0 +1,564 @@
+import atexit
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from knowledge_mgt.utils.dedup import NearDuplicateDetector, content_hash
+from knowledge_mgt.utils.document_processor import (
+    SUPPORTED_EXTENSIONS, DocumentExtractionError, DocumentProcessor, VectorStore
+)
+from knowledge_mgt.utils.embedding_workers import embed_texts_for_ingestion
+from knowledge_mgt.utils.token_estimator import default_token_counter, get_token_counter
+from knowledge_mgt.utils.upload_handlers import find_document_by_hash, format_file_size, get_max_file_size
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 上传任务表中保存的分块参数
+CHUNKING_PARAM_NAMES = (
+    'chunking_method', 'chunk_size', 'similarity_threshold', 'overlap_size', 'custom_delimiter',
+    'window_size', 'step_size', 'min_chunk_size', 'max_chunk_size'
+)
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+def iter_windows(iterable, window_size):
+    """将迭代器按固定大小切分为窗口"""
+    iterator = iter(iterable)
+    while True:
+        window = list(islice(iterator, window_size))
+        if not window:
+            return
+        yield window
+
+
+def insert_document_chunks(document_id, database_id, start_index, chunks, signatures=None, heading_paths=None):
+    """写入一批文档分块记录及其SimHash签名、标题路径，返回分块ID列表"""
+    chunk_ids = []
+    signatures = signatures or [None] * len(chunks)
+    heading_paths = heading_paths or [None] * len(chunks)
+    with connection.cursor() as cursor:
+        for offset, (chunk_text, signature, heading_path) in enumerate(zip(chunks, signatures, heading_paths)):
+            cursor.execute("""
+                INSERT INTO knowledge_document_chunk
+                (document_id, database_id, chunk_index, content, content_hash, simhash, heading_path)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, [
+                document_id, database_id, start_index + offset, chunk_text, content_hash(chunk_text), signature,
+                heading_path
+            ])
+
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            chunk_ids.append(cursor.fetchone()[0])
+    return chunk_ids
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_source_entries(source_path):
+    """逐个返回导入源中的文件 (相对路径, 只读文件对象)
+
+    source_path 可以是服务器目录、zip 或 tar（含gz/bz2/xz压缩）文件；压缩包按条目流式读取，不整体解压，
+    tar以流模式打开，返回的文件对象在取下一个条目前有效
+    """
+    if os.path.isdir(source_path):
+        for root, dirs, files in os.walk(source_path):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                with open(path, 'rb') as f:
+                    yield os.path.relpath(path, source_path), f
+    elif zipfile.is_zipfile(source_path):
+        with zipfile.ZipFile(source_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as f:
+                    yield info.filename, f
+    elif tarfile.is_tarfile(source_path):
+        with tarfile.open(source_path, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                f = archive.extractfile(member)
+                try:
+                    yield member.name, f
+                finally:
+                    f.close()
+    else:
+        raise ValueError(f"不支持的导入源，应为目录、zip或tar文件: {source_path}")
+
+
+def _is_ignored_entry(name):
+    """跳过隐藏文件和压缩工具生成的元数据文件"""
+    parts = name.replace('\\', '/').split('/')
+    return any(part.startswith('.') or part == '__MACOSX' for part in parts if part)
+
+
+def _chunk_document(file_path, chunking_params):
+    """在工作进程中提取并分块一个文档，返回 (分块列表, 分块向量, 标题路径)"""
+    document_processor = DocumentProcessor(**chunking_params)
+    chunks = list(document_processor.iter_chunks(file_path))
+    return chunks, None, document_processor.take_chunk_headings(chunks)
+
+
+# 批量导入的提取分块进程池，所有导入任务共享，首次使用时创建
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_bulk_ingestion_workers():
+    """提取分块进程数，配置为0时取CPU核心数（最多8个）"""
+    workers = getattr(settings, 'BULK_INGESTION_WORKERS', 0)
+    if workers <= 0:
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        workers = min(cpu_count or 1, 8)
+    return workers
+
+
+def get_bulk_ingestion_executor(workers):
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            # 与嵌入工作进程一致使用spawn，避免fork继承Web进程中的线程和数据库连接
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"已启动批量导入进程池: 进程数 {workers}")
+        return _executor
+
+
+def replace_bulk_ingestion_executor(executor, workers):
+    """工作进程异常退出后进程池不可再用，关闭并重新创建，返回新的进程池"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is executor:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            logger.warning("批量导入进程池中的进程异常退出，重新创建进程池")
+    return get_bulk_ingestion_executor(workers)
+
+
+def shutdown_bulk_ingestion_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown_bulk_ingestion_executor)
+
+
+class BulkIngestionJob:
+    """批量导入：把目录或压缩包中的文档导入知识库
+
+    条目逐个写入知识库的文档目录并创建上传任务记录，提取和分块分发到进程池并行执行，同时在途的文档不超过进程数的两倍；
+    分块按文档顺序写入数据库，向量跨文档攒够 BULK_EMBEDDING_BATCH_SIZE 个分块后统一生成并追加到索引，
+    每批追加后保存索引，再把这一批涉及的文档标记为完成
+    """
+
+    def __init__(self, database_id, user_id, username, chunking_params, batch_id=None):
+        self.database_id = database_id
+        self.user_id = user_id
+        self.username = username
+        self.chunking_params = {name: chunking_params[name] for name in CHUNKING_PARAM_NAMES if name in chunking_params}
+        self.batch_id = batch_id or str(uuid.uuid4())
+        self.storage_dir = os.path.join(settings.MEDIA_ROOT, 'knowledge_docs', str(database_id))
+        self.embedding_batch_size = getattr(settings, 'BULK_EMBEDDING_BATCH_SIZE', 512)
+
+        self.summary = {'files': 0, 'completed': 0, 'failed': 0, 'duplicates': 0, 'chunks': 0}
+        self.embedding_stats = None
+        # 本批次已导入文件的内容哈希 -> 文件名，内容相同的文件只导入一次
+        self.file_hashes = {}
+        # 已创建、尚未完成或失败的任务
+        self.active_tasks = {}
+        # 等待生成向量的分块 [(分块ID, 内容, 已有向量, 文档)]
+        self.embedding_queue = []
+
+    def run(self, source_path):
+        """执行导入，返回导入汇总"""
+        from knowledge_mgt.utils.embeddings import get_knowledge_embedding_model
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT embedding_model_id, index_type, reduced_dimension, dimension_reduction, duplicate_policy
+                FROM knowledge_database WHERE id = %s
+            """, [self.database_id])
+            row = cursor.fetchone()
+        if not row:
+            raise ValueError("知识库不存在")
+        embedding_model_id, index_type, reduced_dimension, dimension_reduction, duplicate_policy = row
+
+        self.embedding_model_id = embedding_model_id
+        self.embedding_model = get_knowledge_embedding_model(embedding_model_id)
+        if self.embedding_model is None:
+            raise ValueError("没有加载的嵌入模型，请先在系统管理中加载嵌入模型")
+
+        vector_store = VectorStore(
+            vector_dimension=self.embedding_model.get_dimension(), index_type=index_type,
+            reduced_dimension=reduced_dimension, reduction_method=dimension_reduction
+        )
+        vector_store.create_index(self.database_id)
+        self.vector_store = vector_store
+        self.duplicate_detector = NearDuplicateDetector.load(self.database_id, duplicate_policy)
+        os.makedirs(self.storage_dir, exist_ok=True)
+
+        # 嵌入语义分块和按模型分词器计数需要本进程内的模型，改用线程执行
+        workers = get_bulk_ingestion_workers()
+        token_counter = get_token_counter(self.embedding_model)
+        if self.chunking_params.get('chunking_method') == 'embedding_semantic' or token_counter is not default_token_counter:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-chunking')
+            chunk_document = self._chunk_document_with_model
+        else:
+            executor = get_bulk_ingestion_executor(workers)
+            chunk_document = _chunk_document
+
+        start_time = time.perf_counter()
+        logger.info(f"开始批量导入 {source_path} 到知识库 {self.database_id}，批次 {self.batch_id}")
+        staged_files = self._iter_staged_files(source_path)
+        pending = deque()
+
+        def submit_next():
+            task = next(staged_files, None)
+            if task is not None:
+                pending.append((task, executor.submit(chunk_document, task['file_path'], self.chunking_params)))
+
+        try:
+            for _ in range(workers * 2):
+                submit_next()
+
+            while pending:
+                task, future = pending.popleft()
+                try:
+                    chunks, cached_vectors, heading_paths = future.result()
+                except BrokenProcessPool:
+                    # 分块进程异常退出（如内存不足被终止），换用新的进程池重新提交在途的文件，当前文件记为失败
+                    executor = replace_bulk_ingestion_executor(executor, workers)
+                    resubmitted = [pending_task for pending_task, _ in pending]
+                    pending.clear()
+                    for pending_task in resubmitted:
+                        pending.append((pending_task, executor.submit(
+                            chunk_document, pending_task['file_path'], self.chunking_params
+                        )))
+                    self._fail_task(task, "处理文档失败: 分块进程异常退出")
+                    submit_next()
+                    continue
+                except Exception as e:
+                    message = str(e) if isinstance(e, DocumentExtractionError) else f"处理文档失败: {str(e)}"
+                    self._fail_task(task, message)
+                    submit_next()
+                    continue
+                submit_next()
+
+                self._store_document(task, chunks, cached_vectors, heading_paths)
+                if len(self.embedding_queue) >= self.embedding_batch_size:
+                    self._flush()
+            self._flush()
+        except Exception as e:
+            # 向量生成或索引写入失败时终止导入，尚未读取的条目不再导入，已创建但未完成的任务全部标记为失败，
+            # 这些文档在之前的批次中已写入索引的分块一并从索引中删除
+            for _, future in pending:
+                future.cancel()
+            staged_files.close()
+            failed_tasks = list(self.active_tasks.values())
+            self._remove_indexed_chunks(failed_tasks)
+            for task in failed_tasks:
+                self._fail_task(task, f"批量导入中止: {str(e)}")
+            raise
+        finally:
+            if isinstance(executor, ThreadPoolExecutor):
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self.summary['elapsed_seconds'] = round(time.perf_counter() - start_time, 2)
+        self.summary['deduplication'] = self.duplicate_detector.report()
+        self.summary['embedding'] = self.embedding_stats
+        logger.info(f"批量导入完成，批次 {self.batch_id}: {self.summary}")
+        return self.summary
+
+    def _chunk_document_with_model(self, file_path, chunking_params):
+        document_processor = DocumentProcessor(**chunking_params)
+        document_processor.token_counter = get_token_counter(self.embedding_model)
+        document_processor.embedding_model = self.embedding_model
+        chunks = list(document_processor.iter_chunks(file_path))
+        return chunks, document_processor.take_chunk_vectors(chunks), document_processor.take_chunk_headings(chunks)
+
+    def _iter_staged_files(self, source_path):
+        """逐个把导入源中的文件写入知识库文档目录并创建上传任务，返回任务信息
+
+        不支持的文件类型、超过知识库单文件大小上限的文件记为失败任务
+        """
+        max_file_size = get_max_file_size(self.database_id)
+        for name, source_file in iter_source_entries(source_path):
+            if _is_ignored_entry(name):
+                continue
+
+            self.summary['files'] += 1
+            filename = os.path.basename(name)
+            extension = os.path.splitext(filename)[1].lower()
+            task = {
+                'task_id': str(uuid.uuid4()), 'name': name, 'filename': filename,
+                'file_path': None, 'file_size': None, 'file_hash': None
+            }
+            if extension not in SUPPORTED_EXTENSIONS:
+                self._create_task(task)
+                self._fail_task(task, f"不支持的文件类型: {extension or filename}")
+                continue
+
+            file_path = os.path.join(self.storage_dir, filename)
+            if os.path.exists(file_path):
+                file_path = os.path.join(
+                    self.storage_dir, f"{os.path.splitext(filename)[0]}_{uuid.uuid4().hex[:8]}{extension}"
+                )
+            # 复制的同时计算内容哈希并检查大小上限，知识库或本批次中已有相同内容的文件不再导入
+            sha256 = hashlib.sha256()
+            file_size = 0
+            with open(file_path, 'wb') as destination:
+                while file_size <= max_file_size:
+                    data = source_file.read(1024 * 1024)
+                    if not data:
+                        break
+                    file_size += len(data)
+                    sha256.update(data)
+                    destination.write(data)
+            if file_size > max_file_size:
+                os.remove(file_path)
+                self._create_task(task)
+                self._fail_task(task, f"文件大小超过上限 {format_file_size(max_file_size)}")
+                continue
+
+            task.update(file_path=file_path, file_size=os.path.getsize(file_path), file_hash=sha256.hexdigest())
+            duplicate_message = None
+            existing_document = find_document_by_hash(self.database_id, task['file_hash'])
+            if existing_document:
+                task['document_id'] = existing_document[0]
+                duplicate_message = f"与知识库中的文档 {existing_document[0]} 内容相同，未重复导入"
+            elif task['file_hash'] in self.file_hashes:
+                duplicate_message = f"与本批次中的文件 {self.file_hashes[task['file_hash']]} 内容相同，未重复导入"
+
+            if duplicate_message:
+                os.remove(file_path)
+                task['file_path'] = None
+                self._create_task(task)
+                self._skip_task(task, duplicate_message)
+                continue
+
+            self.file_hashes[task['file_hash']] = name
+            self._create_task(task)
+            yield task
+
+    def _create_task(self, task):
+        self.active_tasks[task['task_id']] = task
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO document_upload_task
+                (task_id, batch_id, user_id, username, database_id, filename, file_path, file_size, file_hash,
+                 chunking_method, chunk_size, similarity_threshold, overlap_size,
+                 custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
+                 status, progress, started_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                task['task_id'], self.batch_id, self.user_id, self.username, self.database_id,
+                task['filename'], task['file_path'], task['file_size'], task['file_hash'],
+                *[self.chunking_params.get(name) for name in CHUNKING_PARAM_NAMES],
+                'processing', 0, datetime.now()
+            ])
+
+    def _update_task(self, task, status, progress, **fields):
+        assignments = ["status = %s", "progress = %s", "updated_at = NOW()"]
+        params = [status, progress]
+        for column, value in fields.items():
+            assignments.append(f"{column} = %s")
+            params.append(value)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE document_upload_task SET {', '.join(assignments)} WHERE task_id = %s", params + [task['task_id']]
+            )
+
+    def _fail_task(self, task, message):
+        logger.warning(f"批量导入文件失败: {task['name']}, {message}")
+        self.active_tasks.pop(task['task_id'], None)
+        self.summary['failed'] += 1
+        self._update_task(task, 'failed', 0, error_message=message, completed_at=datetime.now())
+        if task.get('document_id'):
+            # 已写入的文档和分块一并删除（分块随外键级联删除）
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM knowledge_document WHERE id = %s", [task['document_id']])
+
+    def _skip_task(self, task, message):
+        """内容重复的文件直接记为完成，不生成文档"""
+        logger.info(f"批量导入跳过重复文件: {task['name']}, {message}")
+        self.active_tasks.pop(task['task_id'], None)
+        self.summary['duplicates'] += 1
+        self._update_task(
+            task, 'completed', 100, error_message=message, document_id=task.get('document_id'),
+            completed_at=datetime.now()
+        )
+
+    def _store_document(self, task, chunks, cached_vectors, heading_paths):
+        """写入文档和分块记录，需要生成向量的分块加入待处理队列"""
+        if not chunks:
+            self._fail_task(task, "文档分块失败，未生成有效分块")
+            return
+
+        plan = self.duplicate_detector.plan(chunks)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO knowledge_document
+                (database_id, filename, file_path, file_type, file_size, file_hash,
+                 chunking_method, chunk_size, similarity_threshold, overlap_size,
+                 custom_delimiter, window_size, step_size, min_chunk_size, max_chunk_size,
+                 chunk_count, user_id, username)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, [
+                self.database_id, task['filename'], task['file_path'],
+                os.path.splitext(task['file_path'])[1][1:].lower(), task['file_size'], task['file_hash'],
+                *[self.chunking_params.get(name) for name in CHUNKING_PARAM_NAMES],
+                len(plan['store']), self.user_id, self.username
+            ])
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            task['document_id'] = cursor.fetchone()[0]
+
+        chunk_ids = insert_document_chunks(
+            task['document_id'], self.database_id, 0,
+            [chunks[i] for i in plan['store']], [plan['signatures'][i] for i in plan['store']],
+            [heading_paths[i] for i in plan['store']]
+        )
+        self.duplicate_detector.bind(plan, chunk_ids)
+
+        document = {
+            'task': task,
+            # 已写入索引的分块ID，导入中止时用于从索引中删除
+            'indexed_chunk_ids': [],
+            'chunk_count': len(chunk_ids),
+            'pending': len(plan['embed']),
+            # 本文档分块的向量化切分统计，文档完成时写入
+            'embedding_stats': None,
+            'duplicate_chunks': sum(original is not None for original in plan['duplicate_of'])
+        }
+        chunk_id_by_position = dict(zip(plan['store'], chunk_ids))
+        for position in plan['embed']:
+            self.embedding_queue.append((
+                chunk_id_by_position[position], chunks[position],
+                cached_vectors[position] if cached_vectors else None, document
+            ))
+        task['document'] = document
+        self._update_task(task, 'processing', 50, chunk_count=len(chunk_ids), document_id=task['document_id'])
+
+        if not document['pending']:
+            self._complete_document(document)
+
+    def _flush(self):
+        """为队列中的分块统一生成向量，追加到索引并保存，完成这一批涉及的文档
+
+        每批单独打开索引写入器，只在追加和保存期间持有知识库的索引锁，其他上传、删除等写入方可以在批次之间写入
+        """
+        # 分块工作进程也会导入本模块，嵌入模型相关模块在用到时再导入
+        from knowledge_mgt.utils.embeddings import merge_embedding_stats, select_embedding_stats, summarize_embedding_stats
+
+        if not self.embedding_queue:
+            return
+
+        chunk_ids = [item[0] for item in self.embedding_queue]
+        texts = [item[1] for item in self.embedding_queue]
+        cached_vectors = [item[2] for item in self.embedding_queue]
+
+        start_time = time.perf_counter()
+        vectors, stats = embed_texts_for_ingestion(self.embedding_model_id, self.embedding_model, texts, cached_vectors)
+        self.duplicate_detector.record_embedding(len(texts), time.perf_counter() - start_time)
+        self.embedding_stats = merge_embedding_stats(self.embedding_stats, summarize_embedding_stats(stats))
+        # 一批向量跨多个文档生成，切分统计按分块所属的文档拆分
+        positions_by_document = {}
+        for position, (_, _, _, document) in enumerate(self.embedding_queue):
+            positions_by_document.setdefault(id(document), (document, []))[1].append(position)
+        for document, positions in positions_by_document.values():
+            document['embedding_stats'] = merge_embedding_stats(
+                document['embedding_stats'], select_embedding_stats(stats, positions)
+            )
+
+        index_writer = self.vector_store.open_index_writer(self.database_id)
+        try:
+            vector_ids = index_writer.add(chunk_ids, vectors, texts)
+            with connection.cursor() as cursor:
+                cursor.executemany("""
+                    UPDATE knowledge_document_chunk
+                    SET vector_id = %s
+                    WHERE id = %s
+                """, [[str(vector_id), chunk_id] for vector_id, chunk_id in zip(vector_ids, chunk_ids)])
+        except Exception:
+            index_writer.discard()
+            raise
+        index_writer.save()
+
+        documents = {}
+        for chunk_id, _, _, document in self.embedding_queue:
+            document['pending'] -= 1
+            document['indexed_chunk_ids'].append(chunk_id)
+            documents[id(document)] = document
+        self.embedding_queue = []
+        for document in documents.values():
+            if not document['pending']:
+                self._complete_document(document)
+
+    def _remove_indexed_chunks(self, tasks):
+        """从索引中删除未完成文档已写入的分块，删除失败时只记录日志，重建索引时会清理"""
+        chunk_ids = [
+            chunk_id for task in tasks if task.get('document')
+            for chunk_id in task['document']['indexed_chunk_ids']
+        ]
+        if not chunk_ids:
+            return
+        try:
+            index_writer = self.vector_store.open_index_writer(self.database_id)
+            try:
+                index_writer.remove(chunk_ids)
+            except Exception:
+                index_writer.discard()
+                raise
+            index_writer.save()
+        except Exception as e:
+            logger.error(f"从知识库 {self.database_id} 的索引中删除中止导入的分块失败，请重建索引: {str(e)}")
+
+    def _complete_document(self, document):
+        task = document['task']
+        embedding_stats = document['embedding_stats']
+        if embedding_stats and embedding_stats['over_length_chunks']:
+            logger.info(f"文档 {task['document_id']} 有 {embedding_stats['over_length_chunks']} 个分块超过 "
+                        f"{embedding_stats['max_tokens']} tokens，已切分为多个窗口编码后平均")
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE knowledge_document SET embedding_stats = %s WHERE id = %s
+            """, [json.dumps(dict(
+                embedding_stats or {},
+                bulk_batch_id=self.batch_id,
+                deduplication={
+                    'policy': self.duplicate_detector.policy,
+                    'duplicate_chunks': document['duplicate_chunks']
+                }
+            )), task['document_id']])
+            cursor.execute("""
+                UPDATE knowledge_database
+                SET doc_count = doc_count + 1
+                WHERE id = %s
+            """, [self.database_id])
+        self._update_task(task, 'completed', 100, completed_at=datetime.now())
+        self.active_tasks.pop(task['task_id'], None)
+        self.summary['completed'] += 1
+        self.summary['chunks'] += document['chunk_count']
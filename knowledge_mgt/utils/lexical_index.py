@@ -0,0 +1,202 @@
+import heapq
+import logging
+import math
+import os
+import re
+import sqlite3
+from collections import Counter
+from urllib.parse import quote
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 英文、数字组成的词（允许 . _ - / : 连接，保留错误码、版本号、产品型号等标识符）和连续的中文字符
+TOKEN_PATTERN = re.compile(
+    r'[A-Za-z0-9]+(?:[._\-/:][A-Za-z0-9]+)*|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+'
+)
+IDENTIFIER_SEPARATOR_PATTERN = re.compile(r'[._\-/:]')
+
+# 按分块ID批量删除时每条语句的参数个数，低于SQLite的变量数上限
+SQLITE_BATCH_SIZE = 500
+
+
+def tokenize(text):
+    """中英文混合分词
+
+    英文和数字按词切分并转小写，带连接符的标识符同时保留整体和各部分；
+    中文不依赖词典，按相邻两字（bigram）切分，单个汉字保留原字
+    """
+    tokens = []
+    if not text:
+        return tokens
+
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group()
+        if word[0].isascii():
+            word = word.lower()
+            tokens.append(word)
+            parts = IDENTIFIER_SEPARATOR_PATTERN.split(word)
+            if len(parts) > 1:
+                tokens.extend(part for part in parts if part)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """知识库的BM25倒排索引，保存在与 faiss.index 同目录的SQLite文件中，随分块的增删增量维护
+
+    倒排表按 (词, 分块ID) 逐行保存词频，追加和删除只写入涉及的行，不重写整个索引；
+    修改在事务中进行，commit() 后对检索可见，rollback() 放弃未提交的修改
+    """
+
+    INDEX_FILE = 'bm25.sqlite3'
+    # 重新生成索引时先写入临时文件，生成完成后替换正式索引，期间检索仍使用原索引
+    STAGING_SUFFIX = '.rebuild'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS stats (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            doc_count INTEGER NOT NULL,
+            total_length INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO stats (id, doc_count, total_length) VALUES (0, 0, 0);
+        CREATE TABLE IF NOT EXISTS documents (
+            chunk_id INTEGER PRIMARY KEY,
+            length INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            chunk_id INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, chunk_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_postings_chunk_id ON postings (chunk_id);
+    """
+
+    def __init__(self, index_path, publish_path=None, read_only=False, k1=1.5, b=0.75):
+        self.index_path = index_path
+        self.publish_path = publish_path
+        self.k1 = k1
+        self.b = b
+        if read_only:
+            # 只读打开，文件被删除或替换时不会创建出空文件
+            self.connection = sqlite3.connect(f"file:{quote(index_path)}?mode=ro", uri=True, timeout=30)
+        else:
+            self.connection = sqlite3.connect(index_path, timeout=30, check_same_thread=False)
+
+    @classmethod
+    def exists(cls, db_vector_dir):
+        return os.path.exists(os.path.join(db_vector_dir, cls.INDEX_FILE))
+
+    @classmethod
+    def open(cls, db_vector_dir, read_only=False):
+        """打开知识库的BM25索引，索引不存在时返回None（早于BM25索引创建的知识库，需要先运行 build_lexical_index）"""
+        if not cls.exists(db_vector_dir):
+            return None
+        return cls(os.path.join(db_vector_dir, cls.INDEX_FILE), read_only=read_only)
+
+    @classmethod
+    def create(cls, db_vector_dir):
+        """在临时文件中生成新的空索引，写入完成后调用 publish() 替换正式索引
+
+        应在持有知识库索引锁时调用，替换时没有其他写入方
+        """
+        index_path = os.path.join(db_vector_dir, cls.INDEX_FILE)
+        staging_path = index_path + cls.STAGING_SUFFIX
+        for path in (staging_path, staging_path + '-journal'):
+            if os.path.exists(path):
+                os.remove(path)
+        lexical_index = cls(staging_path, publish_path=index_path)
+        lexical_index.connection.executescript(cls.SCHEMA)
+        return lexical_index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, chunk_ids, texts):
+        """添加分块，已存在的分块先移除再重新添加"""
+        self.remove(chunk_ids)
+
+        documents = []
+        postings = []
+        total_length = 0
+        for chunk_id, text in zip(chunk_ids, texts):
+            term_counts = Counter(tokenize(text))
+            length = sum(term_counts.values())
+            documents.append((int(chunk_id), length))
+            postings.extend((term, int(chunk_id), count) for term, count in term_counts.items())
+            total_length += length
+
+        cursor = self.connection.cursor()
+        cursor.executemany("INSERT INTO documents (chunk_id, length) VALUES (?, ?)", documents)
+        cursor.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+        cursor.execute("UPDATE stats SET doc_count = doc_count + ?, total_length = total_length + ? WHERE id = 0",
+                       (len(documents), total_length))
+
+    def remove(self, chunk_ids):
+        """删除分块，按分块ID索引删除其倒排记录，不遍历整个倒排表"""
+        cursor = self.connection.cursor()
+        for start in range(0, len(chunk_ids), SQLITE_BATCH_SIZE):
+            batch = [int(chunk_id) for chunk_id in chunk_ids[start:start + SQLITE_BATCH_SIZE]]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents WHERE chunk_id IN ({placeholders})",
+                           batch)
+            doc_count, total_length = cursor.fetchone()
+            if not doc_count:
+                continue
+            cursor.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            cursor.execute(f"DELETE FROM documents WHERE chunk_id IN ({placeholders})", batch)
+            cursor.execute("UPDATE stats SET doc_count = doc_count - ?, total_length = total_length - ? WHERE id = 0",
+                           (doc_count, total_length))
+
+    def count(self):
+        return self.connection.execute("SELECT doc_count FROM stats WHERE id = 0").fetchone()[0]
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def publish(self):
+        """提交临时文件中生成的索引并替换正式索引"""
+        self.commit()
+        self.close()
+        # 写入方异常退出时可能留下原索引的回滚日志，替换后不能再应用到新索引上
+        if os.path.exists(self.publish_path + '-journal'):
+            os.remove(self.publish_path + '-journal')
+        os.replace(self.index_path, self.publish_path)
+
+    def close(self):
+        self.connection.close()
+
+    def search(self, query, top_k=5):
+        """BM25检索，返回按得分降序的 [(分块ID, 得分)]"""
+        doc_count, total_length = self.connection.execute(
+            "SELECT doc_count, total_length FROM stats WHERE id = 0"
+        ).fetchone()
+        if not doc_count:
+            return []
+
+        average_length = total_length / doc_count or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.connection.execute("""
+                SELECT p.chunk_id, p.tf, d.length
+                FROM postings p JOIN documents d ON d.chunk_id = p.chunk_id
+                WHERE p.term = ?
+            """, (term,)).fetchall()
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for chunk_id, tf, length in postings:
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,252 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 各服务商单次请求允许的最大文本条数
+PROVIDER_MAX_BATCH_SIZE = {
+    'openai': 2048,
+    'zhipu': 64,
+    'baidu': 16,
+    'dashscope': 25,
+    'ollama': 512,
+}
+
+# 需要重试的HTTP状态码（限流和服务端错误）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class OnlineEmbeddingError(Exception):
+    """在线嵌入API调用失败"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class RateLimiter:
+    """按固定间隔发放请求配额的限流器，多线程共享"""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def _build_openai_request(model_config, texts):
+    """OpenAI兼容接口（OpenAI、智谱等）"""
+    api_url = (model_config.get('api_url') or 'https://api.openai.com/v1').rstrip('/')
+    if not api_url.endswith('/embeddings'):
+        api_url += '/embeddings'
+    headers = {'Authorization': f"Bearer {model_config.get('api_key')}"}
+    return api_url, headers, {'model': model_config['model_name'], 'input': texts}
+
+
+def _parse_openai_response(data):
+    items = sorted(data['data'], key=lambda item: item.get('index', 0))
+    return [item['embedding'] for item in items]
+
+
+def _build_ollama_request(model_config, texts):
+    api_url = (model_config.get('api_url') or 'http://localhost:11434').rstrip('/')
+    return f"{api_url}/api/embed", {}, {'model': model_config['model_name'], 'input': texts}
+
+
+def _parse_ollama_response(data):
+    return data['embeddings']
+
+
+def _build_dashscope_request(model_config, texts):
+    headers = {'Authorization': f"Bearer {model_config.get('api_key')}"}
+    return model_config['api_url'], headers, {'model': model_config['model_name'], 'input': {'texts': texts}}
+
+
+def _parse_dashscope_response(data):
+    items = sorted(data['output']['embeddings'], key=lambda item: item.get('text_index', 0))
+    return [item['embedding'] for item in items]
+
+
+def _build_baidu_request(model_config, texts):
+    # 百度千帆接口使用access_token作为查询参数，这里api_key中保存的即为access_token
+    api_url = f"{model_config['api_url']}?access_token={model_config.get('api_key')}"
+    return api_url, {}, {'input': texts}
+
+
+def _parse_baidu_response(data):
+    if 'error_code' in data:
+        raise OnlineEmbeddingError(f"百度API错误: {data.get('error_msg')}", retryable=data['error_code'] in (18, 336501))
+    items = sorted(data['data'], key=lambda item: item.get('index', 0))
+    return [item['embedding'] for item in items]
+
+
+# 服务商 -> (构建请求, 解析响应)，未列出的服务商按OpenAI兼容接口处理
+PROVIDER_ADAPTERS = {
+    'openai': (_build_openai_request, _parse_openai_response),
+    'zhipu': (_build_openai_request, _parse_openai_response),
+    'ollama': (_build_ollama_request, _parse_ollama_response),
+    'dashscope': (_build_dashscope_request, _parse_dashscope_response),
+    'baidu': (_build_baidu_request, _parse_baidu_response),
+}
+
+
+class OnlineEmbeddingModel:
+    """在线嵌入模型，接口与 EmbeddingModel 一致
+
+    复用连接池中的HTTP连接，按服务商批次上限切分文本，在限流范围内并发请求，失败时指数退避重试
+    """
+
+    def __init__(self, model_config):
+        self.model_config = model_config
+        self.model_name = model_config.get('model_name')
+        self.model_type = model_config.get('model_type')
+        self.is_loaded = False
+        self.load_time = 0.0
+        self.memory_bytes = 0
+        self.service_client = None
+        self.session = None
+        self.dimension = model_config.get('vector_dimension')
+
+        self.timeout = model_config.get('timeout') or 30
+        self.concurrency = getattr(settings, 'ONLINE_EMBEDDING_CONCURRENCY', 4)
+        self.max_retries = getattr(settings, 'ONLINE_EMBEDDING_MAX_RETRIES', 3)
+        self.rate_limiter = RateLimiter(getattr(settings, 'ONLINE_EMBEDDING_RATE_LIMIT', 10))
+
+        provider_limit = PROVIDER_MAX_BATCH_SIZE.get(self.model_type)
+        batch_size = model_config.get('batch_size') or provider_limit or 16
+        self.batch_size = min(batch_size, provider_limit) if provider_limit else batch_size
+
+        self.build_request, self.parse_response = PROVIDER_ADAPTERS.get(
+            self.model_type, (_build_openai_request, _parse_openai_response)
+        )
+
+    def load_model(self):
+        """创建复用的HTTP连接池"""
+        if self.is_loaded:
+            return
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.is_loaded = True
+        logger.info(f"在线嵌入模型已就绪: {self.model_type}/{self.model_name}，"
+                    f"批次大小 {self.batch_size}，并发数 {self.concurrency}")
+
+    def unload_model(self):
+        """关闭HTTP连接池"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        self.is_loaded = False
+
+    def _request_batch(self, texts):
+        """请求一个批次的向量，失败时指数退避重试"""
+        url, headers, payload = self.build_request(self.model_config, texts)
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+                if response.status_code != 200:
+                    raise OnlineEmbeddingError(
+                        f"在线嵌入API返回状态码 {response.status_code}: {response.text[:200]}",
+                        retryable=response.status_code in RETRYABLE_STATUS_CODES
+                    )
+                vectors = self.parse_response(response.json())
+                if len(vectors) != len(texts):
+                    raise OnlineEmbeddingError(f"在线嵌入API返回向量数量不匹配: {len(vectors)} != {len(texts)}")
+                return vectors
+            except requests.RequestException as e:
+                error = OnlineEmbeddingError(f"在线嵌入API请求失败: {str(e)}", retryable=True)
+            except OnlineEmbeddingError as e:
+                error = e
+
+            if not error.retryable or attempt == self.max_retries:
+                raise error
+
+            delay = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+            logger.warning(f"{error}，{delay:.1f}s 后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+
+    def embed_text(self, text):
+        """为单个文本生成嵌入向量"""
+        if not self.is_loaded:
+            self.load_model()
+        if not text or not text.strip():
+            logger.warning("嵌入空文本")
+            return np.zeros(self.get_dimension(), dtype=np.float32)
+        return np.asarray(self._request_batch([text])[0], dtype=np.float32)
+
+    def embed_texts(self, texts):
+        """为多个文本生成嵌入向量，按批次并发请求"""
+        if not self.is_loaded:
+            self.load_model()
+
+        filtered_texts = [text for text in texts if text and text.strip()]
+        if not filtered_texts:
+            return np.zeros((0, self.get_dimension()), dtype=np.float32)
+
+        batches = [
+            filtered_texts[i:i + self.batch_size]
+            for i in range(0, len(filtered_texts), self.batch_size)
+        ]
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            results = list(executor.map(self._request_batch, batches))
+
+        # API返回的JSON列表在这里一次性转换为float32矩阵
+        vectors = np.asarray([vector for batch_vectors in results for vector in batch_vectors], dtype=np.float32)
+        self.dimension = vectors.shape[1]
+        logger.info(f"在线嵌入 {len(vectors)} 条文本（{len(batches)} 个批次），耗时 {time.time() - start_time:.2f}s")
+        return vectors
+
+    def embed_texts_with_stats(self, texts):
+        """与本地模型接口一致，在线API由服务商处理超长文本，没有切分统计"""
+        return self.embed_texts(texts), None
+
+    def get_dimension(self):
+        """获取嵌入向量的维度"""
+        return self.dimension or 384
+
+    def get_device(self):
+        """在线模型没有本地设备"""
+        return "online"
+
+
+# 按模型ID缓存的在线模型，配置变化时重建
+_online_models = {}
+_online_models_lock = threading.Lock()
+
+
+def get_online_embedding_model(model_config):
+    """获取在线嵌入模型实例（同一模型共享连接池）"""
+    cache_key = (model_config.get('api_key'), model_config.get('api_url'), model_config.get('model_name'))
+
+    with _online_models_lock:
+        cached = _online_models.get(model_config['id'])
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        if cached is not None:
+            cached[1].unload_model()
+
+        online_model = OnlineEmbeddingModel(model_config)
+        online_model.load_model()
+        _online_models[model_config['id']] = (cache_key, online_model)
+        return online_model
@@ -0,0 +1,123 @@
+import atexit
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+logger = logging.getLogger('knowledge_mgt')
+
+
+def _extract_page_range(file_path, start, end):
+    """在工作进程中独立打开PDF，提取 [start, end) 页的文本"""
+    with fitz.open(file_path) as doc:
+        return [doc[page_index].get_text() for page_index in range(start, end)]
+
+
+# PDF提取进程池，所有请求共享，首次使用时创建
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_pdf_extraction_workers():
+    """PDF提取进程数，配置为0时取CPU核心数（最多8个），为1时不使用进程池
+
+    已在工作进程中运行（如批量导入的分块进程）时不再创建嵌套的进程池
+    """
+    if multiprocessing.parent_process() is not None:
+        return 1
+    workers = getattr(settings, 'PDF_EXTRACTION_WORKERS', 0)
+    if workers <= 0:
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        workers = min(cpu_count or 1, 8)
+    return workers
+
+
+def get_pdf_extraction_executor(workers):
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            # 与嵌入工作进程一致使用spawn，避免fork继承Web进程中的线程和数据库连接
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"已启动PDF提取进程池: 进程数 {workers}")
+        return _executor
+
+
+def discard_pdf_extraction_executor(executor):
+    """工作进程异常退出后进程池不可再用，关闭并丢弃，下次使用时重新创建"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is executor:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            logger.warning("PDF提取进程池中的进程异常退出，已丢弃进程池，下次使用时重新创建")
+
+
+def shutdown_pdf_extraction_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown_pdf_extraction_executor)
+
+
+def iter_pdf_pages(file_path):
+    """按页顺序返回 (页码, 页面文本)，页码从1开始
+
+    页数达到 PDF_PARALLEL_MIN_PAGES 时按页范围分发到进程池并行提取，每个工作进程各自打开文件；
+    同时在途的页范围不超过进程数的两倍，结果按页序逐个返回，内存占用不随页数增长
+    """
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+
+    workers = get_pdf_extraction_workers()
+    if workers <= 1 or page_count < getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 64):
+        with fitz.open(file_path) as doc:
+            for page_number, page in enumerate(doc, start=1):
+                yield page_number, page.get_text()
+        return
+
+    pages_per_task = max(1, min(getattr(settings, 'PDF_PAGES_PER_TASK', 32), math.ceil(page_count / workers)))
+    page_ranges = iter([
+        (start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)
+    ])
+    executor = get_pdf_extraction_executor(workers)
+    logger.debug(f"并行提取PDF {file_path}: {page_count} 页, 每个任务 {pages_per_task} 页")
+
+    pending = deque()
+
+    def submit_next():
+        page_range = next(page_ranges, None)
+        if page_range is not None:
+            pending.append((page_range[0], executor.submit(_extract_page_range, file_path, *page_range)))
+
+    try:
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            start, future = pending.popleft()
+            texts = future.result()
+            submit_next()
+            for offset, text in enumerate(texts):
+                yield start + offset + 1, text
+    except BrokenProcessPool:
+        # 进程异常退出可能由该文件引起，不在Web进程中重试，本次提取失败
+        discard_pdf_extraction_executor(executor)
+        raise
+    finally:
+        # 调用方提前结束迭代或出错时取消尚未开始的任务
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from django.conf import settings
+from sentence_transformers import CrossEncoder
+
+from knowledge_mgt.utils.embeddings import PooledModel
+
+logger = logging.getLogger('knowledge_mgt')
+
+
+class RerankerModel(PooledModel):
+    """交叉编码器重排序模型，接口与 EmbeddingModel 一致，由本地模型管理器加载和淘汰
+
+    对 (查询, 分块) 对一次性批量前向计算打分；按历史单条耗时估算，在延迟预算内尽量多地打分，
+    打分结果按 (查询哈希, 分块ID) 缓存
+    """
+
+    def __init__(self, model_name, model_config=None):
+        super().__init__()
+        self.model_name = model_name
+        self.model_config = model_config or {}
+        self.model = None
+        self.is_loaded = False
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+        self.memory_bytes = 0
+        self.precision = 'fp32'
+        self.precision_check = None
+        self.service_client = None
+        # 单个 (查询, 分块) 对的平均打分耗时（毫秒），用于按延迟预算控制打分数量
+        self.ms_per_pair = None
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def load_model(self):
+        """加载交叉编码器模型"""
+        if self.is_loaded:
+            return
+
+        from knowledge_mgt.utils.embeddings import configure_torch_threads
+        configure_torch_threads()
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model_path = self.model_config.get('local_path') or self.model_name
+        max_length = self.model_config.get('max_tokens') or 512
+
+        start_time = time.time()
+        self.model = CrossEncoder(model_path, device=device, max_length=max_length)
+        self.load_time = time.time() - start_time
+        self.memory_bytes = sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in list(self.model.model.parameters()) + list(self.model.model.buffers())
+        )
+
+        # 预热，同时得到初始的单条打分耗时
+        start_time = time.time()
+        self.model.predict([("预热", "This is a warm-up passage.")] * 4, batch_size=4)
+        self.warmup_time = time.time() - start_time
+        self.ms_per_pair = self.warmup_time * 1000 / 4
+
+        self.is_loaded = True
+        logger.info(f"成功加载重排序模型: {model_path} 到设备: {device}，耗时 {self.load_time:.2f}s，"
+                    f"占用内存约 {self.memory_bytes / (1024 ** 2):.1f}MB")
+
+    def unload_model(self):
+        """卸载模型并清空打分缓存"""
+        if self.model is not None:
+            del self.model
+            self.model = None
+            self.is_loaded = False
+            self.memory_bytes = 0
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        with self._cache_lock:
+            self._cache.clear()
+        logger.info(f"已卸载重排序模型: {self.model_name}")
+
+    def get_dimension(self):
+        """交叉编码器不输出向量"""
+        return None
+
+    def get_device(self):
+        """获取模型当前运行的设备"""
+        if not self.is_loaded:
+            return "未加载"
+        return str(self.model.model.device.type)
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, items):
+        cache_size = getattr(settings, 'RERANK_CACHE_SIZE', 10000)
+        with self._cache_lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > cache_size:
+                self._cache.popitem(last=False)
+
+    def score(self, query, candidates, latency_budget_ms=None):
+        """为候选分块打分
+
+        candidates 为按向量检索排序的 [{'chunk_id', 'content'}]，返回与其等长的分数列表，
+        超出延迟预算未打分的候选分数为None（位于列表末尾）
+        """
+        if latency_budget_ms is None:
+            latency_budget_ms = getattr(settings, 'RERANK_LATENCY_BUDGET_MS', 300)
+
+        query_hash = hashlib.sha1(query.encode('utf-8')).hexdigest()
+        keys = [(query_hash, candidate['chunk_id']) for candidate in candidates]
+        scores = [self._cache_get(key) for key in keys]
+        pending = [i for i, score in enumerate(scores) if score is None]
+
+        # 按单条平均耗时估算预算内可打分的数量，优先保留向量检索排名靠前的候选
+        if pending and latency_budget_ms and self.ms_per_pair:
+            max_pairs = max(1, int(latency_budget_ms / self.ms_per_pair))
+            if len(pending) > max_pairs:
+                logger.info(f"重排序候选 {len(pending)} 个超出延迟预算 {latency_budget_ms}ms，只对前 {max_pairs} 个打分")
+                pending = pending[:max_pairs]
+
+        if pending:
+            pairs = [(query, candidates[i]['content']) for i in pending]
+            start_time = time.time()
+            with self.in_use():
+                self._check_loaded()
+                pending_scores = self.model.predict(pairs, batch_size=len(pairs), convert_to_numpy=True)
+            elapsed_ms = (time.time() - start_time) * 1000
+
+            # 平滑更新单条耗时
+            self.ms_per_pair = 0.8 * self.ms_per_pair + 0.2 * (elapsed_ms / len(pairs))
+            if latency_budget_ms and elapsed_ms > latency_budget_ms:
+                logger.warning(f"重排序耗时 {elapsed_ms:.1f}ms 超出预算 {latency_budget_ms}ms")
+
+            new_items = []
+            for i, score in zip(pending, np.asarray(pending_scores, dtype=np.float32).reshape(-1)):
+                scores[i] = float(score)
+                new_items.append((keys[i], float(score)))
+            self._cache_put(new_items)
+
+        return scores
+
+
+def get_reranker_model(model_id):
+    """获取重排序模型实例，未加载时通过本地模型管理器按需加载"""
+    from knowledge_mgt.utils.embeddings import local_embedding_manager, get_embedding_model_by_id
+
+    model = local_embedding_manager.get_model(model_id)
+    if model is not None:
+        if not isinstance(model, RerankerModel):
+            raise ValueError(f"模型 {model_id} 不是重排序模型")
+        return model
+
+    model_config = get_embedding_model_by_id(model_id)
+    if not model_config:
+        raise ValueError(f"重排序模型不存在或已禁用: {model_id}")
+    if model_config['model_type'] != 'cross_encoder' or model_config['api_type'] != 'local':
+        raise ValueError(f"模型 {model_id} 不是本地交叉编码器模型")
+
+    return local_embedding_manager.load_model(model_id, model_config)
+
+
+def rerank_chunks(rerank_model_id, query, chunks, top_n, latency_budget_ms=None):
+    """用交叉编码器对检索结果重新排序，返回前 top_n 个结果（附带 rerank_score）
+
+    chunks 为按向量检索排序、包含 chunk_id 和 content 的字典列表；超出延迟预算未打分的候选
+    保持向量检索顺序排在已打分候选之后
+    """
+    if not chunks:
+        return chunks
+
+    reranker = get_reranker_model(rerank_model_id)
+    start_time = time.time()
+    scores = reranker.score(query, chunks, latency_budget_ms)
+
+    scored = [(score, i) for i, score in enumerate(scores) if score is not None]
+    unscored = [i for i, score in enumerate(scores) if score is None]
+    order = [i for _, i in sorted(scored, key=lambda item: -item[0])] + unscored
+
+    results = []
+    for i in order[:top_n]:
+        chunk = dict(chunks[i])
+        chunk['rerank_score'] = scores[i]
+        results.append(chunk)
+
+    logger.info(f"重排序 {len(chunks)} 个候选（打分 {len(scored)} 个），保留 {len(results)} 个，"
+                f"耗时 {(time.time() - start_time) * 1000:.1f}ms")
+    return results
@@ -0,0 +1,64 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger('knowledge_mgt')
+
+
+def mmr_select(query_vector, candidate_vectors, top_k, lambda_mult=0.7):
+    """最大边际相关性（MMR）选择，返回选中候选的下标（按选中顺序）
+
+    score = lambda_mult * sim(query, d) - (1 - lambda_mult) * max(sim(d, 已选))，
+    lambda_mult 越小结果越分散；相似度使用余弦相似度，全部在NumPy中向量化计算
+    """
+    candidate_vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    count = len(candidate_vectors)
+    if count == 0:
+        return []
+
+    query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+    query = query / max(np.linalg.norm(query), 1e-12)
+    candidates = candidate_vectors / np.maximum(np.linalg.norm(candidate_vectors, axis=1, keepdims=True), 1e-12)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = []
+    # 每个候选与已选集合的最大相似度，随选择增量更新
+    max_similarity = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    for _ in range(min(top_k, count)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, pairwise[best]) if len(selected) > 1 else pairwise[best].copy()
+
+    return selected
+
+
+def select_diverse_chunks(query_vector, chunks, top_k, diversity):
+    """对带有 vector 的检索结果做MMR选择，diversity 即MMR的lambda，为None或>=1时按原顺序截取"""
+    if diversity is None or diversity >= 1 or len(chunks) <= 1:
+        return chunks[:top_k]
+
+    selected = mmr_select(query_vector, np.vstack([chunk['vector'] for chunk in chunks]), top_k, diversity)
+    logger.debug(f"MMR从 {len(chunks)} 个候选中选出 {len(selected)} 个（lambda={diversity}）")
+    return [chunks[i] for i in selected]
+
+
+def reciprocal_rank_fusion(ranked_lists, weights=None, k=60):
+    """加权倒数排名融合（RRF），返回按融合得分降序的 [(key, score)]
+
+    ranked_lists 为若干按相关性排序的key列表，score = Σ weight / (k + rank)，rank从1开始；
+    只依赖排名，不需要把向量距离和BM25得分归一化到同一尺度
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    scores = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        if not weight:
+            continue
+        for rank, key in enumerate(ranked, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -0,0 +1,78 @@
+import logging
+import re
+
+from django.conf import settings
+
+logger = logging.getLogger('knowledge_mgt')
+
+# 一次扫描同时匹配三类片段：连续中文字符、独立的英文单词、连续的标点符号
+TOKEN_SCANNER = re.compile(r'[\u4e00-\u9fff]+|(?<!\w)[a-zA-Z]+(?!\w)|[^\w\s\u4e00-\u9fff]+')
+
+# 各分块方法共用的句子结束标点和句子切分模式，切分时标点和其后的空白一并去掉
+SENTENCE_DELIMITERS = '.!?。！？；;'
+SENTENCE_SPLIT_PATTERN = re.compile(rf'[{re.escape(SENTENCE_DELIMITERS)}]\s*')
+
+
+def estimate_tokens(text):
+    """估算文本的token数：中文字符=1token，英文单词=1token，标点=0.5token
+
+    预编译的单一模式一次扫描完成统计，按每个匹配片段的首字符区分类型
+    """
+    total = 0.0
+    for piece in TOKEN_SCANNER.findall(text):
+        first_char = piece[0]
+        if '\u4e00' <= first_char <= '\u9fff':
+            total += len(piece)
+        elif first_char.isascii() and first_char.isalpha():
+            total += 1
+        else:
+            total += len(piece) * 0.5
+    return total
+
+
+class TokenCounter:
+    """分块使用的token计数器
+
+    默认使用规则估算；传入嵌入模型的分词器时按模型真实分词结果计数，批量分词走快速分词器的批处理接口
+    """
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+
+    @property
+    def source(self):
+        return 'tokenizer' if self.tokenizer is not None else 'estimate'
+
+    def count(self, text):
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts):
+        """批量计数，返回与 texts 等长的列表"""
+        if self.tokenizer is None:
+            return [estimate_tokens(text) for text in texts]
+        if not texts:
+            return []
+        token_ids = self.tokenizer(
+            list(texts), add_special_tokens=False, truncation=False, verbose=False,
+            return_attention_mask=False, return_token_type_ids=False
+        )['input_ids']
+        return [len(ids) for ids in token_ids]
+
+
+default_token_counter = TokenCounter()
+
+
+def get_token_counter(embedding_model=None):
+    """获取分块使用的token计数器
+
+    CHUNK_TOKEN_COUNTER 配置为 tokenizer 且传入的嵌入模型在本进程内加载了分词器时使用真实分词器，
+    否则（规则估算、客户端模式、在线模型）使用规则估算
+    """
+    if getattr(settings, 'CHUNK_TOKEN_COUNTER', 'estimate') != 'tokenizer' or embedding_model is None:
+        return default_token_counter
+
+    tokenizer = getattr(getattr(embedding_model, 'model', None), 'tokenizer', None)
+    if tokenizer is None:
+        logger.debug("嵌入模型没有可用的本地分词器，分块使用规则估算token数")
+        return default_token_counter
+    return TokenCounter(tokenizer)
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import connection
+
+from knowledge_mgt.utils.document_processor import SUPPORTED_EXTENSIONS
+
+logger = logging.getLogger('knowledge_mgt')
+
+
+def get_max_file_size(database_id=None):
+    """单个上传文件的大小上限（字节）：知识库配置了 max_file_size 时使用该值，否则使用 UPLOAD_MAX_FILE_SIZE"""
+    default_size = getattr(settings, 'UPLOAD_MAX_FILE_SIZE', 512 * 1024 * 1024)
+    if not database_id:
+        return default_size
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT max_file_size FROM knowledge_database WHERE id = %s", [database_id])
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"读取知识库 {database_id} 的文件大小上限失败: {str(e)}")
+        return default_size
+    return row[0] if row and row[0] else default_size
+
+
+def get_max_archive_size():
+    """批量导入上传的压缩包的大小上限（字节）"""
+    return getattr(settings, 'BULK_ARCHIVE_MAX_SIZE', 4 * 1024 * 1024 * 1024)
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """上传文件直接流式写入临时文件，同时计算SHA-256并检查大小上限
+
+    文件对象上附加 sha256 属性；超过上限时不再写入磁盘，丢弃该文件并记录到 request.rejected_uploads。
+    丢弃后Django仍会读完请求体中该文件剩余的数据（只是不再保存），请求体的总大小需要在Web服务器上限制。
+    multipart表单字段在文件之后才可用，知识库的大小上限只能从查询参数 database_id 中读取，未传入时按系统上限检查，
+    视图解析表单后需要再按知识库上限检查一次；指定 max_file_size 时按该值检查
+    """
+
+    def __init__(self, request=None, max_file_size=None):
+        super().__init__(request)
+        if max_file_size is None:
+            max_file_size = get_max_file_size(request.GET.get('database_id') if request is not None else None)
+        self.max_file_size = max_file_size
+        self.sha256 = None
+        self.received_size = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.received_size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received_size += len(raw_data)
+        if self.received_size > self.max_file_size:
+            logger.warning(f"上传文件 {self.file_name} 超过大小上限 {self.max_file_size} 字节，丢弃该文件")
+            self.file.close()
+            rejected_uploads = getattr(self.request, 'rejected_uploads', {})
+            rejected_uploads[self.field_name] = (self.file_name, self.max_file_size)
+            self.request.rejected_uploads = rejected_uploads
+            raise SkipFile()
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+def hashed_uploads(view_func):
+    """视图装饰器：本次请求的上传文件使用 HashingFileUploadHandler 接收，需在访问 request.POST/FILES 之前生效"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        request.rejected_uploads = {}
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def archive_uploads(view_func):
+    """视图装饰器：批量导入的压缩包使用 HashingFileUploadHandler 接收，按 BULK_ARCHIVE_MAX_SIZE 检查大小上限"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [HashingFileUploadHandler(request, max_file_size=get_max_archive_size())]
+        request.rejected_uploads = {}
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def check_uploaded_file(request, file, database_id, field_name='file'):
+    """检查上传文件的格式和大小，返回 (错误信息, HTTP状态码)，检查通过或没有上传文件时返回None"""
+    rejected = getattr(request, 'rejected_uploads', {}).get(field_name)
+    if rejected:
+        file_name, max_file_size = rejected
+        return f"文件 {file_name} 超过大小上限 {format_file_size(max_file_size)}", 413
+    if not file:
+        return None
+
+    file_extension = os.path.splitext(file.name)[1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        return f"不支持的文件格式 {file_extension or file.name}，支持 {', '.join(SUPPORTED_EXTENSIONS)}", 400
+
+    max_file_size = get_max_file_size(database_id)
+    if file.size > max_file_size:
+        return f"文件大小不能超过 {format_file_size(max_file_size)}", 413
+    return None
+
+
+def find_document_by_hash(database_id, file_hash):
+    """查找知识库中内容相同的已入库文档，返回 (文档ID, 分块数)，没有时返回None"""
+    if not file_hash:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT id, chunk_count FROM knowledge_document
+            WHERE database_id = %s AND file_hash = %s
+            ORDER BY id LIMIT 1
+        """, [database_id, file_hash])
+        return cursor.fetchone()
+
+
+def format_file_size(size):
+    """把字节数格式化为便于阅读的文本"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
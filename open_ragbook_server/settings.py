@@ -34,6 +34,70 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # 确保媒体目录存在
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
+# 本地嵌入模型池配置：常驻模型的总内存预算（MB）和最多常驻模型数，超出时按LRU淘汰
+EMBEDDING_MODEL_POOL_MEMORY_MB = int(os.getenv('EMBEDDING_MODEL_POOL_MEMORY_MB', 4096))
+EMBEDDING_MODEL_POOL_MAX_MODELS = int(os.getenv('EMBEDDING_MODEL_POOL_MAX_MODELS', 4))
+
+# 文档入库嵌入工作进程配置：进程数为0时在Web进程内生成向量；每进程线程数为0时按CPU核心数平均分配
+EMBEDDING_WORKER_PROCESSES = int(os.getenv('EMBEDDING_WORKER_PROCESSES', 0))
+EMBEDDING_WORKER_THREADS = int(os.getenv('EMBEDDING_WORKER_THREADS', 0))
+
+# 本地嵌入模型torch线程配置：线程数为0时按 CPU核心数 / Web进程数 自动计算，跨操作并行线程数为0时取1；
+# EMBEDDING_WEB_WORKERS 为同一台机器上的Web进程数（如gunicorn workers），用于避免多个进程抢占CPU
+EMBEDDING_WEB_WORKERS = int(os.getenv('EMBEDDING_WEB_WORKERS', 1))
+EMBEDDING_TORCH_THREADS = int(os.getenv('EMBEDDING_TORCH_THREADS', 0))
+EMBEDDING_TORCH_INTEROP_THREADS = int(os.getenv('EMBEDDING_TORCH_INTEROP_THREADS', 0))
+# 加载模型后执行一次预热编码，避免首次请求承担延迟初始化的开销
+EMBEDDING_WARMUP_ON_LOAD = os.getenv('EMBEDDING_WARMUP_ON_LOAD', 'true').lower() == 'true'
+# 低精度推理（bf16/fp16）与fp32输出向量的最小余弦相似度，低于该值时回退到fp32
+EMBEDDING_PRECISION_PARITY_THRESHOLD = float(os.getenv('EMBEDDING_PRECISION_PARITY_THRESHOLD', 0.99))
+
+# 流式入库配置：每次分块的文本缓冲区大小（字符数，0表示整篇文档一次分块）和每批写入数据库、生成向量的分块数
+INGESTION_BUFFER_CHARS = int(os.getenv('INGESTION_BUFFER_CHARS', 200000))
+INGESTION_WINDOW_SIZE = int(os.getenv('INGESTION_WINDOW_SIZE', 256))
+# Token分块的计数方式：estimate 按规则估算（中文字符、英文单词各1，标点0.5），tokenizer 使用嵌入模型的分词器
+CHUNK_TOKEN_COUNTER = os.getenv('CHUNK_TOKEN_COUNTER', 'estimate')
+# 入库近重复检测：SimHash签名的最大汉明距离，不超过该距离的分块视为近似重复（0表示只识别规范化后完全相同的内容）
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', 3))
+
+# PDF并行提取配置：进程数（0为按CPU核心数自动设置，1为不使用进程池）、启用并行提取的最少页数、每个任务的页数
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', 0))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 64))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 32))
+# 单个上传文件的默认大小上限（字节），知识库可单独配置；上传文件流式写入临时文件，不在内存中缓存
+UPLOAD_MAX_FILE_SIZE = int(os.getenv('UPLOAD_MAX_FILE_SIZE', 512 * 1024 * 1024))
+# 批量导入：并行提取、分块的进程数（0表示取CPU核心数，最多8个），跨文档合并生成向量的分块批大小，
+# 以及允许通过接口导入的服务器目录（逗号分隔，为空时接口只接受上传的压缩包）
+BULK_INGESTION_WORKERS = int(os.getenv('BULK_INGESTION_WORKERS', 0))
+BULK_EMBEDDING_BATCH_SIZE = int(os.getenv('BULK_EMBEDDING_BATCH_SIZE', 512))
+BULK_INGESTION_ALLOWED_DIRS = [path for path in os.getenv('BULK_INGESTION_ALLOWED_DIRS', '').split(',') if path]
+# 批量导入上传的压缩包的大小上限（字节），压缩包中的每个文件另按单文件上限检查
+BULK_ARCHIVE_MAX_SIZE = int(os.getenv('BULK_ARCHIVE_MAX_SIZE', 4 * 1024 * 1024 * 1024))
+
+# 交叉编码器重排序配置：候选数量为最终返回数量的倍数、单次打分的延迟预算（毫秒）、(查询, 分块) 打分缓存条数
+RERANK_CANDIDATE_FACTOR = int(os.getenv('RERANK_CANDIDATE_FACTOR', 4))
+RERANK_LATENCY_BUDGET_MS = int(os.getenv('RERANK_LATENCY_BUDGET_MS', 300))
+RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', 10000))
+
+# MMR多样性选择的候选数量为最终返回数量的倍数
+MMR_CANDIDATE_FACTOR = int(os.getenv('MMR_CANDIDATE_FACTOR', 4))
+
+# 混合检索配置：向量检索和BM25关键词检索的默认融合权重（请求中可覆盖）、倒数排名融合的平滑常数k
+HYBRID_VECTOR_WEIGHT = float(os.getenv('HYBRID_VECTOR_WEIGHT', 1.0))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv('HYBRID_LEXICAL_WEIGHT', 1.0))
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))
+# 向量相似度低于阈值的结果，BM25得分不低于该下限（绝对得分）、且向量相似度不低于阈值乘以该比例时仍然保留
+HYBRID_LEXICAL_MIN_SCORE = float(os.getenv('HYBRID_LEXICAL_MIN_SCORE', 5.0))
+HYBRID_LEXICAL_SIMILARITY_RATIO = float(os.getenv('HYBRID_LEXICAL_SIMILARITY_RATIO', 0.5))
+
+# 独立嵌入服务地址（http://host:port 或 unix:///path/to/socket），为空时在Web进程内加载本地模型
+EMBEDDING_SERVICE_URL = os.getenv('EMBEDDING_SERVICE_URL', '')
+
+# 在线嵌入API配置：并发请求数、每秒请求数上限、失败重试次数
+ONLINE_EMBEDDING_CONCURRENCY = int(os.getenv('ONLINE_EMBEDDING_CONCURRENCY', 4))
+ONLINE_EMBEDDING_RATE_LIMIT = float(os.getenv('ONLINE_EMBEDDING_RATE_LIMIT', 10))
+ONLINE_EMBEDDING_MAX_RETRIES = int(os.getenv('ONLINE_EMBEDDING_MAX_RETRIES', 3))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
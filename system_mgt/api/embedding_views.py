@@ -17,7 +17,8 @@ def get_embedding_model_by_id(model_id):
         with connection.cursor() as cursor:
             cursor.execute("""
                 SELECT id, name, model_type, api_type, api_key, api_url, model_name, local_path,
-                       vector_dimension, max_tokens, batch_size, timeout, is_public, user_id
+                       vector_dimension, max_tokens, batch_size, timeout, is_public, user_id,
+                       inference_precision
                 FROM embedding_model 
                 WHERE id = %s AND is_active = 1
             """, [model_id])
@@ -41,7 +42,8 @@ def get_embedding_model_by_id(model_id):
                 'batch_size': result[10],
                 'timeout': result[11],
                 'is_public': result[12],
-                'user_id': result[13]
+                'user_id': result[13],
+                'inference_precision': result[14]
             }
                 
     except Exception as e:
@@ -176,7 +178,8 @@ def embedding_list(request):
             offset = (page - 1) * page_size
             data_sql = f"""
                 SELECT id, name, model_type, api_type, api_key, api_url, model_name, local_path,
-                       vector_dimension, max_tokens, batch_size, timeout, is_public, is_active, is_preset,
+                       vector_dimension, max_tokens, batch_size, timeout, inference_precision,
+                       is_public, is_active, is_preset,
                        user_id, username, description, create_time, update_time
                 FROM embedding_model 
                 {where_clause}
@@ -244,6 +247,12 @@ def embedding_create(request):
                     status=400
                 )
         
+        if req.get('inference_precision') and req['inference_precision'] not in ('fp32', 'bf16', 'fp16'):
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message=f"不支持的推理精度: {req['inference_precision']}"),
+                status=400
+            )
+        
         # 获取预设模型配置（如果是基于预设模型创建）
         preset_config = get_preset_model_config(req.get('model_type'), req.get('model_name'))
         if preset_config:
@@ -269,15 +278,16 @@ def embedding_create(request):
             cursor.execute("""
                 INSERT INTO embedding_model 
                 (name, model_type, api_type, api_key, api_url, model_name, local_path,
-                 vector_dimension, max_tokens, batch_size, timeout, is_public, is_active, is_preset,
+                 vector_dimension, max_tokens, batch_size, timeout, inference_precision,
+                 is_public, is_active, is_preset,
                  user_id, username, description, create_time, update_time)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
             """, [
                 req['name'], req['model_type'], req['api_type'],
                 req.get('api_key', ''), req.get('api_url', ''),
                 req.get('model_name', ''), req.get('local_path', ''),
                 req.get('vector_dimension', 1536), req.get('max_tokens', 8192),
-                req.get('batch_size', 32), req.get('timeout', 30),
+                req.get('batch_size', 32), req.get('timeout', 30), req.get('inference_precision') or 'fp32',
                 req.get('is_public', False), req.get('is_active', True), False,  # is_preset=False
                 user_id, username, req.get('description', '')
             ])
@@ -436,15 +446,17 @@ def embedding_update(request, embedding_id):
                     status=403
                 )
             
-            # 预设模型只允许修改API密钥、描述和启用状态
+            # 预设模型只允许修改API密钥、描述、推理精度和启用状态
             if is_preset:
                 cursor.execute("""
                     UPDATE embedding_model 
-                    SET api_key = %s, description = %s, is_active = %s, update_time = NOW()
+                    SET api_key = %s, description = %s, inference_precision = %s, is_active = %s,
+                        update_time = NOW()
                     WHERE id = %s
                 """, [
                     req.get('api_key', ''),
                     req.get('description', ''),
+                    req.get('inference_precision') or 'fp32',
                     req.get('is_active', True),
                     embedding_id
                 ])
@@ -454,8 +466,8 @@ def embedding_update(request, embedding_id):
                     UPDATE embedding_model 
                     SET name = %s, model_type = %s, api_type = %s, api_key = %s, api_url = %s,
                         model_name = %s, local_path = %s, vector_dimension = %s, max_tokens = %s,
-                        batch_size = %s, timeout = %s, is_public = %s, is_active = %s,
-                        description = %s, update_time = NOW()
+                        batch_size = %s, timeout = %s, inference_precision = %s, is_public = %s,
+                        is_active = %s, description = %s, update_time = NOW()
                     WHERE id = %s
                 """, [
                     req.get('name', ''),
@@ -469,6 +481,7 @@ def embedding_update(request, embedding_id):
                     req.get('max_tokens', 8192),
                     req.get('batch_size', 32),
                     req.get('timeout', 30),
+                    req.get('inference_precision') or 'fp32',
                     req.get('is_public', False),
                     req.get('is_active', True),
                     req.get('description', ''),
@@ -589,15 +602,21 @@ def embedding_test(request, embedding_id):
         start_time = time.time()
         
         # 根据模型类型进行真实测试
+        if model_config['model_type'] == 'cross_encoder':
+            # 重排序模型不生成向量，在召回测试中选择该模型验证重排序效果
+            return JsonResponse(
+                ResponseCode.ERROR.to_dict(message="重排序模型不生成向量，请在召回测试中选择该模型进行测试"),
+                status=400
+            )
+
         if model_config['api_type'] == 'local':
             # 本地模型测试
             from knowledge_mgt.utils.embeddings import local_embedding_manager
             
-            # 检查是否已加载
-            current_model = local_embedding_manager.get_current_model()
-            current_model_id = local_embedding_manager.get_current_model_id()
+            # 检查是否已加载到模型池
+            current_model = local_embedding_manager.get_model(embedding_id)
             
-            if current_model is None or current_model_id != embedding_id:
+            if current_model is None:
                 return JsonResponse(
                     ResponseCode.ERROR.to_dict(message="本地模型未加载，请先加载模型再测试"),
                     status=400
@@ -615,9 +634,12 @@ def embedding_test(request, embedding_id):
                     "model_type": model_config['model_type'],
                     "api_type": "local",
                     "vector_dimension": actual_dimension,
-                    "vector_sample": vector[:10] if len(vector) > 10 else vector,  # 显示前10个维度
+                    "vector_sample": vector[:10].tolist(),  # 显示前10个维度
                     "response_time": f"{(time.time() - start_time) * 1000:.1f}ms",
-                    "device": current_model.get_device()
+                    "device": current_model.get_device(),
+                    # 低精度推理相对fp32的加速比和输出一致性（加载时校验）
+                    "precision": current_model.precision,
+                    "precision_check": current_model.precision_check
                 }
                 
             except Exception as e:
@@ -626,6 +648,33 @@ def embedding_test(request, embedding_id):
                     status=500
                 )
                 
+        elif model_config['api_type'] == 'online':
+            # 在线API测试，与文档入库使用同一套在线嵌入实现
+            try:
+                from knowledge_mgt.utils.online_embeddings import get_online_embedding_model
+                
+                online_model = get_online_embedding_model(model_config)
+                vector = online_model.embed_text(test_text)
+                actual_dimension = len(vector)
+                
+                test_result = {
+                    "success": True,
+                    "text": test_text,
+                    "model_name": model_config['name'],
+                    "model_type": model_config['model_type'],
+                    "api_type": "online",
+                    "vector_dimension": actual_dimension,
+                    "vector_sample": vector[:10].tolist(),  # 显示前10个维度
+                    "response_time": f"{(time.time() - start_time) * 1000:.1f}ms",
+                    "batch_size": online_model.batch_size
+                }
+                
+            except Exception as e:
+                return JsonResponse(
+                    ResponseCode.ERROR.to_dict(message=f"在线API测试失败: {str(e)}"),
+                    status=500
+                )
+                
         elif model_config['api_type'] == 'openai':
             # OpenAI API测试
             try:
@@ -744,14 +793,16 @@ def embedding_detail(request, embedding_id):
             if role_id == 1:  # 管理员
                 cursor.execute("""
                     SELECT id, name, model_type, api_type, api_key, api_url, model_name, local_path,
-                           vector_dimension, max_tokens, batch_size, timeout, is_public, is_active, is_preset,
+                           vector_dimension, max_tokens, batch_size, timeout, inference_precision,
+                           is_public, is_active, is_preset,
                            user_id, username, description, create_time, update_time
                     FROM embedding_model WHERE id = %s
                 """, [embedding_id])
             else:  # 普通用户
                 cursor.execute("""
                     SELECT id, name, model_type, api_type, api_key, api_url, model_name, local_path,
-                           vector_dimension, max_tokens, batch_size, timeout, is_public, is_active, is_preset,
+                           vector_dimension, max_tokens, batch_size, timeout, inference_precision,
+                           is_public, is_active, is_preset,
                            user_id, username, description, create_time, update_time
                     FROM embedding_model WHERE id = %s AND (user_id = %s OR is_public = 1)
                 """, [embedding_id, user_id])
@@ -823,7 +874,11 @@ def embedding_load_local(request, embedding_id):
             'model_name': model_config['name'],
             'model_path': model_config.get('local_path') or model_config.get('model_name'),
             'vector_dimension': embedding_model.get_dimension(),
-            'device': embedding_model.get_device()
+            'device': embedding_model.get_device(),
+            'precision': embedding_model.precision,
+            'precision_check': embedding_model.precision_check,
+            'load_time': round(embedding_model.load_time, 2),
+            'memory_mb': round(embedding_model.memory_bytes / (1024 ** 2), 1)
         }), status=200)
         
     except FileNotFoundError as e:
@@ -837,7 +892,7 @@ def embedding_load_local(request, embedding_id):
 @require_http_methods(["POST"])
 @csrf_exempt
 def embedding_unload_local(request):
-    """卸载当前本地嵌入模型"""
+    """卸载本地嵌入模型，请求体可指定model_id，未指定时卸载最近使用的模型"""
     user_info, error_response = get_user_from_token(request)
     if error_response:
         return error_response
@@ -846,10 +901,13 @@ def embedding_unload_local(request):
     role_id = user_info.get('role_id')
     
     try:
-        from knowledge_mgt.utils.embeddings import local_embedding_manager, get_current_local_model_info
+        from knowledge_mgt.utils.embeddings import local_embedding_manager, get_local_model_info
         
-        # 获取当前模型信息
-        current_info = get_current_local_model_info()
+        req = json.loads(request.body.decode('utf-8')) if request.body else {}
+        model_id = req.get('model_id') or local_embedding_manager.get_current_model_id()
+        
+        # 获取要卸载的模型信息
+        current_info = get_local_model_info(model_id) if model_id else None
         if current_info is None:
             return JsonResponse(
                 ResponseCode.ERROR.to_dict(message="当前没有加载的本地嵌入模型"),
@@ -858,17 +916,15 @@ def embedding_unload_local(request):
         
         # 检查用户权限 - 普通用户只能卸载自己创建的模型
         if role_id != 1:
-            current_model_id = current_info.get('model_id')
-            if current_model_id:
-                model_config = get_embedding_model_by_id(current_model_id)
-                if model_config and model_config['user_id'] != user_id:
-                    return JsonResponse(
-                        ResponseCode.ERROR.to_dict(message="无权限卸载此模型"),
-                        status=403
-                    )
+            model_config = get_embedding_model_by_id(model_id)
+            if model_config and model_config['user_id'] != user_id:
+                return JsonResponse(
+                    ResponseCode.ERROR.to_dict(message="无权限卸载此模型"),
+                    status=403
+                )
         
         # 卸载模型
-        local_embedding_manager.unload_current_model()
+        local_embedding_manager.unload_model(model_id)
         
         return JsonResponse(ResponseCode.SUCCESS.to_dict(data={
             "message": f"成功卸载本地嵌入模型: {current_info['model_name']}",
@@ -888,19 +944,22 @@ def embedding_local_status(request):
         return error_response
     
     try:
-        from knowledge_mgt.utils.embeddings import get_current_local_model_info
+        from knowledge_mgt.utils.embeddings import get_current_local_model_info, get_local_model_pool_info
         
         current_info = get_current_local_model_info()
+        pool_info = get_local_model_pool_info()
         
         if current_info is None:
             return JsonResponse(ResponseCode.SUCCESS.to_dict(data={
                 "has_loaded_model": False,
-                "message": "当前没有加载的本地嵌入模型"
+                "message": "当前没有加载的本地嵌入模型",
+                "model_pool": pool_info
             }), status=200)
         else:
             return JsonResponse(ResponseCode.SUCCESS.to_dict(data={
                 "has_loaded_model": True,
-                "current_model": current_info
+                "current_model": current_info,
+                "model_pool": pool_info
             }), status=200)
     except Exception as e:
         logger.error(f"获取本地嵌入模型状态失败: {str(e)}")
@@ -959,6 +1018,16 @@ def embedding_server_resources(request):
         except Exception as e:
             logger.warning(f"Failed to get GPU information: {str(e)}")
         
+        # 获取嵌入模型计算线程配置（本进程生效值和入库工作进程配置）
+        from knowledge_mgt.utils.embeddings import get_torch_thread_settings
+        from knowledge_mgt.utils.embedding_workers import get_worker_settings
+        worker_processes, worker_threads = get_worker_settings()
+        thread_info = get_torch_thread_settings()
+        thread_info.update({
+            'worker_processes': worker_processes,
+            'worker_threads': worker_threads
+        })
+        
         # 获取系统信息
         system_info = {
             'platform': platform.system(),
@@ -973,6 +1042,7 @@ def embedding_server_resources(request):
             'gpu_info': gpu_info,
             'has_gpu': has_gpu,
             'system': system_info,
+            'embedding_threads': thread_info,
             'timestamp': datetime.now().isoformat()
         }), status=200)
         